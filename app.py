@@ -1,30 +1,92 @@
-import marqo
+import os
+import time
 import requests
-import io
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor, wait
 import base64
-from PIL import Image
 import streamlit as st
 from dotenv import load_dotenv
-import re
+from fashion_search.image_mirror import local_file
+from fashion_search.query_keys import normalize_query
+from fashion_search.search_client import DEFAULT_API_URL, SearchAPIError, SearchClient
+from fashion_search.thumbnails import IMAGE_DECODE_ERRORS, ThumbnailCache
+from fashion_search.timing import StageTimings
 
-index_name = "fashion-search"  # This must match the index name defined in the config.py file in marqo folder
+load_dotenv()
 
-# Initialize Marqo client for local Docker instance
-# For local development we talk directly to the Marqo container on http://localhost:8882
-# No API key is required in this setup.
-mq = marqo.Client("http://localhost:8882")
+# Searches go through the headless API in search_api.py, which holds the Marqo client, the caches and
+# the result pagers shared by every session. Start it with `python3 search_api.py` before the app.
+@st.cache_resource
+def get_search_client():
+    """Creates the keep-alive session to the search API shared by all sessions."""
+    return SearchClient(os.getenv("SEARCH_API_URL", DEFAULT_API_URL))
+
+search_client = get_search_client()
+
+@st.cache_data(ttl=60)
+def get_strategies():
+    """Search methods offered by the API, as {label: name} in display order."""
+    return {strategy["label"]: strategy["name"] for strategy in search_client.strategies()}
 
 # Streamlit App
 st.set_page_config(page_title="Fashion Search with Marqo", layout="wide")
 st.title("Fashion Search with Marqo")
 
-# Function to encode image in base64
-def encode_image_to_base64(image):
-    """Encodes a PIL image to a base64 string."""
-    buffer = io.BytesIO()
-    image.save(buffer, format="PNG")
-    img_bytes = buffer.getvalue()
-    return base64.b64encode(img_bytes).decode("utf-8")
+# Image downloads share one keep-alive session and a bounded worker pool
+IMAGE_FETCH_WORKERS = 10
+IMAGE_REQUEST_TIMEOUT = (3.05, 5)  # (connect, read) seconds per image
+IMAGE_FETCH_DEADLINE = 8  # Seconds before any image still loading is shown as failed
+
+@st.cache_resource
+def get_image_fetcher():
+    """Creates the shared HTTP session, thread pool and thumbnail cache used for result images."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=IMAGE_FETCH_WORKERS, pool_maxsize=IMAGE_FETCH_WORKERS)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    executor = ThreadPoolExecutor(max_workers=IMAGE_FETCH_WORKERS, thread_name_prefix="image-fetch")
+    return session, executor, ThumbnailCache()
+
+# Function to get a result thumbnail encoded in base64, downloading it on a cache miss
+def fetch_image_base64(session, thumbnail_cache, image_url, timings):
+    """Returns the cached thumbnail for an image as a base64 string."""
+    def download(url):
+        # Mirrored images are read from disk; the mirror URL is only reachable from the Marqo container
+        path = local_file(url)
+        if path:
+            with open(path, "rb") as file:
+                return file.read()
+        response = session.get(url, timeout=IMAGE_REQUEST_TIMEOUT)
+        response.raise_for_status()
+        return response.content
+
+    thumbnail = thumbnail_cache.get_or_fetch(image_url, download, timings)
+    with timings.stage("base64"):
+        return base64.b64encode(thumbnail).decode("utf-8")
+
+# Function to download all result images concurrently
+def fetch_images(image_urls, timings):
+    """Fetches images in parallel. Returns a base64 string per URL, or None if it failed or timed out.
+
+    Per-image stages are added to timings summed over the worker threads, so together they can exceed
+    the wall time of the batch.
+    """
+    session, executor, thumbnail_cache = get_image_fetcher()
+    futures = {
+        image_url: executor.submit(fetch_image_base64, session, thumbnail_cache, image_url, timings)
+        for image_url in set(image_urls)
+    }
+    done, not_done = wait(futures.values(), timeout=IMAGE_FETCH_DEADLINE)
+    for future in not_done:
+        future.cancel()
+
+    images = {}
+    for image_url, future in futures.items():
+        try:
+            images[image_url] = future.result(timeout=0) if future in done else None
+        except (requests.RequestException, *IMAGE_DECODE_ERRORS):  # Unreachable, or not an image PIL can decode
+            images[image_url] = None
+    return images
 
 # Function to capitalize product titles
 def capitalize_title(title):
@@ -33,224 +95,226 @@ def capitalize_title(title):
     capitalized_words = [word.capitalize() for word in words]
     return ' '.join(capitalized_words)
 
-# Function to filter out duplicate items based on the first part of the _id
-def filter_unique_items(hits):
-    """Filters out duplicate items by keeping only one image per item based on the _id prefix."""
-    unique_items = {}
-    filtered_hits = []
+# CSS for consistent box size, alignment, and spacing
+def render_product_styles():
+    """Adds the CSS used by the product tiles."""
+    st.markdown(
+        """
+        <style>
+        .product-box {
+            display: flex;
+            flex-direction: column;
+            align-items: center;
+            justify-content: space-between;
+            padding: 10px;
+            border: 1px solid #ddd;
+            border-radius: 5px;
+            height: 400px;
+            width: 100%;
+            overflow: hidden;
+            text-align: center;
+            margin: 10px;
+        }
+        .product-box img {
+            height: 200px;
+            max-width: 100%;
+            object-fit: contain;
+            margin-bottom: 10px;
+        }
+        .product-title {
+            font-size: 16px;
+            font-weight: bold;
+            margin-bottom: 5px;
+            min-height: 40px;
+        }
+        .product-price {
+            font-size: 18px;
+            font-weight: bold;
+            color: #E74C3C;
+        }
+        .stColumn > div {
+            display: flex;
+            flex-wrap: wrap;
+            justify-content: center;
+        }
+        </style>
+        """,
+        unsafe_allow_html=True,
+    )
 
-    for hit in hits:
-        item_id = hit['_id'].split('_')[0]  # Get the first part of the _id before the underscore
-        if item_id not in unique_items:
-            unique_items[item_id] = True
-            filtered_hits.append(hit)
-        if len(filtered_hits) == 20:  # Stop when we have 20 unique items
-            break
+# Function to render result tiles into a list of columns, filling them in turn
+def render_product_grid(filtered_hits, cols, images):
+    """Renders one product tile per hit, using the prefetched base64 thumbnails in images."""
+    thumbnail_mime_type = get_image_fetcher()[2].mime_type
+    for i, hit in enumerate(filtered_hits):
+        image_url = hit.get('image_url', None)
+        product_name = hit.get('product_name', 'No Name')
+        product_name = capitalize_title(product_name)
+        price = hit.get('cost', 'N/A')
 
-    return filtered_hits
+        img_base64 = images.get(image_url) if image_url else None
+        if img_base64:
+            with cols[i % len(cols)]:
+                st.markdown(
+                    f"""
+                    <div class="product-box">
+                        <img src="data:{thumbnail_mime_type};base64,{img_base64}" alt="{product_name}" />
+                        <div class="product-title">{product_name}</div>
+                        <div class="product-price">£{price}</div>
+                    </div>
+                    """,
+                    unsafe_allow_html=True,
+                )
+        elif image_url:
+            with cols[i % len(cols)]:
+                st.markdown(
+                    f"""
+                    <div class="product-box">
+                        <div style="height: 200px; width: auto; border: 1px solid #ddd; border-radius: 5px; padding: 5px; display: flex; align-items: center; justify-content: center;">
+                            Failed to load image
+                        </div>
+                        <div class="product-title">{product_name}</div>
+                        <div class="product-price">£{price}</div>
+                    </div>
+                    """,
+                    unsafe_allow_html=True,
+                )
 
-# Helper function to create valid keys
-def make_modifier_key(value: str) -> str:
-    return re.sub(r"[^a-zA-Z0-9_]", "_", value).lower()
+# Show API errors (e.g. the API is not running) instead of a traceback
+def call_api(function, *args, **kwargs):
+    try:
+        return function(*args, **kwargs)
+    except SearchAPIError as e:
+        st.error(str(e))
+        st.stop()
+
+# Send the app's own stages to the API's /metrics in the background, so reporting never delays a page
+def report_timings(strategy, query, timings):
+    executor = get_image_fetcher()[1]
+    executor.submit(search_client.report_timings, strategy, query, dict(timings))
+
+strategies_by_label = call_api(get_strategies)
 
 # Input box for query (search is triggered on Enter)
-query = st.text_input("Search for items (e.g., green dress):", "")
-
-# Radio button for selecting a single search method
-search_method = st.radio(
-    "Select a search method:",
-    options=[
-        "Basic Tensor Search",
-        "Hybrid Search",
-        "Hybrid Search with Exact Match Boosters",
-        "Hybrid Search with Exact Match Boosters and Modifiers"
-    ]
-)
-
-# Trigger search when query is entered and a search method is selected
-if query and search_method:
-    with st.spinner("Fetching results..."):
-        query_key = make_modifier_key(query)
-        res = None
-
-        if search_method == "Basic Tensor Search":
-            res = mq.index(index_name).search(
-                query,
-                limit=50,
-                filter_string="in_stock:(true)"
-            )
-        elif search_method == "Hybrid Search":
-            res = mq.index(index_name).search(
-                query,
-                search_method="HYBRID",
-                limit=50,
-                attributes_to_retrieve=[
-                    "product_name",
-                    "image_url",
-                    "cost",
-                ],
-                hybrid_parameters={
-                    "alpha": 0.5,
-                    "rrfK": 60,
-                    "searchableAttributesLexical": ["product_name"],
-                },
-                show_highlights=False,
-                filter_string="in_stock:(true)",
-            )
-        elif search_method == "Hybrid Search with Exact Match Boosters":
-            res = mq.index(index_name).search(
-                query,
-                search_method="HYBRID",
-                limit=50,
-                attributes_to_retrieve=[
-                    "product_name",
-                    "image_url",
-                    "cost",
-                ],
-                hybrid_parameters={
-                    "alpha": 0.5,
-                    "rrfK": 60,
-                    "scoreModifiersTensor": {
-                        "add_to_score": [
-                            {"field_name": f"exact_match_boosters.{query_key}", "weight": 1000}
-                        ]
-                    },
-                    "scoreModifiersLexical": {
-                        "add_to_score": [
-                            {"field_name": f"exact_match_boosters.{query_key}", "weight": 1000}
-                        ]
-                    },
-                    "searchableAttributesLexical": ["product_name"],
-                },
-                show_highlights=False,
-                filter_string="in_stock:(true)",
-            )
-
-        elif search_method == "Hybrid Search with Exact Match Boosters and Modifiers":
-            res = mq.index(index_name).search(
-                query,
-                search_method="HYBRID",
-                limit=50,
-                attributes_to_retrieve=["product_name", "image_url", "cost"],
-                filter_string="in_stock:(true)",
-                show_highlights=False,
-                hybrid_parameters={
-                    "alpha": 0.5,
-                    "rrfK": 60,
-                    "scoreModifiersTensor": {
-                        "add_to_score": [
-                            {"field_name": f"exact_match_boosters.{query_key}", "weight": 1000},
-                            {"field_name": "one_day_revenue", "weight": 0.000002},
-                            {"field_name": "three_day_revenue", "weight": 6.6e-7},
-                            {"field_name": "five_day_revenue", "weight": 4e-7},
-                            {"field_name": f"one_day_revenue_modifiers.{query_key}", "weight": 0.000005},
-                            {"field_name": f"three_day_revenue_modifiers.{query_key}", "weight": 0.00000166666},
-                            {"field_name": f"five_day_revenue_modifiers.{query_key}", "weight": 0.000001}
-                        ]
-                    },
-                    "scoreModifiersLexical": {
-                        "add_to_score": [
-                            {"field_name": f"exact_match_boosters.{query_key}", "weight": 1000},
-                            {"field_name": "one_day_revenue", "weight": 0.002},
-                            {"field_name": "three_day_revenue", "weight": 0.0006},
-                            {"field_name": "five_day_revenue", "weight": 0.0004},
-                            {"field_name": f"one_day_revenue_modifiers.{query_key}", "weight": 1},
-                            {"field_name": f"three_day_revenue_modifiers.{query_key}", "weight": 0.3333333333333333},
-                            {"field_name": f"five_day_revenue_modifiers.{query_key}", "weight": 0.2}
-                        ]
-                    },
-                    "searchableAttributesLexical": ["product_name"]
-                }
-            )
-
-        # Display filtered results
-        filtered_hits = filter_unique_items(res['hits'])
-
-        st.subheader(f"Results from {search_method}")
-
-        # CSS for consistent box size, alignment, and spacing
-        st.markdown(
-            """
-            <style>
-            .product-box {
-                display: flex;
-                flex-direction: column;
-                align-items: center;
-                justify-content: space-between;
-                padding: 10px;
-                border: 1px solid #ddd;
-                border-radius: 5px;
-                height: 400px;
-                width: 100%;
-                overflow: hidden;
-                text-align: center;
-                margin: 10px;
-            }
-            .product-box img {
-                height: 200px;
-                max-width: 100%;
-                object-fit: contain;
-                margin-bottom: 10px;
-            }
-            .product-title {
-                font-size: 16px;
-                font-weight: bold;
-                margin-bottom: 5px;
-                min-height: 40px;
-            }
-            .product-price {
-                font-size: 18px;
-                font-weight: bold;
-                color: #E74C3C;
-            }
-            .stColumn > div {
-                display: flex;
-                flex-wrap: wrap;
-                justify-content: center;
-            }
-            </style>
-            """,
-            unsafe_allow_html=True,
-        )
+query = st.text_input("Search for items (e.g., green dress):", "", key="query")
+
+# Logged queries starting with what was typed; picking one searches for it
+AUTOCOMPLETE_SUGGESTIONS = 6
+
+def use_suggestion(suggestion):
+    st.session_state["query"] = suggestion
+
+suggestions = [
+    suggestion["query"] for suggestion in call_api(search_client.suggest, query, AUTOCOMPLETE_SUGGESTIONS)
+    if suggestion["query"] != normalize_query(query)
+]
+if suggestions:
+    for col, suggestion in zip(st.columns(len(suggestions)), suggestions):
+        col.button(suggestion, key=f"suggestion-{suggestion}", on_click=use_suggestion, args=(suggestion,),
+                   width="stretch")
+
+# Comparison mode runs several strategies for the same query side by side
+compare_mode = st.toggle("Compare search methods side by side")
+
+if compare_mode:
+    # Multiselect for the strategies to compare
+    selected_methods = st.multiselect(
+        "Select search methods to compare:",
+        options=list(strategies_by_label),
+        default=list(strategies_by_label),
+    )
 
-        # Display results in rows of 5 using st.columns
-        cols_per_row = 5
-        cols = st.columns(cols_per_row)
-        for i, hit in enumerate(filtered_hits):
-            image_url = hit.get('image_url', None)
-            product_name = hit.get('product_name', 'No Name')
-            product_name = capitalize_title(product_name)
-            price = hit.get('cost', 'N/A')
-
-            if image_url:
-                try:
-                    response = requests.get(image_url)
-                    response.raise_for_status()
-                    image = Image.open(io.BytesIO(response.content))
-                    img_base64 = encode_image_to_base64(image)
-
-                    with cols[i % cols_per_row]:
-                        st.markdown(
-                            f"""
-                            <div class="product-box">
-                                <img src="data:image/png;base64,{img_base64}" alt="{product_name}" />
-                                <div class="product-title">{product_name}</div>
-                                <div class="product-price">£{price}</div>
-                            </div>
-                            """,
-                            unsafe_allow_html=True,
-                        )
-                except requests.RequestException:
-                    with cols[i % cols_per_row]:
-                        st.markdown(
-                            f"""
-                            <div class="product-box">
-                                <div style="height: 200px; width: auto; border: 1px solid #ddd; border-radius: 5px; padding: 5px; display: flex; align-items: center; justify-content: center;">
-                                    Failed to load image
-                                </div>
-                                <div class="product-title">{product_name}</div>
-                                <div class="product-price">£{price}</div>
-                            </div>
-                            """,
-                            unsafe_allow_html=True,
-                        )
+    if query and selected_methods:
+        with st.spinner("Fetching results..."):
+            timings = StageTimings()
+            start_time = time.perf_counter()
+            # The API sends the searches concurrently
+            with timings.stage("api"):
+                res = call_api(search_client.compare, query, [strategies_by_label[label] for label in selected_methods])
+            labels = {name: label for label, name in strategies_by_label.items()}
+            results = res["results"]
+
+            st.caption(f"{len(results)} searches in {res['took_ms']:.0f} ms wall time")
+
+            # Overlap between the unique products each strategy returned
+            if res["overlap"]:
+                st.table([
+                    {
+                        "Method A": labels[row["strategy_a"]],
+                        "Method B": labels[row["strategy_b"]],
+                        "Shared items": row["shared"],
+                        "Jaccard": f"{row['jaccard']:.2f}",
+                    }
+                    for row in res["overlap"]
+                ])
+
+            render_product_styles()
+
+            # Download the images for every strategy in one concurrent batch
+            with timings.stage("images"):
+                images = fetch_images([
+                    hit['image_url'] for result in results.values() for hit in result["hits"] if hit.get('image_url')
+                ], timings)
+
+            # One column per strategy
+            with timings.stage("render"):
+                for col, (name, result) in zip(st.columns(len(results)), results.items()):
+                    with col:
+                        st.subheader(labels[name])
+                        st.caption(f"{result['took_ms']:.0f} ms, {len(result['hits'])} items")
+                        render_product_grid(result["hits"], [col], images)
+            timings.add("total", start_time)
+            report_timings("compare", query, timings)
+else:
+    # Radio button for selecting a single search method
+    search_method = st.radio(
+        "Select a search method:",
+        options=list(strategies_by_label)
+    )
+
+    # Trigger search when query is entered and a search method is selected
+    if query and search_method:
+        # Start from the first page whenever the query or method changes; the API keeps the pager, so
+        # "Next page" continues where the previous page stopped
+        pager_key = (query, search_method)
+        if st.session_state.get("pager_key") != pager_key:
+            st.session_state.pager_key = pager_key
+            st.session_state.page = 0
+
+        with st.spinner("Fetching results..."):
+            timings = StageTimings()
+            start_time = time.perf_counter()
+            # Display filtered results
+            with timings.stage("api"):
+                res = call_api(search_client.search, query, strategies_by_label[search_method], st.session_state.page)
+            filtered_hits = res["hits"]
+
+            st.subheader(f"Results from {search_method}")
+            caption = st.empty()  # Filled in once the images are downloaded and rendered
+
+            render_product_styles()
+
+            # Download all result images concurrently
+            with timings.stage("images"):
+                images = fetch_images([hit['image_url'] for hit in filtered_hits if hit.get('image_url')], timings)
+
+            # Display results in rows of 5 using st.columns
+            cols_per_row = 5
+            with timings.stage("render"):
+                render_product_grid(filtered_hits, st.columns(cols_per_row), images)
+            timings.add("total", start_time)
+
+            server_timings = StageTimings({stage: ms / 1000 for stage, ms in res["timings"].items()})
+            caption.caption(f"API: {server_timings.summary() or 'shared another request'} | App: {timings.summary()}")
+            report_timings(strategies_by_label[search_method], query, timings)
+
+        # Page navigation
+        def change_page(step):
+            st.session_state.page += step
+
+        previous_col, page_col, next_col = st.columns([1, 8, 1])
+        previous_col.button("Previous", on_click=change_page, args=(-1,), disabled=st.session_state.page == 0)
+        page_col.caption(f"Page {st.session_state.page + 1}")
+        next_col.button(
+            "Next", on_click=change_page, args=(1,), disabled=not res["has_next_page"]
+        )
@@ -0,0 +1,118 @@
+import argparse
+import json
+import time
+from collections import defaultdict
+
+from generate_modifiers import (
+    load_historical_data,
+    load_product_data,
+    update_product_data,
+)
+from fashion_search.query_keys import make_modifier_key, query_key
+
+# Reference implementation: the original nested loop over every historical row for every product
+def update_product_data_nested_loop(product_data, historical_data):
+    for product in product_data:
+        product_name_key = make_modifier_key(product["product_name"])
+        product["exact_match_boosters"] = {product_name_key: 1000}
+
+        product["one_day_revenue_modifiers"] = defaultdict(float)
+        product["three_day_revenue_modifiers"] = defaultdict(float)
+        product["five_day_revenue_modifiers"] = defaultdict(float)
+
+        for hist in historical_data:
+            query_name_key = make_modifier_key(hist["query"])
+            if hist["_id"] == product["_id"]:
+                if hist["one_day_revenue"] > 0:
+                    product["one_day_revenue_modifiers"][query_name_key] = hist["one_day_revenue"]
+                if hist["three_day_revenue"] > 0:
+                    product["three_day_revenue_modifiers"][query_name_key] = hist["three_day_revenue"]
+                if hist["five_day_revenue"] > 0:
+                    product["five_day_revenue_modifiers"][query_name_key] = hist["five_day_revenue"]
+
+        product["one_day_revenue_modifiers"] = dict(product["one_day_revenue_modifiers"])
+        product["three_day_revenue_modifiers"] = dict(product["three_day_revenue_modifiers"])
+        product["five_day_revenue_modifiers"] = dict(product["five_day_revenue_modifiers"])
+
+    return product_data
+
+# The reference keys fields with make_modifier_key and keeps the last revenue per key. The generator
+# uses canonical query keys, which merge spellings of a query and sum their revenue on purpose. To
+# check the join itself, the reference output is rewritten to canonical keys. A product is skipped
+# when two of its logged spellings share a make_modifier_key, because the reference dropped one of
+# their revenues. Returns the rewritten products and the number skipped.
+def to_canonical_keys(products, historical_records):
+    canonical = {}
+    spellings = defaultdict(lambda: defaultdict(set))  # _id -> make_modifier_key -> raw queries
+    for hist in historical_records:
+        key = make_modifier_key(hist["query"])
+        canonical[key] = query_key(hist["query"])
+        spellings[hist["_id"]][key].add(hist["query"])
+
+    rewritten, skipped = [], 0
+    for product in products:
+        if any(len(queries) > 1 for queries in spellings[product["_id"]].values()):
+            skipped += 1
+            continue
+        product = dict(product, exact_match_boosters={query_key(product["product_name"]): 1000})
+        for field in ("one_day_revenue_modifiers", "three_day_revenue_modifiers", "five_day_revenue_modifiers"):
+            modifiers = {}
+            for key, value in product[field].items():
+                modifiers[canonical[key]] = modifiers.get(canonical[key], 0.0) + value
+            product[field] = modifiers
+        rewritten.append(product)
+    return rewritten, skipped
+
+# Run an update function on a fresh copy of the products and time it
+def time_update(update_fn, product_file, historical_data):
+    product_data = load_product_data(product_file)
+    start_time = time.perf_counter()
+    updated = update_fn(product_data, historical_data)
+    return updated, time.perf_counter() - start_time
+
+# Main script
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the indexed join against the original nested loop.")
+    parser.add_argument("--historical-data", default="./data_processing/data/historical_data.csv")
+    parser.add_argument("--product-data", default="./data_processing/data/product_data.csv")
+    parser.add_argument(
+        "--products",
+        type=int,
+        default=200,
+        help="Number of products to run through the nested loop (0 for the full catalogue, which takes a long time)",
+    )
+    args = parser.parse_args()
+
+    historical_data = load_historical_data(args.historical_data)
+    # The reference takes the rows as dicts, as the original loader returned them
+    historical_records = historical_data.to_dict("records")
+
+    indexed, indexed_time = time_update(update_product_data, args.product_data, historical_data)
+    print(f"Indexed join: {len(indexed)} products in {indexed_time:.3f} seconds.")
+
+    # The nested loop is quadratic, so by default only a prefix of the catalogue is timed
+    def nested_loop_prefix(product_data, historical_data):
+        if args.products:
+            product_data = product_data[:args.products]
+        return update_product_data_nested_loop(product_data, historical_data)
+
+    nested, nested_time = time_update(nested_loop_prefix, args.product_data, historical_records)
+    print(f"Nested loop:  {len(nested)} products in {nested_time:.3f} seconds.")
+
+    if len(nested) < len(indexed):
+        estimate = nested_time / len(nested) * len(indexed)
+        print(f"Nested loop estimate for {len(indexed)} products: {estimate:.1f} seconds.")
+        estimate_speedup = estimate / indexed_time
+    else:
+        estimate_speedup = nested_time / indexed_time
+    print(f"Speedup: {estimate_speedup:.0f}x")
+
+    # Output must match the original byte for byte once both use canonical keys
+    expected, skipped = to_canonical_keys(nested, historical_records)
+    compared_ids = {product["_id"] for product in expected}
+    actual = [product for product in indexed[:len(nested)] if product["_id"] in compared_ids]
+    identical = json.dumps(actual, indent=4) == json.dumps(expected, indent=4)
+    print(f"Output identical: {identical} ({len(expected)} products compared, {skipped} with colliding "
+          f"spellings skipped)")
+    if not identical:
+        raise SystemExit(1)
@@ -1,13 +1,22 @@
+import argparse
+import os
+import sys
+
 import pandas as pd
 
-def generate_historical_data(search_log_path, product_data_path, output_path):
-    # Load the search log and product data
-    search_log_df = pd.read_csv(search_log_path)
-    product_data_df = pd.read_csv(product_data_path)
-    
-    # Extract product cost for each product ID
-    product_costs = product_data_df.set_index('_id')['cost'].to_dict()
-    
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from fashion_search.ingest import load_product_table
+from fashion_search.timing import StageTimings
+
+OUTPUT_COLUMNS = ['query', '_id', 'total_purchases', 'add_to_cart_count', 'total_click_count', 'one_day_revenue', 'three_day_revenue', 'five_day_revenue']
+
+# Per-row indicator columns summed by the columnar aggregation
+COUNT_COLUMNS = ['total_purchases', 'add_to_cart_count', 'total_click_count', 'one_day_purchases', 'three_day_purchases', 'five_day_purchases']
+
+# Number of chunk partials kept before they are summed into one
+PARTIALS_PER_FOLD = 16
+
+def aggregate_with_loop(search_log_df, product_costs):
     # Initialize a dictionary to store aggregated data
     aggregated_data = {}
 
@@ -43,17 +52,89 @@ def generate_historical_data(search_log_path, product_data_path, output_path):
 
     # Convert aggregated data to a DataFrame
     historical_data_df = pd.DataFrame.from_dict(aggregated_data, orient='index').reset_index()
-    historical_data_df.columns = ['query', '_id', 'total_purchases', 'add_to_cart_count', 'total_click_count', 'one_day_revenue', 'three_day_revenue', 'five_day_revenue']
+    historical_data_df.columns = OUTPUT_COLUMNS
+    return historical_data_df
+
+def count_actions(chunk):
+    # Turn every metric into a 0/1 column so a single grouped sum computes them all
+    purchased = chunk['action'] == 'purchased'
+    days_ago = chunk['days_ago_action_performed']
+    indicators = pd.DataFrame({
+        'query': chunk['query'],
+        '_id': chunk['_id'],
+        'total_purchases': purchased,
+        'add_to_cart_count': chunk['action'] == 'add_to_cart',
+        'total_click_count': chunk['action'] == 'click',
+        'one_day_purchases': purchased & (days_ago <= 1),
+        'three_day_purchases': purchased & (days_ago <= 3),
+        'five_day_purchases': purchased & (days_ago <= 5),
+    })
+    return indicators.groupby(['query', '_id'])[COUNT_COLUMNS].sum()
+
+def aggregate_columnar(search_log_chunks, product_costs):
+    # Each chunk is reduced to one row per (query, _id) it contains and the partial sums are folded
+    # together periodically, so memory is bounded by the number of distinct pairs rather than the log size
+    partial_counts = []
+    for chunk in search_log_chunks:
+        partial_counts.append(count_actions(chunk))
+        if len(partial_counts) >= PARTIALS_PER_FOLD:
+            partial_counts = [pd.concat(partial_counts).groupby(level=['query', '_id']).sum()]
+    counts = pd.concat(partial_counts).groupby(level=['query', '_id']).sum().reset_index()
+
+    # Compute revenue based on product cost
+    cost = counts['_id'].map(product_costs).fillna(0)
+    historical_data_df = counts[['query', '_id', 'total_purchases', 'add_to_cart_count', 'total_click_count']].copy()
+    historical_data_df['one_day_revenue'] = (counts['one_day_purchases'] * cost).round(2)
+    historical_data_df['three_day_revenue'] = (counts['three_day_purchases'] * cost).round(2)
+    historical_data_df['five_day_revenue'] = (counts['five_day_purchases'] * cost).round(2)
+    return historical_data_df
+
+def generate_historical_data(search_log_path, product_data_path, output_path, mode='columnar', chunksize=None):
+    timings = StageTimings()
+
+    # Load the product data
+    with timings.stage("load_products"):
+        product_data_df = load_product_table(product_data_path)
+
+        # Extract product cost for each product ID
+        product_costs = product_data_df.set_index('_id')['cost'].to_dict()
+
+    if mode == 'loop':
+        with timings.stage("load_search_log"):
+            search_log_df = pd.read_csv(search_log_path)
+        with timings.stage("aggregate"):
+            historical_data_df = aggregate_with_loop(search_log_df, product_costs)
+    else:
+        # Stream the search log in chunks when a chunk size is given; chunks are read as they are
+        # aggregated, so reading is part of the aggregate stage
+        with timings.stage("aggregate"):
+            if chunksize:
+                search_log_chunks = pd.read_csv(search_log_path, chunksize=chunksize)
+            else:
+                search_log_chunks = [pd.read_csv(search_log_path)]
+            historical_data_df = aggregate_columnar(search_log_chunks, product_costs)
 
     # Save to CSV
-    historical_data_df.to_csv(output_path, index=False)
+    with timings.stage("write_csv"):
+        historical_data_df.to_csv(output_path, index=False)
 
     print(f"Historical data has been generated and saved to {output_path}")
+    print(timings.report())
 
-# Paths to input and output files
-search_log_path = 'data_processing/data/search_log.csv'
-product_data_path = 'data_processing/data/product_data.csv'
-output_path = 'data_processing/data/historical_data.csv'
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Aggregate the search log into historical search features.")
+    # Paths to input and output files
+    parser.add_argument("--search-log", default='data_processing/data/search_log.csv')
+    parser.add_argument("--product-data", default='data_processing/data/product_data.csv')
+    parser.add_argument("--output", default='data_processing/data/historical_data.csv')
+    parser.add_argument(
+        "--mode",
+        choices=['columnar', 'loop'],
+        default='columnar',
+        help="'columnar' computes every metric in one grouped pass; 'loop' is the original per-group loop",
+    )
+    parser.add_argument("--chunksize", type=int, default=None, help="Read the search log in chunks of this many rows")
+    args = parser.parse_args()
 
-# Generate the historical data
-generate_historical_data(search_log_path, product_data_path, output_path)
+    # Generate the historical data
+    generate_historical_data(args.search_log, args.product_data, args.output, mode=args.mode, chunksize=args.chunksize)
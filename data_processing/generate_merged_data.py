@@ -1,17 +1,30 @@
+import os
+import sys
+
 import pandas as pd
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from fashion_search.ingest import load_historical_table, load_product_table
+from fashion_search.timing import StageTimings
+
 def merge_data(historical_data_path, product_data_path, output_path):
+    timings = StageTimings()
+
     # Load historical data and product data
-    historical_data = pd.read_csv(historical_data_path)
-    product_data = pd.read_csv(product_data_path)
+    with timings.stage("load"):
+        historical_data = load_historical_table(historical_data_path)
+        product_data = load_product_table(product_data_path)
 
     # Merge the two datasets on the '_id' column
-    merged_data = pd.merge(historical_data, product_data, on='_id', how='left')
+    with timings.stage("join"):
+        merged_data = pd.merge(historical_data, product_data, on='_id', how='left')
 
     # Save the merged dataset to a new CSV file
-    merged_data.to_csv(output_path, index=False)
+    with timings.stage("write_csv"):
+        merged_data.to_csv(output_path, index=False)
 
     print(f"Merged data has been saved to {output_path}")
+    print(timings.report())
 
 # Paths to input and output files
 historical_data_path = 'data_processing/data/historical_data.csv'
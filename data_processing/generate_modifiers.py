@@ -1,96 +1,181 @@
-import re
-import csv
+import argparse
 import json
-import time
+import os
+import sys
 from collections import defaultdict
 
-# Helper function to create valid keys
-def make_modifier_key(value: str) -> str:
-    return re.sub(r"[^a-zA-Z0-9_]", "_", value).lower()
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from fashion_search.ingest import iter_chunk_records, iter_product_chunks, load_historical_table
+from fashion_search.evaluation import HOLDOUT_FRACTION, split_history
+from fashion_search.image_mirror import DEFAULT_BASE_URL, DEFAULT_MIRROR_DIR, ImageMirror
+from fashion_search.query_keys import query_key
+from fashion_search.signal_store import DEFAULT_SIGNAL_STORE, RevenueSignalStore
+from fashion_search.timing import StageTimings
 
-# Load historical data from a CSV file
+# Historical data as a typed table (query, _id, interaction counts and revenue columns)
 def load_historical_data(csv_file):
-    historical_data = []
-    with open(csv_file, mode='r') as file:
-        reader = csv.DictReader(file)
-        for row in reader:
-            # Convert numeric fields to appropriate types
-            row["total_purchases"] = int(row["total_purchases"])
-            row["add_to_cart_count"] = int(row["add_to_cart_count"])
-            row["total_click_count"] = int(row["total_click_count"])
-            row["one_day_revenue"] = float(row["one_day_revenue"])
-            row["three_day_revenue"] = float(row["three_day_revenue"])
-            row["five_day_revenue"] = float(row["five_day_revenue"])
-            historical_data.append(row)
-    return historical_data
-
-# Load product data from a CSV file
+    return load_historical_table(csv_file)
+
+# Product rows as dicts, read from the typed product table a chunk at a time so streaming stays flat in memory
+def iter_product_data(csv_file):
+    return iter_chunk_records(iter_product_chunks(csv_file))
+
+# Load product data as a list of dicts
 def load_product_data(csv_file):
-    product_data = []
-    with open(csv_file, mode='r') as file:
-        reader = csv.DictReader(file)
-        for row in reader:
-            # Convert numeric fields to appropriate types
-            row["cost"] = float(row["cost"])
-            row["in_stock"] = row["in_stock"].lower() == 'true'
-            product_data.append(row)
-    return product_data
+    return list(iter_product_data(csv_file))
+
+# Group historical rows by product _id, normalizing each distinct query only once
+def build_history_index(historical_data):
+    queries = historical_data["query"].tolist()
+    query_keys = {query: query_key(query) for query in dict.fromkeys(queries)}
+    history_by_id = defaultdict(list)
+    for _id, query, one_day, three_day, five_day in zip(
+        historical_data["_id"].tolist(),
+        queries,
+        historical_data["one_day_revenue"].tolist(),
+        historical_data["three_day_revenue"].tolist(),
+        historical_data["five_day_revenue"].tolist(),
+    ):
+        history_by_id[_id].append((query_keys[query], one_day, three_day, five_day))
+    return history_by_id
+
+# Keep the history rows of the top_k queries with the most revenue (five day, then three, then one)
+def top_history(rows, top_k):
+    if top_k is None or len(rows) <= top_k:
+        return rows
+    ranked = sorted(rows, key=lambda row: (row[3], row[2], row[1]), reverse=True)
+    keep = set()
+    for row in ranked:
+        if len(keep) == top_k:
+            break
+        keep.add(row[0])
+    return [row for row in rows if row[0] in keep]
+
+# Add exact match boosters and revenue modifiers to a single product
+def update_product(product, history_by_id, top_k=None):
+    product_name_key = query_key(product["product_name"])
+    product["exact_match_boosters"] = {product_name_key: 1000}
+
+    # Initialize revenue modifiers as nested dictionaries
+    one_day_revenue_modifiers = {}
+    three_day_revenue_modifiers = {}
+    five_day_revenue_modifiers = {}
+
+    # Rows are kept in file order, so key order matches the original nested loop
+    # With top_k, the remaining queries are served from the revenue signal store instead
+    # Spellings of the same query share a canonical key, so their revenue is summed
+    for query_name_key, one_day, three_day, five_day in top_history(history_by_id.get(product["_id"], ()), top_k):
+        if one_day > 0:
+            one_day_revenue_modifiers[query_name_key] = one_day_revenue_modifiers.get(query_name_key, 0.0) + one_day
+        if three_day > 0:
+            three_day_revenue_modifiers[query_name_key] = three_day_revenue_modifiers.get(query_name_key, 0.0) + three_day
+        if five_day > 0:
+            five_day_revenue_modifiers[query_name_key] = five_day_revenue_modifiers.get(query_name_key, 0.0) + five_day
+
+    product["one_day_revenue_modifiers"] = one_day_revenue_modifiers
+    product["three_day_revenue_modifiers"] = three_day_revenue_modifiers
+    product["five_day_revenue_modifiers"] = five_day_revenue_modifiers
+    return product
 
 # Update product data with exact match boosters and revenue modifiers
-def update_product_data(product_data, historical_data):
+def update_product_data(product_data, historical_data, top_k=None):
+    # One pass over the history up front, then an O(1) lookup per product
+    history_by_id = build_history_index(historical_data)
+
     for product in product_data:
-        product_name_key = make_modifier_key(product["product_name"])
-        product["exact_match_boosters"] = {product_name_key: 1000}
-
-        # Initialize revenue modifiers as nested dictionaries
-        product["one_day_revenue_modifiers"] = defaultdict(float)
-        product["three_day_revenue_modifiers"] = defaultdict(float)
-        product["five_day_revenue_modifiers"] = defaultdict(float)
-
-        for hist in historical_data:
-            query_name_key = make_modifier_key(hist["query"])
-            if hist["_id"] == product["_id"]:
-                if hist["one_day_revenue"] > 0:
-                    product["one_day_revenue_modifiers"][query_name_key] = hist["one_day_revenue"]
-                if hist["three_day_revenue"] > 0:
-                    product["three_day_revenue_modifiers"][query_name_key] = hist["three_day_revenue"]
-                if hist["five_day_revenue"] > 0:
-                    product["five_day_revenue_modifiers"][query_name_key] = hist["five_day_revenue"]
-
-        # Convert defaultdicts to regular dictionaries
-        product["one_day_revenue_modifiers"] = dict(product["one_day_revenue_modifiers"])
-        product["three_day_revenue_modifiers"] = dict(product["three_day_revenue_modifiers"])
-        product["five_day_revenue_modifiers"] = dict(product["five_day_revenue_modifiers"])
+        update_product(product, history_by_id, top_k)
 
     return product_data
 
+# Write one JSON document per line as products are enriched, without holding the catalogue in memory
+def write_ndjson(products, history_by_id, output_file, top_k=None):
+    count = 0
+    with open(output_file, "w") as file:
+        for product in products:
+            file.write(json.dumps(update_product(product, history_by_id, top_k), separators=(",", ":")))
+            file.write("\n")
+            count += 1
+    return count
+
 # Main script
 if __name__ == "__main__":
-    historical_data_file = "./data_processing/data/historical_data.csv"  # Path to historical data CSV file
-    product_data_file = "./data_processing/data/product_data.csv"        # Path to product data CSV file
-    output_file = "./data_processing/data/complete_data.json"            # Output JSON file
+    parser = argparse.ArgumentParser(description="Build Marqo documents with exact match boosters and revenue modifiers.")
+    parser.add_argument("--historical-data", default="./data_processing/data/historical_data.csv")  # Path to historical data CSV file
+    parser.add_argument("--product-data", default="./data_processing/data/product_data.csv")        # Path to product data CSV file
+    parser.add_argument(
+        "--format",
+        choices=["json", "ndjson"],
+        default="json",
+        help="'json' writes one indented array; 'ndjson' streams one document per line",
+    )
+    parser.add_argument("--output", default=None, help="Output file (defaults to complete_data.json or complete_data.ndjson)")
+    parser.add_argument("--top-k", type=int, default=None,
+                        help="Only add revenue modifiers for each product's top K queries by revenue")
+    parser.add_argument("--signal-store", nargs="?", const=DEFAULT_SIGNAL_STORE, default=None,
+                        help=f"Also save all revenue signals as a memory-mappable store (default {DEFAULT_SIGNAL_STORE})")
+    parser.add_argument("--exclude-holdout", nargs="?", type=float, const=HOLDOUT_FRACTION, default=None, metavar="FRACTION",
+                        help="Leave out the queries marqo/evaluate_search.py holds out for scoring "
+                             f"(default fraction {HOLDOUT_FRACTION}), so an index built from the output can be evaluated out of sample")
+    parser.add_argument("--image-mirror", nargs="?", const=DEFAULT_MIRROR_DIR, default=None,
+                        help="Point image_url at the images mirrored by mirror_images.py (default mirror location when no directory is given)")
+    parser.add_argument("--image-base-url", default=DEFAULT_BASE_URL,
+                        help="Where `mirror_images.py serve` is reachable from the Marqo container")
+    args = parser.parse_args()
+
+    output_file = args.output or f"./data_processing/data/complete_data.{args.format}"
 
-    start_time = time.time()  # Start timer
+    timings = StageTimings()
+
+    # Images missing from the mirror keep their original URL
+    mirror = ImageMirror(args.image_mirror) if args.image_mirror else None
 
     # Load data
     print("Loading historical data...")
-    historical_data = load_historical_data(historical_data_file)
-    print(f"Loaded historical data in {time.time() - start_time:.2f} seconds.")
+    with timings.stage("load_history"):
+        historical_data = load_historical_data(args.historical_data)
+    print(f"Loaded historical data in {timings['load_history']:.2f} seconds.")
 
-    print("Loading product data...")
-    product_data = load_product_data(product_data_file)
-    print(f"Loaded product data in {time.time() - start_time:.2f} seconds.")
+    if args.exclude_holdout:
+        historical_data, held_out = split_history(historical_data, args.exclude_holdout)
+        print(f"Left out {len(held_out)} rows of held-out queries.")
 
-    # Update product data
-    print("Updating product data...")
-    updated_product_data = update_product_data(product_data, historical_data)
-    print(f"Updated product data in {time.time() - start_time:.2f} seconds.")
+    if args.format == "ndjson":
+        # Stream products from the CSV straight into the output file; reading, joining and writing
+        # are interleaved, so they are timed as one stage
+        print("Streaming updated product data...")
+        with timings.stage("index_history"):
+            history_by_id = build_history_index(historical_data)
+        with timings.stage("stream_products"):
+            products = iter_product_data(args.product_data)
+            if mirror:
+                products = mirror.rewrite(products, args.image_base_url)
+            count = write_ndjson(products, history_by_id, output_file, args.top_k)
+        print(f"Saved {count} documents to {output_file} in {timings['stream_products']:.2f} seconds.")
+    else:
+        print("Loading product data...")
+        with timings.stage("load_products"):
+            product_data = load_product_data(args.product_data)
+            if mirror:
+                product_data = list(mirror.rewrite(product_data, args.image_base_url))
+        print(f"Loaded product data in {timings['load_products']:.2f} seconds.")
 
-    # Save updated product data to JSON file
-    print("Saving updated product data...")
-    with open(output_file, "w") as file:
-        json.dump(updated_product_data, file, indent=4)
-    print(f"Saved updated product data to {output_file} in {time.time() - start_time:.2f} seconds.")
+        # Update product data
+        print("Updating product data...")
+        with timings.stage("join"):
+            updated_product_data = update_product_data(product_data, historical_data, args.top_k)
+        print(f"Updated product data in {timings['join']:.2f} seconds.")
+
+        # Save updated product data to JSON file
+        print("Saving updated product data...")
+        with timings.stage("write_json"):
+            with open(output_file, "w") as file:
+                json.dump(updated_product_data, file, indent=4)
+        print(f"Saved updated product data to {output_file} in {timings['write_json']:.2f} seconds.")
+
+    if args.signal_store:
+        with timings.stage("signal_store"):
+            store = RevenueSignalStore.build(build_history_index(historical_data))
+            store.save(args.signal_store)
+        print(f"Saved {len(store)} revenue signals for {len(store.query_keys)} queries to {args.signal_store}")
 
-    total_time = time.time() - start_time  # End timer
-    print(f"Total execution time: {total_time:.2f} seconds.")
+    print(timings.report("Total execution time"))
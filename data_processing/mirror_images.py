@@ -0,0 +1,107 @@
+import argparse
+import csv
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+from requests.adapters import HTTPAdapter
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from fashion_search.image_mirror import DEFAULT_MIRROR_DIR, ImageMirror
+
+# Download every catalogue image once into the local mirror, so neither Marqo indexing nor the app
+# has to fetch them from S3 again. `fetch` is resumable: images already in the manifest are skipped.
+# `serve` makes the mirror available over HTTP for the rewritten image URLs.
+
+def fetch_images(image_urls, mirror, workers=32, timeout=(3.05, 20), retry_failed=True):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+    def fetch(url):
+        try:
+            response = session.get(url, timeout=timeout)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            mirror.record_failure(url, e)
+            return {"url": url, "error": str(e)}, 0
+        return mirror.add(url, response.content), len(response.content)
+
+    failed_before = set(mirror.failed())
+    pending = [url for url in image_urls if not mirror.is_mirrored(url)
+               and (retry_failed or url not in failed_before)]
+    print(f"{len(image_urls) - len(pending)} images already mirrored or skipped, fetching {len(pending)}")
+
+    start_time = time.time()
+    stats = {"mirrored": 0, "failed": 0, "downloaded_bytes": 0, "stored_bytes": 0}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(fetch, url) for url in pending]
+        for i, future in enumerate(as_completed(futures), start=1):
+            entry, downloaded = future.result()
+            stats["downloaded_bytes"] += downloaded
+            if "error" in entry:
+                stats["failed"] += 1
+            else:
+                stats["mirrored"] += 1
+                stats["stored_bytes"] += entry["bytes"]
+            if i % 500 == 0:
+                elapsed = time.time() - start_time
+                print(f"{i}/{len(pending)} done ({i / elapsed:.1f} images/s, "
+                      f"{stats['downloaded_bytes'] / elapsed / 1e6:.2f} MB/s)")
+
+    stats["elapsed"] = time.time() - start_time
+    stats["images_per_second"] = len(pending) / stats["elapsed"] if pending else 0.0
+    stats["bytes_per_second"] = stats["downloaded_bytes"] / stats["elapsed"] if pending else 0.0
+    return stats
+
+class MirrorRequestHandler(SimpleHTTPRequestHandler):
+    def end_headers(self):
+        # File names are content hashes, so a cached copy never goes stale
+        self.send_header("Cache-Control", "public, max-age=31536000, immutable")
+        super().end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+def serve(directory, host, port):
+    server = ThreadingHTTPServer((host, port), partial(MirrorRequestHandler, directory=directory))
+    print(f"Serving {directory} on http://{host}:{server.server_port}")
+    server.serve_forever()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mirror the catalogue images locally and serve them.")
+    parser.add_argument("--mirror-dir", default=DEFAULT_MIRROR_DIR)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    fetch_parser = commands.add_parser("fetch", help="Download, validate and downscale every product image")
+    fetch_parser.add_argument("--product-data", default="./data_processing/data/product_data.csv")
+    fetch_parser.add_argument("--workers", type=int, default=32)
+    fetch_parser.add_argument("--skip-failed", action="store_true",
+                              help="Do not retry images that failed in an earlier run")
+
+    serve_parser = commands.add_parser("serve", help="Serve the mirror over HTTP")
+    serve_parser.add_argument("--host", default="0.0.0.0", help="0.0.0.0 so the Marqo container can reach it")
+    serve_parser.add_argument("--port", type=int, default=8000)
+
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        serve(args.mirror_dir, args.host, args.port)
+        raise SystemExit(0)
+
+    with open(args.product_data, mode='r') as file:
+        image_urls = list(dict.fromkeys(row["image_url"] for row in csv.DictReader(file)))
+
+    mirror = ImageMirror(args.mirror_dir)
+    stats = fetch_images(image_urls, mirror, workers=args.workers, retry_failed=not args.skip_failed)
+    print(f"Mirrored {stats['mirrored']} images, {stats['failed']} failed, in {stats['elapsed']:.2f} seconds "
+          f"({stats['images_per_second']:.1f} images/s, {stats['bytes_per_second'] / 1e6:.2f} MB/s downloaded)")
+    print(f"Downloaded {stats['downloaded_bytes'] / 1e6:.1f} MB, stored {stats['stored_bytes'] / 1e6:.1f} MB")
+    missing = sum(1 for url in image_urls if not mirror.is_mirrored(url))
+    if missing:
+        print(f"{missing} images are not mirrored; their documents keep the original URL. Rerun to retry them.")
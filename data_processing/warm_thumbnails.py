@@ -0,0 +1,58 @@
+import argparse
+import csv
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+from requests.adapters import HTTPAdapter
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from fashion_search.thumbnails import DEFAULT_CACHE_DIR, IMAGE_DECODE_ERRORS, ThumbnailCache
+
+# Prefetch thumbnails for every product image so the app serves them from the cache
+def warm_thumbnails(image_urls, thumbnail_cache, workers=16, timeout=(3.05, 10)):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+    def download(url):
+        response = session.get(url, timeout=timeout)
+        response.raise_for_status()
+        return response.content
+
+    pending = [image_url for image_url in image_urls if not thumbnail_cache.contains(image_url)]
+    print(f"{len(image_urls) - len(pending)} thumbnails already cached, fetching {len(pending)}")
+
+    start_time = time.time()
+    fetched = 0
+    failed = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(thumbnail_cache.get_or_fetch, image_url, download) for image_url in pending]
+        for i, future in enumerate(as_completed(futures), start=1):
+            try:
+                future.result()
+                fetched += 1
+            except (requests.RequestException, *IMAGE_DECODE_ERRORS):  # Unreachable, or not an image PIL can decode
+                failed += 1
+            if i % 500 == 0:
+                print(f"{i}/{len(pending)} done ({i / (time.time() - start_time):.1f} images/s)")
+    print(f"Fetched {fetched} thumbnails, {failed} failed, in {time.time() - start_time:.2f} seconds")
+    return fetched, failed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prefetch result thumbnails for the whole product catalogue.")
+    parser.add_argument("--product-data", default="./data_processing/data/product_data.csv")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR)
+    parser.add_argument("--disk-mb", type=int, default=512, help="Size bound of the on-disk thumbnail store")
+    parser.add_argument("--workers", type=int, default=16)
+    args = parser.parse_args()
+
+    with open(args.product_data, mode='r') as file:
+        image_urls = list(dict.fromkeys(row["image_url"] for row in csv.DictReader(file)))
+
+    # Keep the memory tier small: warming only needs the disk store
+    thumbnail_cache = ThumbnailCache(args.cache_dir, memory_bytes=0, disk_bytes=args.disk_mb * 1024 * 1024)
+    warm_thumbnails(image_urls, thumbnail_cache, workers=args.workers)
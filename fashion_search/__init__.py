@@ -0,0 +1,7 @@
+# Shared code used by the Streamlit app and the scripts in data_processing/ and marqo/
+import os
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Local caches and state files, ignored by git
+CACHE_DIR = os.path.join(REPO_ROOT, ".cache")
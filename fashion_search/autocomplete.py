@@ -0,0 +1,171 @@
+import bisect
+import csv
+import hashlib
+import os
+import threading
+import time
+
+import numpy as np
+
+from fashion_search.query_keys import normalize_query, query_key
+from fashion_search.ingest import DEFAULT_HISTORICAL_DATA
+
+# Query suggestions from the search logs. Every normalized spelling of a logged query is kept in one
+# sorted list, so the completions of a prefix are a contiguous range found by binary search. Spellings
+# of the same canonical key are ranked together by that key's five day revenue, then its clicks, and
+# only the best spelling of each key is suggested, so a suggestion hits the exact_match_boosters key.
+
+class PrefixIndex:
+    """Sorted spellings with a global rank each (0 is the best); immutable once built."""
+
+    def __init__(self, spellings, keys, ranks, revenue, clicks):
+        self.spellings = spellings  # Sorted
+        self.keys = keys
+        self.ranks = ranks  # np.int32, parallel to spellings
+        self.revenue = revenue
+        self.clicks = clicks
+
+    @classmethod
+    def build(cls, key_stats, spelling_counts):
+        """key_stats: {key: [five_day_revenue, clicks]}; spelling_counts: {spelling: [key, times logged]}."""
+        spellings = sorted(spelling_counts)
+        keys = [spelling_counts[spelling][0] for spelling in spellings]
+        revenue = np.array([key_stats[key][0] for key in keys], dtype=np.float64)
+        clicks = np.array([key_stats[key][1] for key in keys], dtype=np.int64)
+        counts = np.array([spelling_counts[spelling][1] for spelling in spellings], dtype=np.int64)
+        # np.lexsort sorts by the last key first; ties fall back to alphabetical order
+        order = np.lexsort((np.arange(len(spellings)), -counts, -clicks, -revenue))
+        ranks = np.empty(len(spellings), dtype=np.int32)
+        ranks[order] = np.arange(len(spellings), dtype=np.int32)
+        return cls(spellings, keys, ranks, revenue, clicks)
+
+    def __len__(self):
+        return len(self.spellings)
+
+    def search(self, prefix, limit=8):
+        lo = bisect.bisect_left(self.spellings, prefix)
+        hi = bisect.bisect_left(self.spellings, prefix + "\uffff", lo)
+        if lo == hi:
+            return []
+
+        # Spellings of one key share its rank, so fetch a few extra and fall back to the whole range
+        ranks = self.ranks[lo:hi]
+        for fetch in (limit * 4, len(ranks)):
+            if fetch < len(ranks):
+                candidates = np.argpartition(ranks, fetch)[:fetch]
+            else:
+                candidates = np.arange(len(ranks))
+            candidates = candidates[np.argsort(ranks[candidates])] + lo
+
+            suggestions, seen = [], set()
+            for position in candidates:
+                if self.keys[position] in seen:
+                    continue
+                seen.add(self.keys[position])
+                suggestions.append({
+                    "query": self.spellings[position],
+                    "key": self.keys[position],
+                    "five_day_revenue": float(self.revenue[position]),
+                    "clicks": int(self.clicks[position]),
+                })
+                if len(suggestions) == limit:
+                    return suggestions
+            if fetch >= len(ranks):
+                return suggestions
+
+class Autocomplete:
+    """Suggestions for a search box, kept in step with the historical data file.
+
+    The file is checked at most every `check_interval` seconds; with None, suggest() never checks and
+    the caller runs refresh() itself. Rows appended since the last check are read from where the
+    previous read stopped and merged into the totals; a file that was rewritten in place is read again
+    from the start. The index is rebuilt from the totals and swapped in, so lookups never wait for a
+    rebuild.
+    """
+
+    SIGNATURE_BYTES = 4096  # Compared to tell an append from a rewrite
+
+    def __init__(self, historical_csv=DEFAULT_HISTORICAL_DATA, check_interval=1.0):
+        self.historical_csv = historical_csv
+        self.check_interval = check_interval
+        self.lock = threading.Lock()
+        self.checked_at = 0.0
+        self.index = PrefixIndex.build({}, {})
+        self.reset()
+        self.refresh()
+
+    def reset(self):
+        self.key_stats = {}
+        self.spelling_counts = {}
+        self.offset = 0
+        self.mtime = None
+        self.signature = None
+        self.header = None
+
+    def read_signature(self, file, length):
+        file.seek(0)
+        return hashlib.sha1(file.read(length)).hexdigest()
+
+    def refresh(self):
+        """Reads new rows of the history file, if any; returns how many were added."""
+        if not self.lock.acquire(blocking=False):
+            return 0  # Another thread is already rebuilding; keep serving the current index
+        try:
+            self.checked_at = time.monotonic()
+            with open(self.historical_csv, "rb") as file:
+                stat = os.fstat(file.fileno())
+                if stat.st_size == self.offset and stat.st_mtime_ns == self.mtime:
+                    return 0
+                # A shorter file, or one whose start changed, was rewritten rather than appended to
+                if stat.st_size < self.offset or (
+                    self.offset and self.read_signature(file, min(self.offset, self.SIGNATURE_BYTES)) != self.signature
+                ):
+                    self.reset()
+                self.mtime = stat.st_mtime_ns
+                file.seek(self.offset)
+                data = file.read(stat.st_size - self.offset)
+                # A row still being written is left for the next refresh
+                data = data[:data.rfind(b"\n") + 1]
+                if not data:
+                    return 0
+                self.offset += len(data)
+                self.signature = self.read_signature(file, min(self.offset, self.SIGNATURE_BYTES))
+
+            lines = data.decode("utf-8").splitlines()
+            if self.header is None:
+                self.header = next(csv.reader(lines[:1]))
+                lines = lines[1:]
+            added = 0
+            for row in csv.DictReader(lines, fieldnames=self.header):
+                spelling = normalize_query(row["query"] or "")
+                try:
+                    revenue, clicks = float(row["five_day_revenue"]), int(row["total_click_count"])
+                except (TypeError, ValueError):
+                    continue  # A malformed row must not take suggestions down
+                if not spelling:
+                    continue
+                entry = self.spelling_counts.get(spelling)
+                if entry is None:
+                    entry = self.spelling_counts[spelling] = [query_key(row["query"]), 0]
+                entry[1] += 1
+                stats = self.key_stats.setdefault(entry[0], [0.0, 0])
+                stats[0] += revenue
+                stats[1] += clicks
+                added += 1
+
+            self.index = PrefixIndex.build(self.key_stats, self.spelling_counts)
+            return added
+        finally:
+            self.lock.release()
+
+    def suggest(self, text, limit=8):
+        """Up to `limit` logged queries starting with text, best first."""
+        if self.check_interval is not None and time.monotonic() - self.checked_at >= self.check_interval:
+            self.refresh()
+        prefix = normalize_query(text)
+        if not prefix:
+            return []
+        # "green " should complete "green dress" but not "greenery"
+        if text[-1].isspace():
+            prefix += " "
+        return self.index.search(prefix, limit)
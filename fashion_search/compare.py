@@ -0,0 +1,15 @@
+from itertools import combinations
+
+def result_overlap(ids_by_strategy):
+    """Pairwise overlap between result id lists: shared ids and Jaccard similarity of the sets."""
+    rows = []
+    for (name_a, ids_a), (name_b, ids_b) in combinations(ids_by_strategy.items(), 2):
+        set_a, set_b = set(ids_a), set(ids_b)
+        union = set_a | set_b
+        rows.append({
+            "strategy_a": name_a,
+            "strategy_b": name_b,
+            "shared": len(set_a & set_b),
+            "jaccard": len(set_a & set_b) / len(union) if union else 1.0,
+        })
+    return rows
@@ -0,0 +1,112 @@
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+
+from fashion_search import REPO_ROOT
+
+# Multimodal vectors computed by Marqo, kept on disk so index builds can send them as custom vectors
+# instead of having Marqo download every image and run the model again. Vectors are appended as raw
+# float32 rows to one flat file that is read memory-mapped; a parallel keys file names each row.
+
+DEFAULT_EMBEDDING_STORE = os.path.join(REPO_ROOT, "data_processing", "data", "embeddings")
+
+VECTORS_FILE = "vectors.f32"
+KEYS_FILE = "keys.jsonl"
+META_FILE = "meta.json"
+
+def embedding_key(document):
+    """The image URL and a hash of the title, the two inputs of the multimodal field."""
+    title_hash = hashlib.sha1(document["product_name"].encode("utf-8")).hexdigest()[:16]
+    return f"{document['image_url']}#{title_hash}"
+
+class EmbeddingStore:
+    """Append-only vector store keyed by embedding_key.
+
+    `fingerprint` describes how the vectors were made (model and field weights); opening a store
+    made with a different fingerprint raises ValueError rather than mixing incompatible vectors.
+    """
+
+    def __init__(self, directory=DEFAULT_EMBEDDING_STORE, fingerprint=None):
+        self.directory = directory
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+        self.meta = {"fingerprint": fingerprint, "dimension": None}
+        meta_path = os.path.join(directory, META_FILE)
+        if os.path.exists(meta_path):
+            with open(meta_path, "r") as file:
+                stored = json.load(file)
+            if fingerprint is not None and stored["fingerprint"] != fingerprint:
+                raise ValueError(
+                    f"Embedding store {directory} was built for {stored['fingerprint']}, not {fingerprint}"
+                )
+            self.meta = stored
+
+        self.rows = {}
+        keys_path = os.path.join(directory, KEYS_FILE)
+        if os.path.exists(keys_path):
+            with open(keys_path, "rb+") as file:
+                content = file.read()
+                # Drop a line cut off by an interrupted write so the next append starts on a fresh line
+                complete = content[:content.rfind(b"\n") + 1]
+                file.truncate(len(complete))
+            for row, line in enumerate(complete.decode("utf-8").splitlines()):
+                self.rows[json.loads(line)] = row
+        self.vectors = None
+        if self.dimension:
+            # Rows written without a key (an interrupted append) are dropped, so keys and rows stay aligned
+            with open(os.path.join(directory, VECTORS_FILE), "ab") as file:
+                file.truncate(len(self.rows) * self.dimension * 4)
+            self.remap(len(self.rows))
+
+    @property
+    def dimension(self):
+        return self.meta["dimension"]
+
+    def remap(self, count):
+        if count:
+            self.vectors = np.memmap(os.path.join(self.directory, VECTORS_FILE), dtype=np.float32, mode="r",
+                                     shape=(count, self.dimension))
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __contains__(self, key):
+        return key in self.rows
+
+    def get(self, key):
+        row = self.rows.get(key)
+        return None if row is None else self.vectors[row]
+
+    def add(self, vectors_by_key):
+        """Appends {key: vector} entries for keys not stored yet; returns how many were added."""
+        with self.lock:
+            new = {key: vector for key, vector in vectors_by_key.items() if key not in self.rows}
+            if not new:
+                return 0
+            matrix = np.asarray(list(new.values()), dtype=np.float32)
+            if self.dimension is None:
+                self.meta["dimension"] = matrix.shape[1]
+                with open(os.path.join(self.directory, META_FILE), "w") as file:
+                    json.dump(self.meta, file)
+            elif matrix.shape[1] != self.dimension:
+                raise ValueError(f"Expected {self.dimension}-dimensional vectors, got {matrix.shape[1]}")
+
+            # Vectors first, keys second: a key is only ever written for a complete row
+            with open(os.path.join(self.directory, VECTORS_FILE), "ab") as file:
+                file.write(matrix.tobytes())
+                file.flush()
+                os.fsync(file.fileno())
+            with open(os.path.join(self.directory, KEYS_FILE), "a") as file:
+                for key in new:
+                    file.write(json.dumps(key) + "\n")
+                file.flush()
+                os.fsync(file.fileno())
+            # Map the longer file before publishing the new rows, so concurrent readers never index past it
+            self.remap(len(self.rows) + len(new))
+            for key in new:
+                self.rows[key] = len(self.rows)
+            return len(new)
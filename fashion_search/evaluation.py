@@ -0,0 +1,189 @@
+import csv
+import hashlib
+import itertools
+from collections import defaultdict
+
+import numpy as np
+
+from fashion_search.pagination import item_id
+from fashion_search.signal_store import WINDOWS
+from fashion_search.query_keys import query_key as make_query_key
+
+# Offline relevance evaluation with the logged interactions as graded labels: a purchase is worth
+# 3, an add-to-cart 2 and a click 1. Ranked lists for many queries are scored together as padded
+# (queries x k) arrays, so evaluating a strategy or a weight setting is a handful of NumPy operations.
+
+# Share of logged queries held out: their rows are only used as labels, never to build the
+# revenue features, so the modifiers are scored on queries they were not built from
+HOLDOUT_FRACTION = 0.2
+
+PURCHASE_GRADE = 3
+ADD_TO_CART_GRADE = 2
+CLICK_GRADE = 1
+
+def interaction_grade(row):
+    if int(row["total_purchases"]) > 0:
+        return PURCHASE_GRADE
+    if int(row["add_to_cart_count"]) > 0:
+        return ADD_TO_CART_GRADE
+    if int(row["total_click_count"]) > 0:
+        return CLICK_GRADE
+    return 0
+
+def is_held_out(query, fraction=HOLDOUT_FRACTION):
+    """Whether a logged query is in the test split, stable across runs.
+
+    Decided by a hash of its query_key, the key every revenue feature is stored under, so all
+    spellings of a query fall on the same side and a held-out query gets no revenue from training.
+    """
+    digest = hashlib.sha256(make_query_key(query).encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") < fraction * 2 ** 64
+
+def split_history(history, fraction=HOLDOUT_FRACTION):
+    """(training rows, held-out rows) of a historical table, split by query key."""
+    held_out = {query: is_held_out(query, fraction) for query in dict.fromkeys(history["query"].tolist())}
+    mask = history["query"].map(held_out).to_numpy(dtype=bool)
+    return history[~mask], history[mask]
+
+class RelevanceLabels:
+    """Graded relevance and five-day revenue per (query, _id) from historical_data.csv.
+
+    With query_filter, only the rows of queries it returns True for are kept, e.g. is_held_out.
+    """
+
+    def __init__(self, historical_csv, query_filter=None):
+        self.grades = defaultdict(dict)  # query -> {_id: grade}
+        self.revenue = defaultdict(dict)  # query -> {_id: five day revenue}
+        with open(historical_csv, mode='r') as file:
+            for row in csv.DictReader(file):
+                if query_filter is not None and not query_filter(row["query"]):
+                    continue
+                grade = interaction_grade(row)
+                if grade:
+                    self.grades[row["query"]][row["_id"]] = grade
+                revenue = float(row["five_day_revenue"])
+                if revenue > 0:
+                    self.revenue[row["query"]][row["_id"]] = revenue
+
+    @property
+    def queries(self):
+        return list(self.grades)
+
+    def ideal_gains(self, queries, k):
+        """Gains of the best possible top-k ranking for each query, as a (queries x k) array."""
+        ideal = np.zeros((len(queries), k))
+        for row, query in enumerate(queries):
+            grades = sorted(self.grades.get(query, {}).values(), reverse=True)[:k]
+            ideal[row, :len(grades)] = grades
+        return ideal
+
+    def label_matrix(self, queries, ranked_ids, k):
+        """Grades and revenue of ranked ids, as padded (queries x k) arrays."""
+        grades = np.zeros((len(queries), k))
+        revenue = np.zeros((len(queries), k))
+        for row, (query, ids) in enumerate(zip(queries, ranked_ids)):
+            query_grades = self.grades.get(query, {})
+            query_revenue = self.revenue.get(query, {})
+            for column, _id in enumerate(ids[:k]):
+                grades[row, column] = query_grades.get(_id, 0)
+                revenue[row, column] = query_revenue.get(_id, 0.0)
+        return grades, revenue
+
+def dcg(grades):
+    discounts = 1.0 / np.log2(np.arange(2, grades.shape[1] + 2))
+    return ((2.0 ** grades - 1.0) * discounts).sum(axis=1)
+
+def score_rankings(grades, revenue, ideal):
+    """Mean NDCG, MRR and revenue over a batch of rankings given as (queries x k) arrays."""
+    ideal_dcg = dcg(ideal)
+    ndcg = np.divide(dcg(grades), ideal_dcg, out=np.zeros(len(grades)), where=ideal_dcg > 0)
+    relevant = grades > 0
+    first_relevant = relevant.argmax(axis=1)
+    reciprocal_rank = np.where(relevant.any(axis=1), 1.0 / (first_relevant + 1), 0.0)
+    return {
+        "ndcg": float(ndcg.mean()) if len(ndcg) else 0.0,
+        "mrr": float(reciprocal_rank.mean()) if len(reciprocal_rank) else 0.0,
+        "revenue": float(revenue.sum(axis=1).mean()) if len(revenue) else 0.0,
+    }
+
+def evaluate_rankings(labels, rankings, k=20):
+    """Scores {query: [_id, ...]} rankings (already deduplicated to unique products) at cutoff k."""
+    queries = [query for query in rankings if query in labels.grades]
+    grades, revenue = labels.label_matrix(queries, [rankings[query] for query in queries], k)
+    metrics = score_rankings(grades, revenue, labels.ideal_gains(queries, k))
+    metrics["queries"] = len(queries)
+    return metrics
+
+class CandidateSet:
+    """Fixed candidate lists per query with the features the revenue score modifiers use.
+
+    Used to grid search modifier weights offline: candidates are retrieved once, then each weight
+    setting only re-sorts them. Scores are approximated as the retrieved score plus the weighted
+    features; Marqo applies hybrid modifiers before rank fusion, so this ranks like, but does not
+    reproduce, a live search with the same weights. Candidates are deduplicated to one hit per
+    product on the retrieved order. Revenue features come from signal_store when one is given, so
+    documents built with --top-k still see every query. To score weights on held-out labels, pass a
+    store built from the training rows only (RevenueSignalStore.from_history on split_history's first part).
+    """
+
+    # Named like the rerank_weights.json entries, so the best weights can be copied across
+    FEATURES = ["exact_match"] + [f"{window}_revenue_modifiers" for window in WINDOWS]
+
+    def __init__(self, labels, candidates, documents_by_id, k=20, signal_store=None):
+        # candidates: {query: [(_id, score), ...]} in retrieved order
+        self.k = k
+        self.queries = [query for query in candidates if query in labels.grades]
+        width = max((len(candidates[query]) for query in self.queries), default=0)
+        shape = (len(self.queries), width)
+        self.base = np.full(shape, -np.inf)
+        self.features = {name: np.zeros(shape) for name in self.FEATURES}
+        self.grades = np.zeros(shape)
+        self.revenue = np.zeros(shape)
+
+        for row, query in enumerate(self.queries):
+            query_key = make_query_key(query)
+            for column, (_id, score) in enumerate(self.unique_candidates(candidates[query])):
+                document = documents_by_id.get(_id, {})
+                self.base[row, column] = score
+                self.features["exact_match"][row, column] = document.get("exact_match_boosters", {}).get(query_key, 0) > 0
+                if signal_store is None:
+                    for window in WINDOWS:
+                        modifiers = document.get(f"{window}_revenue_modifiers", {})
+                        self.features[f"{window}_revenue_modifiers"][row, column] = modifiers.get(query_key, 0.0)
+                self.grades[row, column] = labels.grades[query].get(_id, 0)
+                self.revenue[row, column] = labels.revenue.get(query, {}).get(_id, 0.0)
+            if signal_store is not None:
+                ids = [_id for _id, _ in self.unique_candidates(candidates[query])]
+                revenue = signal_store.lookup(query_key, ids)
+                for position, window in enumerate(WINDOWS):
+                    self.features[f"{window}_revenue_modifiers"][row, :len(ids)] = revenue[:, position]
+        self.ideal = labels.ideal_gains(self.queries, k)
+
+    @staticmethod
+    def unique_candidates(hits):
+        seen = set()
+        for _id, score in hits:
+            if item_id({"_id": _id}) not in seen:
+                seen.add(item_id({"_id": _id}))
+                yield _id, score
+
+    def evaluate(self, weights):
+        """Metrics after re-sorting every query's candidates by base score plus weighted features."""
+        scores = self.base.copy()
+        for name, weight in weights.items():
+            if weight:
+                scores += weight * self.features[name]
+        order = np.argsort(-scores, axis=1, kind="stable")[:, :self.k]
+        grades = np.take_along_axis(self.grades, order, axis=1)
+        revenue = np.take_along_axis(self.revenue, order, axis=1)
+        return score_rankings(grades, revenue, self.ideal)
+
+    def grid_search(self, grid, objective="ndcg"):
+        """Evaluates every combination in {feature: [weights]}; returns results sorted best first."""
+        names = list(grid)
+        results = []
+        for values in itertools.product(*(grid[name] for name in names)):
+            weights = dict(zip(names, values))
+            results.append({"weights": weights, **self.evaluate(weights)})
+        results.sort(key=lambda result: result[objective], reverse=True)
+        return results
@@ -0,0 +1,141 @@
+import hashlib
+import io
+import json
+import os
+import re
+import threading
+from urllib.parse import urlparse
+
+from PIL import Image
+
+from fashion_search import REPO_ROOT
+
+# Local copy of the catalogue images. Each image is validated, downscaled and stored under the SHA-256
+# of its stored bytes, so identical images share one file and a file name never changes meaning. A
+# manifest records which source URL maps to which file; it is appended to as images arrive, so an
+# interrupted fetch resumes where it stopped.
+
+DEFAULT_MIRROR_DIR = os.path.join(REPO_ROOT, "data_processing", "data", "images")
+DEFAULT_BASE_URL = "http://host.docker.internal:8000"  # The host as seen from the Marqo container
+
+MANIFEST_FILE = "manifest.jsonl"
+MAX_SIZE = (512, 512)  # Bounding box; larger than the model input, so embeddings are unaffected
+MIN_SIDE = 32  # Smaller images are placeholders or broken
+JPEG_QUALITY = 90
+ALLOWED_FORMATS = {"JPEG", "PNG", "WEBP", "GIF"}
+
+FILE_PATTERN = re.compile(r"([0-9a-f]{2})/([0-9a-f]{64})\.jpg$")
+
+# Function to validate an image and re-encode it within MAX_SIZE
+def prepare_image(image_bytes, max_size=MAX_SIZE, quality=JPEG_QUALITY):
+    """Returns (stored bytes, width, height). Raises ValueError for anything that is not a usable image."""
+    try:
+        image = Image.open(io.BytesIO(image_bytes))
+        image.verify()  # Checks the file structure; the image must be reopened afterwards
+        image = Image.open(io.BytesIO(image_bytes))
+        width, height = image.size
+        fits = width <= max_size[0] and height <= max_size[1]
+        if not fits:
+            # Let the JPEG decoder skip detail that downscaling would throw away; a no-op for other formats
+            image.draft("RGB", max_size)
+        image.load()
+    except (OSError, SyntaxError, ValueError, Image.DecompressionBombError) as e:
+        raise ValueError(f"not a valid image: {e}") from e
+    if image.format not in ALLOWED_FORMATS:
+        raise ValueError(f"unsupported format {image.format}")
+    if min(width, height) < MIN_SIDE:
+        raise ValueError(f"too small ({width}x{height})")
+
+    # JPEGs that already fit are kept byte for byte, so they are not recompressed
+    if image.format == "JPEG" and fits:
+        return image_bytes, width, height
+    image.thumbnail(max_size, Image.LANCZOS)
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue(), image.width, image.height
+
+def local_file(image_url, directory=DEFAULT_MIRROR_DIR):
+    """The mirrored file a rewritten image URL points at, or None if the URL is not a mirror URL."""
+    match = FILE_PATTERN.search(urlparse(image_url).path)
+    if not match:
+        return None
+    path = os.path.join(directory, match.group(1), f"{match.group(2)}.jpg")
+    return path if os.path.exists(path) else None
+
+class ImageMirror:
+    """Content-addressed image files plus the manifest mapping source URLs to them."""
+
+    def __init__(self, directory=DEFAULT_MIRROR_DIR):
+        self.directory = directory
+        self.lock = threading.Lock()
+        self.entries = {}  # source URL -> manifest entry; the last entry for a URL wins
+        os.makedirs(directory, exist_ok=True)
+
+        manifest_path = os.path.join(directory, MANIFEST_FILE)
+        if os.path.exists(manifest_path):
+            with open(manifest_path, "rb+") as file:
+                content = file.read()
+                # Drop a line cut off by an interrupted write so the next append starts on a fresh line
+                complete = content[:content.rfind(b"\n") + 1]
+                file.truncate(len(complete))
+            for line in complete.decode("utf-8").splitlines():
+                entry = json.loads(line)
+                self.entries[entry["url"]] = entry
+
+    def path(self, file_name):
+        return os.path.join(self.directory, file_name)
+
+    def is_mirrored(self, image_url):
+        entry = self.entries.get(image_url)
+        return entry is not None and "file" in entry and os.path.exists(self.path(entry["file"]))
+
+    def failed(self):
+        return [url for url, entry in self.entries.items() if "error" in entry]
+
+    def record(self, entry):
+        with self.lock:
+            with open(os.path.join(self.directory, MANIFEST_FILE), "a") as file:
+                file.write(json.dumps(entry) + "\n")
+            self.entries[entry["url"]] = entry
+
+    def add(self, image_url, image_bytes):
+        """Validates, downscales and stores one downloaded image; returns its manifest entry."""
+        try:
+            stored, width, height = prepare_image(image_bytes)
+        except ValueError as e:
+            entry = {"url": image_url, "error": str(e)}
+            self.record(entry)
+            return entry
+
+        digest = hashlib.sha256(stored).hexdigest()
+        file_name = f"{digest[:2]}/{digest}.jpg"
+        path = self.path(file_name)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as file:
+                file.write(stored)
+            os.replace(tmp_path, path)
+
+        entry = {"url": image_url, "file": file_name, "bytes": len(stored), "source_bytes": len(image_bytes),
+                 "width": width, "height": height}
+        self.record(entry)
+        return entry
+
+    def record_failure(self, image_url, error):
+        self.record({"url": image_url, "error": str(error)})
+
+    def local_url(self, image_url, base_url=DEFAULT_BASE_URL):
+        """The mirror URL for a source image URL, or the source URL itself if it was not mirrored."""
+        entry = self.entries.get(image_url)
+        if entry is None or "file" not in entry:
+            return image_url
+        return f"{base_url.rstrip('/')}/{entry['file']}"
+
+    def rewrite(self, documents, base_url=DEFAULT_BASE_URL):
+        """Points image_url of each document at the mirror; yields the documents."""
+        for document in documents:
+            document["image_url"] = self.local_url(document["image_url"], base_url)
+            yield document
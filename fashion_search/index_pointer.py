@@ -0,0 +1,55 @@
+import json
+import os
+import threading
+from datetime import datetime, timezone
+
+from fashion_search import REPO_ROOT
+
+# Marqo has no index aliases, so the index that searches go to is named in a pointer file. Blue/green
+# builds populate a new versioned index and then replace the file atomically; readers notice the
+# change by its mtime, so the switch needs no restart. The file is state, not a cache: it lives with
+# the data rather than in .cache/, which can be deleted at any time.
+
+DEFAULT_POINTER_FILE = os.path.join(REPO_ROOT, "data_processing", "data", "active_index.json")
+
+def read_pointer(pointer_file=DEFAULT_POINTER_FILE):
+    """The pointer file contents, or None when no build has switched an index in yet."""
+    try:
+        with open(pointer_file, "r") as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
+
+def write_pointer(index_name, pointer_file=DEFAULT_POINTER_FILE, **details):
+    """Points searches at index_name. details (document count, previous index, ...) are stored alongside."""
+    os.makedirs(os.path.dirname(pointer_file), exist_ok=True)
+    pointer = {"index_name": index_name, "switched_at": datetime.now(timezone.utc).isoformat(), **details}
+    temporary_path = f"{pointer_file}.tmp"
+    with open(temporary_path, "w") as file:
+        json.dump(pointer, file, indent=4)
+    os.replace(temporary_path, pointer_file)
+
+def active_index_name(default, pointer_file=DEFAULT_POINTER_FILE):
+    pointer = read_pointer(pointer_file)
+    return pointer["index_name"] if pointer else default
+
+class IndexPointer:
+    """Active index name for long-running processes, re-read whenever the pointer file changes."""
+
+    def __init__(self, default, pointer_file=DEFAULT_POINTER_FILE):
+        self.default = default
+        self.pointer_file = pointer_file
+        self.lock = threading.Lock()
+        self.mtime = None
+        self.index_name = default
+
+    def current(self):
+        try:
+            mtime = os.stat(self.pointer_file).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        with self.lock:
+            if mtime != self.mtime:
+                self.mtime = mtime
+                self.index_name = active_index_name(self.default, self.pointer_file)
+            return self.index_name
@@ -0,0 +1,146 @@
+import glob
+import hashlib
+import io
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from fashion_search import CACHE_DIR, REPO_ROOT
+
+# Typed loading of the data CSVs into columnar DataFrames. Large files are split at line boundaries
+# and the pieces parsed in a process pool. Each parsed table is cached as Parquet next to the other
+# local caches, keyed on the CSV's path, size, mtime and schema, so later runs and other scripts
+# read the binary copy instead of parsing the CSV again.
+
+DEFAULT_HISTORICAL_DATA = os.path.join(REPO_ROOT, "data_processing", "data", "historical_data.csv")
+DEFAULT_PRODUCT_DATA = os.path.join(REPO_ROOT, "data_processing", "data", "product_data.csv")
+DEFAULT_TABLE_CACHE = os.path.join(CACHE_DIR, "tables")
+
+# Column types per file; columns not listed are left to pandas
+HISTORICAL_SCHEMA = {
+    "query": "str",
+    "_id": "str",
+    "total_purchases": "int64",
+    "add_to_cart_count": "int64",
+    "total_click_count": "int64",
+    "one_day_revenue": "float64",
+    "three_day_revenue": "float64",
+    "five_day_revenue": "float64",
+}
+PRODUCT_SCHEMA = {
+    "image_url": "str",
+    "_id": "str",
+    "product_name": "str",
+    "category": "str",
+    "cost": "float64",
+    "in_stock": "bool",
+}
+
+CHUNK_BYTES = 16 * 1024 * 1024  # Files smaller than this are parsed in the calling process
+CHUNK_ROWS = 10000  # Rows per DataFrame when a table is streamed rather than loaded
+
+# Keep strings such as "NA" or "" as they are, like csv.DictReader did
+CSV_OPTIONS = {"keep_default_na": False, "true_values": ["True", "true"], "false_values": ["False", "false"]}
+
+def chunk_ranges(csv_file, chunk_bytes=CHUNK_BYTES):
+    """The header line and (start, end) byte ranges of about chunk_bytes each, ending at line ends.
+
+    Splitting on raw newlines assumes no quoted field contains one, which holds for the generated CSVs.
+    """
+    size = os.path.getsize(csv_file)
+    with open(csv_file, "rb") as file:
+        header = file.readline()
+        ranges, start = [], file.tell()
+        while start < size:
+            file.seek(min(start + chunk_bytes, size))
+            file.readline()  # Finish the line the boundary fell in
+            end = file.tell()
+            ranges.append((start, end))
+            start = end
+    return header, ranges
+
+def parse_range(csv_file, header, start, end, schema):
+    with open(csv_file, "rb") as file:
+        file.seek(start)
+        data = file.read(end - start)
+    return pd.read_csv(io.BytesIO(header + data), dtype=schema, **CSV_OPTIONS)
+
+def read_table(csv_file, schema, workers=None, chunk_bytes=CHUNK_BYTES):
+    """Parses csv_file with the given column types, in parallel when it spans several chunks."""
+    header, ranges = chunk_ranges(csv_file, chunk_bytes)
+    if len(ranges) <= 1:
+        start, end = ranges[0] if ranges else (len(header), len(header))
+        return parse_range(csv_file, header, start, end, schema)
+    workers = min(workers or os.cpu_count() or 1, len(ranges))
+    starts, ends = zip(*ranges)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        chunks = list(executor.map(parse_range, repeat(csv_file), repeat(header), starts, ends, repeat(schema)))
+    return pd.concat(chunks, ignore_index=True)
+
+def cache_file(csv_file, schema, cache_dir=DEFAULT_TABLE_CACHE):
+    stat = os.stat(csv_file)
+    fingerprint = json.dumps([os.path.abspath(csv_file), stat.st_size, stat.st_mtime_ns, schema])
+    digest = hashlib.sha256(fingerprint.encode("utf-8")).hexdigest()[:16]
+    name = os.path.splitext(os.path.basename(csv_file))[0]
+    return os.path.join(cache_dir, f"{name}-{digest}.parquet")
+
+def load_table(csv_file, schema, cache_dir=DEFAULT_TABLE_CACHE, workers=None):
+    """csv_file as a typed DataFrame, from the Parquet cache when the CSV has not changed.
+
+    cache_dir=None always parses the CSV.
+    """
+    if cache_dir is None:
+        return read_table(csv_file, schema, workers)
+    path = cache_file(csv_file, schema, cache_dir)
+    if os.path.exists(path):
+        return pd.read_parquet(path)
+
+    table = read_table(csv_file, schema, workers)
+    os.makedirs(cache_dir, exist_ok=True)
+    # Earlier versions of the same file are stale now
+    name = os.path.splitext(os.path.basename(csv_file))[0]
+    for stale in glob.glob(os.path.join(cache_dir, f"{glob.escape(name)}-*.parquet")):
+        os.remove(stale)
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+    table.to_parquet(temporary_path, index=False)
+    os.replace(temporary_path, path)
+    return table
+
+def iter_table_chunks(csv_file, schema, cache_dir=DEFAULT_TABLE_CACHE, chunk_rows=CHUNK_ROWS):
+    """csv_file as typed DataFrames of at most chunk_rows rows, so memory stays flat however long the file is.
+
+    Batches come from the Parquet cache when load_table has already written it, else from the CSV
+    parsed chunk by chunk; streaming never writes the cache.
+    """
+    path = cache_file(csv_file, schema, cache_dir) if cache_dir is not None else None
+    if path is not None and os.path.exists(path):
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows):
+            yield batch.to_pandas()
+        return
+    yield from pd.read_csv(csv_file, dtype=schema, chunksize=chunk_rows, **CSV_OPTIONS)
+
+def iter_records(table):
+    """Rows of a table as dicts of Python values, for code that needs mutable records (much faster than to_dict).
+
+    Every column is converted up front, so stream large tables through iter_table_chunks a chunk at a time.
+    """
+    columns = list(table.columns)
+    for values in zip(*(table[column].tolist() for column in columns)):
+        yield dict(zip(columns, values))
+
+def iter_chunk_records(chunks):
+    for chunk in chunks:
+        yield from iter_records(chunk)
+
+def load_historical_table(csv_file=DEFAULT_HISTORICAL_DATA, **options):
+    return load_table(csv_file, HISTORICAL_SCHEMA, **options)
+
+def load_product_table(csv_file=DEFAULT_PRODUCT_DATA, **options):
+    return load_table(csv_file, PRODUCT_SCHEMA, **options)
+
+def iter_product_chunks(csv_file=DEFAULT_PRODUCT_DATA, **options):
+    return iter_table_chunks(csv_file, PRODUCT_SCHEMA, **options)
@@ -0,0 +1,141 @@
+import bisect
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+# Latency histograms per search strategy and stage, rendered in the Prometheus text format. Each
+# histogram keeps cumulative bucket counts (what Prometheus scrapes and rates over) and the same
+# buckets for a rolling window split into slices, from which recent percentiles are estimated
+# without storing individual samples.
+
+# Bucket upper bounds in seconds; wide enough for both sub-millisecond dedup and multi-second searches
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUANTILES = (0.5, 0.95, 0.99)
+
+class LatencyHistogram:
+    """Fixed-bucket histogram with cumulative totals and a rolling window of `window` seconds."""
+
+    def __init__(self, buckets=BUCKETS, window=300, slices=10, clock=time.monotonic):
+        self.buckets = buckets
+        self.slice_seconds = window / slices
+        self.clock = clock
+        self.counts = [0] * (len(buckets) + 1)  # Last bucket is +Inf
+        self.sum = 0.0
+        self.ring = [(None, [0] * (len(buckets) + 1)) for _ in range(slices)]  # (slice number, counts)
+
+    def observe(self, seconds):
+        # Caller holds the registry lock
+        bucket = bisect.bisect_left(self.buckets, seconds)
+        self.counts[bucket] += 1
+        self.sum += seconds
+        number = int(self.clock() // self.slice_seconds)
+        position = number % len(self.ring)
+        if self.ring[position][0] != number:
+            self.ring[position] = (number, [0] * len(self.counts))
+        self.ring[position][1][bucket] += 1
+
+    def recent_counts(self):
+        oldest = int(self.clock() // self.slice_seconds) - len(self.ring) + 1
+        counts = [0] * len(self.counts)
+        for number, slice_counts in self.ring:
+            if number is not None and number >= oldest:
+                for bucket, count in enumerate(slice_counts):
+                    counts[bucket] += count
+        return counts
+
+    def recent_quantile(self, quantile):
+        """Quantile over the rolling window, interpolated within its bucket; None without samples."""
+        counts = self.recent_counts()
+        total = sum(counts)
+        if not total:
+            return None
+        rank = quantile * total
+        seen = 0
+        for bucket, count in enumerate(counts):
+            if seen + count >= rank and count:
+                lower = self.buckets[bucket - 1] if bucket else 0.0
+                if bucket == len(self.buckets):
+                    return lower  # Beyond the last bound only the bound is known
+                return lower + (self.buckets[bucket] - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def format_labels(labels):
+    return ",".join(f'{name}="{escape_label(value)}"' for name, value in labels)
+
+class LatencyMetrics:
+    """Stage latency histograms keyed by labels such as (source, strategy, stage)."""
+
+    def __init__(self, name="fashion_search_stage_seconds", label_names=("source", "strategy", "stage"),
+                 **histogram_options):
+        self.name = name
+        self.label_names = label_names
+        self.histogram_options = histogram_options
+        self.lock = threading.Lock()
+        self.histograms = {}  # label values -> LatencyHistogram
+
+    def observe(self, timings, **labels):
+        """Records every stage of a StageTimings (or {stage: seconds}) under the given labels."""
+        with self.lock:
+            for stage, seconds in timings.items():
+                key = tuple(stage if name == "stage" else labels.get(name, "") for name in self.label_names)
+                histogram = self.histograms.get(key)
+                if histogram is None:
+                    histogram = self.histograms[key] = LatencyHistogram(**self.histogram_options)
+                histogram.observe(seconds)
+
+    def render(self):
+        """All histograms in the Prometheus text exposition format."""
+        lines = [
+            f"# HELP {self.name} Time spent in each stage of serving a search.",
+            f"# TYPE {self.name} histogram",
+        ]
+        recent = [
+            f"# HELP {self.name}_recent Stage latency percentiles over the last few minutes.",
+            f"# TYPE {self.name}_recent summary",
+        ]
+        with self.lock:
+            for key, histogram in sorted(self.histograms.items()):
+                labels = format_labels(zip(self.label_names, key))
+                cumulative = 0
+                for bound, count in zip(list(histogram.buckets) + ["+Inf"], histogram.counts):
+                    cumulative += count
+                    lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f"{self.name}_sum{{{labels}}} {histogram.sum:.6f}")
+                lines.append(f"{self.name}_count{{{labels}}} {cumulative}")
+                for quantile in QUANTILES:
+                    value = histogram.recent_quantile(quantile)
+                    if value is not None:
+                        recent.append(f'{self.name}_recent{{{labels},quantile="{quantile}"}} {value:.6f}')
+        return "\n".join(lines + recent) + "\n"
+
+class SlowRequestLog:
+    """Appends requests slower than `threshold` seconds to a JSON lines file, with their stage breakdown."""
+
+    def __init__(self, path, threshold):
+        self.path = path
+        self.threshold = threshold
+        self.lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def record(self, total, timings, **details):
+        """Logs the request if total exceeds the threshold; returns whether it was logged."""
+        if total < self.threshold:
+            return False
+        entry = {
+            "time": datetime.now(timezone.utc).isoformat(),
+            "total_ms": round(total * 1000, 3),
+            **details,
+            "stages_ms": {stage: round(seconds * 1000, 3) for stage, seconds in timings.items()},
+        }
+        with self.lock:
+            with open(self.path, "a") as file:
+                file.write(json.dumps(entry) + "\n")
+        return True
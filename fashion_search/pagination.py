@@ -0,0 +1,176 @@
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+
+from fashion_search.query_keys import normalize_query
+from fashion_search.timing import StageTimings
+
+PAGE_SIZE = 20  # Unique products per page
+MAX_REQUEST_LIMIT = 400  # Largest limit sent in one Marqo request
+
+# Several images of the same product share the _id prefix before the underscore
+def item_id(hit):
+    return hit['_id'].split('_')[0]
+
+# Function to filter out duplicate items based on the first part of the _id
+def filter_unique_items(hits, max_items=PAGE_SIZE, seen=None):
+    """Filters out duplicate items by keeping only one image per item based on the _id prefix."""
+    unique_items = set() if seen is None else seen
+    filtered_hits = []
+
+    for hit in hits:
+        if max_items is not None and len(filtered_hits) == max_items:  # Stop when we have enough unique items
+            break
+        product_id = item_id(hit)
+        if product_id not in unique_items:
+            unique_items.add(product_id)
+            filtered_hits.append(hit)
+
+    return filtered_hits
+
+class OverfetchEstimator:
+    """Learns how many raw hits each query needs per unique product.
+
+    Queries whose products have many image variants need a larger ratio; the estimate for a query
+    seen before is its own moving average, and new queries start from the average over all queries.
+    """
+
+    def __init__(self, default_ratio=1.5, smoothing=0.5, slack=1.1, max_queries=10000):
+        self.global_ratio = default_ratio
+        self.smoothing = smoothing
+        self.slack = slack  # Ask for a little more than the estimate to avoid a second round trip
+        self.max_queries = max_queries
+        self.ratios = OrderedDict()
+        self.lock = threading.Lock()
+
+    def ratio(self, query):
+        with self.lock:
+            return self.ratios.get(normalize_query(query), self.global_ratio)
+
+    def limit_for(self, query, wanted, observed_ratio=None):
+        """Number of raw hits to request to get about `wanted` unique products."""
+        ratio = self.ratio(query)
+        if observed_ratio is not None:
+            # The duplicate rate already seen for this request is the better guess for the rest of it
+            ratio = max(ratio, observed_ratio)
+        return max(wanted, min(MAX_REQUEST_LIMIT, math.ceil(wanted * ratio * self.slack)))
+
+    def observe(self, query, raw_hits, unique_items):
+        if unique_items == 0:
+            return
+        observed = raw_hits / unique_items
+        key = normalize_query(query)
+        with self.lock:
+            previous = self.ratios.pop(key, observed)
+            self.ratios[key] = previous + self.smoothing * (observed - previous)
+            self.global_ratio += self.smoothing * 0.1 * (observed - self.global_ratio)
+            while len(self.ratios) > self.max_queries:
+                self.ratios.popitem(last=False)
+
+class UniqueResultPager:
+    """Pages through a strategy's results with offset until enough unique products are collected.
+
+    Keeps the unique hits and any unconsumed raw hits fetched so far, so moving to the next page
+    continues from the last offset instead of searching again from the start. For strategies with
+    `rerank` set, the first request fetches at least `reranker.depth` candidates and every fetched
+    batch is reranked before deduplication.
+
+    Hybrid search fuses the top offset + limit hits of the lexical and tensor retrievers, so its
+    ranking changes with the window asked for: hit 40 of one request need not be hit 40 of the next,
+    and consecutive offset windows can skip or repeat products. Hybrid strategies therefore fetch
+    the whole ranking again from the top, one window deeper, and skip the products already shown.
+    Past MAX_REQUEST_LIMIT raw hits they fall back to offset windows of that size, where products
+    can still be skipped (never repeated, since shown products are remembered).
+    """
+
+    def __init__(self, strategy, index, query, cache=None, estimator=None, page_size=PAGE_SIZE, reranker=None):
+        self.strategy = strategy
+        self.index = index
+        self.query = query
+        self.cache = cache
+        self.estimator = estimator or OverfetchEstimator()
+        self.page_size = page_size
+        self.unique_hits = []
+        self.seen = set()
+        self.buffer = deque()  # Raw hits fetched but not yet consumed
+        self.next_offset = 0
+        self.exhausted = False
+        self.requests = 0
+        self.reranker = reranker if strategy.rerank else None
+        self.refetch_from_top = strategy.search_method == "HYBRID"
+        self.timings = StageTimings()  # Per stage time spent serving the last page
+
+    def seed(self, hits):
+        """Starts after a first page served without this pager (the result snapshot); later pages skip its products."""
+        self.unique_hits = list(hits)
+        self.seen = {item_id(hit) for hit in hits}
+        if self.refetch_from_top:
+            # The ranking is fetched from the top again anyway; start about as deep as the first page reached
+            self.next_offset = self.estimator.limit_for(self.query, len(hits))
+
+    def consume(self, count):
+        # Move raw hits from the buffer into unique_hits until count is reached; returns hits consumed
+        consumed = 0
+        while self.buffer and len(self.unique_hits) < count:
+            hit = self.buffer.popleft()
+            consumed += 1
+            product_id = item_id(hit)
+            if product_id not in self.seen:
+                self.seen.add(product_id)
+                self.unique_hits.append(hit)
+        return consumed
+
+    def ensure(self, count):
+        """Fetches until at least `count` unique products are collected or the results run out."""
+        start_unique = len(self.unique_hits)
+        raw_hits = self.consume(count)
+        while len(self.unique_hits) < count and not self.exhausted:
+            found = len(self.unique_hits) - start_unique
+            observed_ratio = raw_hits / found if found else None
+            limit = self.estimator.limit_for(self.query, count - len(self.unique_hits), observed_ratio)
+            if self.reranker is not None and self.next_offset == 0:
+                limit = min(MAX_REQUEST_LIMIT, max(limit, self.reranker.depth))
+            offset = self.next_offset
+            if self.refetch_from_top:
+                if offset < MAX_REQUEST_LIMIT:
+                    offset, limit = 0, min(MAX_REQUEST_LIMIT, offset + limit)
+                else:
+                    limit = MAX_REQUEST_LIMIT
+            start_time = time.perf_counter()
+            res = self.strategy.search(self.index, self.query, cache=self.cache, offset=offset, limit=limit)
+            self.timings.add("search", start_time)
+            self.requests += 1
+            hits = res['hits']
+            if self.reranker is not None:
+                start_time = time.perf_counter()
+                hits = self.reranker.rerank(self.query, hits)
+                self.timings.add("rerank", start_time)
+            if offset == 0 and self.next_offset:
+                # The deeper ranking replaces what was left of the previous one
+                self.buffer = deque(hit for hit in hits if item_id(hit) not in self.seen)
+            else:
+                self.buffer.extend(hits)
+            self.next_offset = offset + len(res['hits'])
+            if len(res['hits']) < limit:
+                self.exhausted = True
+            start_time = time.perf_counter()
+            raw_hits += self.consume(count)
+            self.timings.add("dedup", start_time)
+        if raw_hits and len(self.unique_hits) > start_unique:
+            self.estimator.observe(self.query, raw_hits, len(self.unique_hits) - start_unique)
+
+    def page(self, page_number):
+        """Returns the unique hits on a zero-based page."""
+        start = page_number * self.page_size
+        self.timings = StageTimings()
+        self.ensure(start + self.page_size)
+        return self.unique_hits[start:start + self.page_size]
+
+    def has_next_page(self, page_number):
+        """Whether a page may follow page_number, without sending another request."""
+        if len(self.unique_hits) > (page_number + 1) * self.page_size:
+            return True
+        if any(item_id(hit) not in self.seen for hit in self.buffer):
+            return True
+        return not self.exhausted
@@ -0,0 +1,44 @@
+import functools
+import re
+
+# Keys for the exact_match_boosters and revenue modifier fields. Queries and product names are
+# reduced to a canonical form (lowercase, punctuation removed, plurals stemmed, tokens sorted), so
+# "Green  Dress", "green dress " and "dresses green" all map to the key "dress_green". The generator
+# writes document fields under these keys and the searchers look them up with the same function.
+
+# Function to normalize query text so trivially different spellings share a cache entry
+def normalize_query(query):
+    """Lowercases the query and collapses runs of whitespace."""
+    return " ".join(query.lower().split())
+
+# Helper function to create valid keys
+def make_modifier_key(value: str) -> str:
+    return re.sub(r"[^a-zA-Z0-9_]", "_", value).lower()
+
+# Strips English plural endings only (Porter step 1a plus -xes/-ches/-shes), so unrelated words rarely merge
+def stem(token):
+    if len(token) <= 3 or token.endswith(("ss", "us")):
+        return token
+    if token.endswith("sses"):
+        return token[:-2]
+    if token.endswith("ies"):
+        return token[:-3] + "y"
+    if token.endswith(("xes", "ches", "shes", "zes")):
+        return token[:-2]
+    if token.endswith("s"):
+        return token[:-1]
+    return token
+
+def canonical_query(text):
+    """Lowercased, stemmed tokens without punctuation, sorted and joined with spaces."""
+    tokens = re.findall(r"[a-z0-9]+", text.lower())
+    return " ".join(sorted(stem(token) for token in tokens))
+
+@functools.lru_cache(maxsize=65536)
+def query_key(text):
+    """Canonical field key for a query or product name.
+
+    Text with no [a-z0-9] token at all (only punctuation, or a non-Latin script) falls back to the
+    character-wise key, e.g. "!!!" -> "___", so the key is empty only for empty text.
+    """
+    return make_modifier_key(canonical_query(text)) or make_modifier_key(normalize_query(text))
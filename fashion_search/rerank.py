@@ -0,0 +1,124 @@
+import json
+import os
+import threading
+
+import numpy as np
+
+from fashion_search import REPO_ROOT
+from fashion_search.ingest import DEFAULT_HISTORICAL_DATA, DEFAULT_PRODUCT_DATA, load_historical_table, load_product_table
+from fashion_search.signal_store import DEFAULT_SIGNAL_STORE, VOCABULARY_FILE, WINDOWS, RevenueSignalStore
+from fashion_search.query_keys import query_key
+
+# Client-side reranking: the revenue and exact-match boosts are applied with NumPy to the top
+# candidates of a plain search instead of being sent as Marqo score modifiers. Weights are read
+# from a JSON file and picked up again whenever it changes, so tuning needs no redeploy.
+
+DEFAULT_WEIGHTS_FILE = os.path.join(REPO_ROOT, "rerank_weights.json")
+
+PRODUCT_REVENUE_FEATURES = [f"{window}_revenue" for window in WINDOWS]
+QUERY_REVENUE_FEATURES = [f"{window}_revenue_modifiers" for window in WINDOWS]
+FEATURES = ["_score", "exact_match"] + PRODUCT_REVENUE_FEATURES + QUERY_REVENUE_FEATURES
+
+class FeatureTable:
+    """Per-product arrays used by the reranker, indexed by a row per product _id."""
+
+    def __init__(self, product_ids, name_keys, product_revenue, signal_store):
+        self.rows = {_id: row for row, _id in enumerate(product_ids)}
+        self.name_keys = np.array(name_keys)  # query_key of the product name
+        self.product_revenue = product_revenue  # (products, len(WINDOWS)) revenue summed over queries
+        self.signal_store = signal_store  # Revenue per query and product
+
+    @classmethod
+    def from_csv(cls, historical_csv=DEFAULT_HISTORICAL_DATA, product_csv=DEFAULT_PRODUCT_DATA,
+                 signal_store=DEFAULT_SIGNAL_STORE):
+        """Query revenue comes from the memory-mapped store saved by generate_modifiers.py when there is one."""
+        store = None
+        if signal_store is not None and os.path.exists(os.path.join(signal_store, VOCABULARY_FILE)):
+            store = RevenueSignalStore.load(signal_store)
+        return cls.from_tables(load_historical_table(historical_csv), load_product_table(product_csv), store)
+
+    @classmethod
+    def from_tables(cls, history, products, signal_store=None):
+        """Builds the table from typed historical and product tables, e.g. only the training rows.
+
+        Query revenue is summed from history unless a RevenueSignalStore is given.
+        """
+        product_ids = products["_id"].tolist()
+        name_keys = [query_key(name) for name in products["product_name"]]
+        rows = {_id: row for row, _id in enumerate(product_ids)}
+
+        revenue = history[PRODUCT_REVENUE_FEATURES].to_numpy()
+        positions = history["_id"].map(rows).fillna(-1).to_numpy(dtype=np.int64)
+        product_revenue = np.zeros((len(product_ids), len(WINDOWS)))
+        np.add.at(product_revenue, positions[positions >= 0], revenue[positions >= 0])
+        product_revenue = product_revenue.astype(np.float32)
+        if signal_store is None:
+            signal_store = RevenueSignalStore.from_history(history)
+        return cls(product_ids, name_keys, product_revenue, signal_store)
+
+    def lookup(self, query_key, product_ids):
+        """Feature matrix (len(product_ids) x len(FEATURES) - 1) for one query, without _score."""
+        positions = np.fromiter((self.rows.get(_id, -1) for _id in product_ids), dtype=np.int64,
+                                count=len(product_ids))
+        known = positions >= 0
+        features = np.zeros((len(product_ids), len(FEATURES) - 1), dtype=np.float32)
+        features[known, 0] = self.name_keys[positions[known]] == query_key
+        features[known, 1:1 + len(WINDOWS)] = self.product_revenue[positions[known]]
+        features[:, 1 + len(WINDOWS):] = self.signal_store.lookup(query_key, product_ids)
+        return features
+
+def load_weights(weights_file):
+    with open(weights_file, "r") as file:
+        weights = json.load(file)
+    unknown = set(weights) - set(FEATURES)
+    if unknown:
+        raise ValueError(f"Unknown rerank features in {weights_file}: {', '.join(sorted(unknown))}")
+    return np.array([float(weights.get(feature, 0.0)) for feature in FEATURES])
+
+class Reranker:
+    """Reorders search hits by a weighted sum of their Marqo score and the feature table.
+
+    Hits must come from a search without score modifiers; only the first `depth` hits are reranked
+    and the rest keep their order after them. The weights file is checked for changes on every call.
+    An edit that does not parse keeps the previous weights and is reported in `last_error`.
+    """
+
+    def __init__(self, features, weights_file=DEFAULT_WEIGHTS_FILE, depth=200):
+        self.features = features
+        self.weights_file = weights_file
+        self.depth = depth
+        self.lock = threading.Lock()
+        self.weights_mtime = None
+        self.weights = np.zeros(len(FEATURES))
+        self.last_error = None
+        self.reload_weights()
+
+    def reload_weights(self):
+        with self.lock:
+            try:
+                mtime = os.stat(self.weights_file).st_mtime_ns
+            except FileNotFoundError:
+                mtime = None
+            if mtime == self.weights_mtime:
+                return
+            try:
+                self.weights = load_weights(self.weights_file) if mtime is not None else self.weights
+                self.last_error = None
+            except (ValueError, OSError) as e:
+                self.last_error = str(e)
+            self.weights_mtime = mtime
+
+    def scores(self, query, hits):
+        weights = self.weights
+        features = self.features.lookup(query_key(query), [hit["_id"] for hit in hits])
+        base = np.fromiter((hit.get("_score", 0.0) for hit in hits), dtype=np.float64, count=len(hits))
+        return weights[0] * base + features @ weights[1:]
+
+    def rerank(self, query, hits):
+        """Returns hits with the first `depth` reordered by reranked score."""
+        self.reload_weights()
+        head, tail = hits[:self.depth], hits[self.depth:]
+        if len(head) < 2:
+            return list(hits)
+        order = np.argsort(-self.scores(query, head), kind="stable")
+        return [head[i] for i in order] + list(tail)
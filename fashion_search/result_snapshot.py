@@ -0,0 +1,128 @@
+import json
+import os
+import sys
+import threading
+from datetime import datetime, timezone
+
+from fashion_search import REPO_ROOT
+from fashion_search.query_keys import normalize_query
+
+# First page of unique products for the most searched queries, computed in one batch after indexing
+# (marqo/build_snapshot.py) and served without asking Marqo. Products are stored once in a table and
+# each query keeps the rows of its hits, so head queries sharing products do not repeat them. The
+# snapshot records the index and index generation it was built from and is ignored once either changes.
+
+DEFAULT_SNAPSHOT_FILE = os.path.join(REPO_ROOT, "data_processing", "data", "result_snapshot.json")
+DEFAULT_SNAPSHOT_STRATEGY = "hybrid_exact_revenue"
+
+class ResultSnapshot:
+    """Precomputed (hits, has_next_page) per normalized query for one strategy, index and page size."""
+
+    def __init__(self, strategy, index_name, generation, page_size, products, queries, built_at=None):
+        self.strategy = strategy
+        self.index_name = index_name
+        self.generation = generation  # SearchCache.read_generation() when the snapshot was built
+        self.page_size = page_size
+        self.products = products  # Hit dicts as returned by the search
+        self.queries = queries  # normalized query -> (product rows, has_next_page)
+        self.built_at = built_at
+
+    @classmethod
+    def build(cls, strategy, index_name, generation, page_size, pages):
+        """pages is {query: (hits, has_next_page)}; spellings normalizing to the same query keep the first."""
+        products, rows, queries = [], {}, {}
+        for query, (hits, has_next_page) in pages.items():
+            key = normalize_query(query)
+            if key in queries:
+                continue
+            query_rows = []
+            for hit in hits:
+                row = rows.get(hit["_id"])
+                if row is None:
+                    row = rows[hit["_id"]] = len(products)
+                    products.append(hit)
+                query_rows.append(row)
+            queries[key] = (query_rows, has_next_page)
+        return cls(strategy, index_name, generation, page_size, products, queries,
+                   built_at=datetime.now(timezone.utc).isoformat())
+
+    def save(self, path=DEFAULT_SNAPSHOT_FILE):
+        # Written to a temporary file and renamed, so a running API never reads a partial snapshot
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        snapshot = {
+            "strategy": self.strategy,
+            "index_name": self.index_name,
+            "generation": self.generation,
+            "page_size": self.page_size,
+            "built_at": self.built_at,
+            "products": self.products,
+            "queries": self.queries,
+        }
+        temporary_path = f"{path}.tmp"
+        with open(temporary_path, "w") as file:
+            json.dump(snapshot, file, separators=(",", ":"))
+        os.replace(temporary_path, path)
+
+    @classmethod
+    def load(cls, path=DEFAULT_SNAPSHOT_FILE):
+        with open(path, "r") as file:
+            snapshot = json.load(file)
+        queries = {key: (query_rows, has_next_page) for key, (query_rows, has_next_page) in snapshot["queries"].items()}
+        return cls(snapshot["strategy"], snapshot["index_name"], snapshot["generation"], snapshot["page_size"],
+                   snapshot["products"], queries, snapshot.get("built_at"))
+
+    def __len__(self):
+        return len(self.queries)
+
+    def serves(self, strategy, index_name, generation, page_size):
+        """Whether the snapshot answers requests with these parameters against the current index."""
+        return (strategy == self.strategy and index_name == self.index_name and generation == self.generation
+                and page_size == self.page_size)
+
+    def lookup(self, query):
+        """(hits, has_next_page) for the first page of query, or None when it is not a head query."""
+        entry = self.queries.get(normalize_query(query))
+        if entry is None:
+            return None
+        query_rows, has_next_page = entry
+        products = self.products
+        return [products[row] for row in query_rows], has_next_page
+
+class SnapshotFile:
+    """The snapshot in a file for long-running processes, reloaded whenever the file is replaced.
+
+    A file that cannot be loaded is reported once and ignored until it is replaced again, so
+    requests are searched live instead of failing.
+    """
+
+    def __init__(self, path=DEFAULT_SNAPSHOT_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        self.mtime = None
+        self.snapshot = None
+        self.last_error = None
+
+    def file_mtime(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def changed(self):
+        """Whether current() would reload the file; only a stat, so cheap enough for an event loop."""
+        return self.file_mtime() != self.mtime
+
+    def current(self):
+        """The latest snapshot, or None when there is none or it could not be loaded."""
+        mtime = self.file_mtime()
+        with self.lock:
+            if mtime != self.mtime:
+                self.mtime = mtime
+                self.snapshot, self.last_error = None, None
+                if mtime is not None:
+                    try:
+                        self.snapshot = ResultSnapshot.load(self.path)
+                    except (OSError, ValueError, KeyError, TypeError) as e:
+                        self.last_error = f"{type(e).__name__}: {e}"
+                        print(f"Ignoring result snapshot {self.path}: {self.last_error}", file=sys.stderr)
+            return self.snapshot
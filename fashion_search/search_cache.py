@@ -0,0 +1,104 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from fashion_search import CACHE_DIR
+from fashion_search.query_keys import normalize_query
+
+# Touched by the indexing scripts; every SearchCache drops its entries when the file changes
+DEFAULT_GENERATION_FILE = os.path.join(CACHE_DIR, "index_generation")
+
+def invalidate_search_caches(generation_file=DEFAULT_GENERATION_FILE):
+    """Signals every SearchCache watching generation_file that the index contents changed."""
+    os.makedirs(os.path.dirname(generation_file), exist_ok=True)
+    with open(generation_file, "w") as file:
+        file.write(str(time.time_ns()))
+
+def index_generation(generation_file=DEFAULT_GENERATION_FILE):
+    """Changes whenever invalidate_search_caches() is called; None before it first is."""
+    try:
+        return os.stat(generation_file).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+class SearchCache:
+    """LRU cache with a TTL for Marqo search responses.
+
+    Entries are keyed on the index name, the normalized query and every search parameter, so two
+    strategies never share an entry, while spellings differing only in case or spacing do. Cached
+    responses are shared between callers and must not be modified.
+    """
+
+    def __init__(self, max_entries=1024, ttl=300, generation_file=DEFAULT_GENERATION_FILE, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.generation_file = generation_file
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # key -> (expires_at, response)
+        self.generation = self.read_generation()
+        self.counters = {"hits": 0, "misses": 0, "expired": 0, "evicted": 0, "invalidations": 0}
+
+    def read_generation(self):
+        if self.generation_file is None:
+            return None
+        return index_generation(self.generation_file)
+
+    @staticmethod
+    def make_key(index_name, query, params):
+        return index_name, normalize_query(query), json.dumps(params, sort_keys=True, default=str)
+
+    def check_generation(self):
+        # Caller holds the lock
+        generation = self.read_generation()
+        if generation != self.generation:
+            self.generation = generation
+            self.entries.clear()
+            self.counters["invalidations"] += 1
+
+    def get(self, key):
+        with self.lock:
+            self.check_generation()
+            entry = self.entries.get(key)
+            if entry is None:
+                self.counters["misses"] += 1
+                return None
+            expires_at, response = entry
+            if expires_at <= self.clock():
+                del self.entries[key]
+                self.counters["expired"] += 1
+                self.counters["misses"] += 1
+                return None
+            self.entries.move_to_end(key)
+            self.counters["hits"] += 1
+            return response
+
+    def put(self, key, response):
+        with self.lock:
+            self.entries[key] = (self.clock() + self.ttl, response)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.counters["evicted"] += 1
+
+    def search(self, index, query, **params):
+        """Runs index.search(query, **params) unless an identical search is cached."""
+        key = self.make_key(index.index_name, query, params)
+        response = self.get(key)
+        if response is None:
+            # Marqo gets the query as typed; only the cache key is normalized
+            response = index.search(query, **params)
+            self.put(key, response)
+        return response
+
+    def invalidate(self):
+        """Drops every cached response, e.g. after documents were added or deleted."""
+        with self.lock:
+            self.entries.clear()
+            self.counters["invalidations"] += 1
+
+    def stats(self):
+        with self.lock:
+            return {**self.counters, "entries": len(self.entries)}
@@ -0,0 +1,57 @@
+import requests
+from requests.adapters import HTTPAdapter
+
+# Client for search_api.py, used by app.py. One keep-alive session is shared by all calls.
+
+DEFAULT_API_URL = "http://localhost:8080"
+
+class SearchAPIError(Exception):
+    pass
+
+class SearchClient:
+    def __init__(self, base_url=DEFAULT_API_URL, timeout=(3.05, 30), pool_size=10):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def get(self, path, **params):
+        try:
+            response = self.session.get(f"{self.base_url}{path}", params=params, timeout=self.timeout)
+        except requests.RequestException as e:
+            raise SearchAPIError(f"Search API at {self.base_url} is not reachable: {e}") from e
+        if response.status_code != 200:
+            try:
+                message = response.json()["error"]
+            except (ValueError, KeyError):
+                message = response.text
+            raise SearchAPIError(f"{path} failed with {response.status_code}: {message}")
+        return response.json()
+
+    def strategies(self):
+        """[{"name", "label", "rerank"}] in display order."""
+        return self.get("/strategies")
+
+    def search(self, query, strategy, page=0, page_size=None):
+        params = {"q": query, "strategy": strategy, "page": page}
+        if page_size is not None:
+            params["page_size"] = page_size
+        return self.get("/search", **params)
+
+    def compare(self, query, strategies):
+        return self.get("/compare", q=query, strategy=list(strategies))
+
+    def report_timings(self, strategy, query, stages):
+        """Sends the stages timed on the client side to the API's metrics; failures are ignored."""
+        try:
+            self.session.post(f"{self.base_url}/timings", json={"strategy": strategy, "query": query, "stages": stages},
+                              timeout=self.timeout)
+        except requests.RequestException:
+            pass
+
+    def suggest(self, query, limit=8):
+        if not query.strip():
+            return []
+        return self.get("/suggest", q=query, limit=limit)
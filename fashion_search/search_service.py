@@ -0,0 +1,295 @@
+import asyncio
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import marqo
+from marqo import _httprequests
+from requests.adapters import HTTPAdapter
+
+from fashion_search.autocomplete import Autocomplete
+from fashion_search.compare import result_overlap
+from fashion_search.index_pointer import IndexPointer
+from fashion_search.metrics import LatencyMetrics
+from fashion_search.pagination import (MAX_REQUEST_LIMIT, PAGE_SIZE, OverfetchEstimator, UniqueResultPager,
+                                       filter_unique_items, item_id)
+from fashion_search.query_keys import normalize_query
+from fashion_search.rerank import FeatureTable, Reranker
+from fashion_search.result_snapshot import DEFAULT_SNAPSHOT_FILE, SnapshotFile
+from fashion_search.search_cache import SearchCache
+from fashion_search.strategies import STRATEGIES
+from fashion_search.timing import StageTimings
+
+# The search logic behind search_api.py, independent of the web framework. Marqo's Python client is
+# blocking, so searches run on one bounded thread pool sharing one connection pool; the event loop
+# only waits on them. Identical requests that arrive while one is in flight wait for its result
+# instead of sending their own.
+
+DEFAULT_MARQO_URL = "http://localhost:8882"
+DEFAULT_INDEX_NAME = "fashion-search"  # This must match the index name defined in the config.py file in marqo folder
+
+# Names clients may report timings under. Each becomes a metrics label, so anything else is refused
+# rather than adding a new series per made-up name
+CLIENT_STRATEGIES = frozenset(STRATEGIES) | {"compare"}
+CLIENT_STAGES = frozenset({
+    "api", "images", "render", "total", "thumbnail_cache", "image_download", "thumbnail_encode", "base64",
+})
+
+class UnknownStrategy(ValueError):
+    pass
+
+class UnknownStage(ValueError):
+    pass
+
+class PagerCache:
+    """UniqueResultPager per index, strategy, query and page size, shared by every client.
+
+    Results do not depend on who asks, so page 3 requested by one client continues from the offset
+    page 2 of another client stopped at. Pagers expire after `ttl` seconds and are dropped when the
+    search cache sees the index change.
+    """
+
+    def __init__(self, max_entries=2048, ttl=300, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # key -> (expires_at, generation, pager, pager lock)
+
+    def get(self, key, generation, create):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] <= self.clock() or entry[1] != generation:
+                entry = (self.clock() + self.ttl, generation, create(), threading.Lock())
+                self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return entry[2], entry[3]
+
+    def __len__(self):
+        return len(self.entries)
+
+class SearchService:
+    """Shared Marqo client, caches and thread pool for serving searches to many clients."""
+
+    def __init__(self, marqo_url=DEFAULT_MARQO_URL, default_index=DEFAULT_INDEX_NAME, workers=32,
+                 reranker=None, autocomplete=None, slow_log=None, snapshot_file=DEFAULT_SNAPSHOT_FILE):
+        # marqo.Client has no option for its connection pool: every client sends through one requests
+        # session kept in the private marqo._httprequests module. Its pool is sized to the worker
+        # threads there, which is why marqo is pinned in requirements.txt. Should a later version drop
+        # the session, searches still work with the default pool of 10 connections.
+        session = getattr(_httprequests, "session", None)
+        if session is not None:
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+        else:
+            print("The installed marqo client has no shared session; using its default connection pool", file=sys.stderr)
+        self.client = marqo.Client(marqo_url)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="marqo-search")
+        self.index_pointer = IndexPointer(default_index)
+        self.cache = SearchCache(max_entries=4096, ttl=300)
+        self.estimator = OverfetchEstimator()
+        self.pagers = PagerCache(ttl=self.cache.ttl)
+        self.reranker = reranker or Reranker(FeatureTable.from_csv())
+        # Refreshed by refresh_suggestions() off the event loop, so a rebuild never delays a request
+        self.autocomplete = autocomplete or Autocomplete(check_interval=None)
+        # First pages of the head queries precomputed by marqo/build_snapshot.py
+        self.snapshot = SnapshotFile(snapshot_file)
+        self.snapshot.current()  # Load it now rather than during the first request
+        self.inflight = {}  # request key -> future of the request being served
+        self.counters = {"requests": 0, "coalesced": 0, "snapshot_hits": 0}
+        self.metrics = LatencyMetrics()
+        self.slow_log = slow_log  # Optional SlowRequestLog
+
+    def strategy(self, name):
+        if name not in STRATEGIES:
+            raise UnknownStrategy(f"unknown strategy {name!r}, expected one of {list(STRATEGIES)}")
+        return STRATEGIES[name]
+
+    async def coalesce(self, key, function, *args):
+        """Runs function(*args) on the thread pool, or waits for the identical call already running.
+
+        Returns (result, shared), where shared tells whether the result came from another request.
+        """
+        self.counters["requests"] += 1
+        future = self.inflight.get(key)
+        shared = future is not None
+        if shared:
+            self.counters["coalesced"] += 1
+        else:
+            future = asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+            self.inflight[key] = future
+            future.add_done_callback(lambda done: self.inflight.pop(key) if self.inflight.get(key) is done else None)
+        # A client that disconnects cancels its own wait, not the search other clients are waiting for
+        return await asyncio.shield(future), shared
+
+    def record(self, timings, strategy, **details):
+        """Adds a request's stages to the histograms and, if it was slow, to the slow request log."""
+        self.metrics.observe(timings, source="api", strategy=strategy)
+        if self.slow_log is not None:
+            self.slow_log.record(timings["total"], timings, source="api", strategy=strategy, **details)
+
+    def fetch_page(self, index_name, strategy, query, page, page_size, submitted_at, first_page=None):
+        # first_page: the hits page 0 was served with from the snapshot, which later pages must not repeat
+        def create():
+            pager = UniqueResultPager(strategy, self.client.index(index_name), query, cache=self.cache,
+                                      estimator=self.estimator, page_size=page_size,
+                                      reranker=self.reranker if strategy.rerank else None)
+            if first_page is not None:
+                pager.seed(first_page)
+            return pager
+
+        key = (index_name, strategy.name, normalize_query(query), page_size, first_page is not None)
+        pager, lock = self.pagers.get(key, self.cache.read_generation(), create)
+        with lock:  # A pager is not thread-safe; requests for the same query take turns
+            # Time waiting for a worker thread and for other requests of the same query
+            timings = StageTimings()
+            timings.add("queue", submitted_at)
+            hits = pager.page(page)
+            timings.update(pager.timings)
+            return {"hits": hits, "has_next_page": pager.has_next_page(page), "timings": timings}
+
+    def fetch_unique(self, index_name, strategy, query, submitted_at):
+        timings = StageTimings()
+        timings.add("queue", submitted_at)
+        # Reranked strategies fetch as many candidates as a single search reranks, so compare mode ranks alike
+        overrides = {}
+        if strategy.rerank:
+            overrides["limit"] = min(MAX_REQUEST_LIMIT, max(strategy.template["limit"], self.reranker.depth))
+        with timings.stage("search"):
+            res = strategy.search(self.client.index(index_name), query, cache=self.cache, **overrides)
+        hits = res["hits"]
+        if strategy.rerank:
+            with timings.stage("rerank"):
+                hits = self.reranker.rerank(query, hits)
+        with timings.stage("dedup"):
+            hits = filter_unique_items(hits)
+        return {"hits": hits, "timings": timings}
+
+    async def current_snapshot(self):
+        # A rebuilt snapshot is read and parsed on the thread pool, not on the event loop
+        if self.snapshot.changed():
+            return await asyncio.get_running_loop().run_in_executor(self.executor, self.snapshot.current)
+        return self.snapshot.snapshot
+
+    def from_snapshot(self, snapshot, index_name, strategy, query, page_size):
+        """(hits, has_next_page) of the first page from the head query snapshot, or None when it is not in it."""
+        if snapshot is None:
+            return None
+        if not snapshot.serves(strategy.name, index_name, self.cache.read_generation(), page_size):
+            return None
+        return snapshot.lookup(query)
+
+    async def search(self, query, strategy_name, page=0, page_size=PAGE_SIZE):
+        """One page of unique products for a query."""
+        strategy = self.strategy(strategy_name)
+        index_name = self.index_pointer.current()
+        start_time = time.perf_counter()
+        snapshot_first_page = self.from_snapshot(await self.current_snapshot(), index_name, strategy, query, page_size)
+        snapshot_page = snapshot_first_page if page == 0 else None
+        if snapshot_page is not None:
+            self.counters["snapshot_hits"] += 1
+            hits, has_next_page = snapshot_page
+            timings, shared = StageTimings(), False
+            timings.add("snapshot", start_time)
+        else:
+            key = ("page", index_name, strategy.name, normalize_query(query), page, page_size)
+            # Later pages of a snapshot query continue after the products its first page showed
+            first_page = snapshot_first_page[0] if snapshot_first_page is not None else None
+            result, shared = await self.coalesce(key, self.fetch_page, index_name, strategy, query, page, page_size,
+                                                 start_time, first_page)
+            hits, has_next_page = result["hits"], result["has_next_page"]
+            # Requests that shared another's result only spent time waiting for it
+            timings = StageTimings() if shared else StageTimings(result["timings"])
+        timings.add("total", start_time)
+        self.record(timings, strategy.name, query=query, page=page, index=index_name, coalesced=shared)
+        return {
+            "query": query, "strategy": strategy.name, "index": index_name, "page": page,
+            "hits": hits, "has_next_page": has_next_page, "coalesced": shared,
+            "snapshot": snapshot_page is not None,
+            "timings": {stage: seconds * 1000 for stage, seconds in timings.items()},
+            "took_ms": timings["total"] * 1000,
+        }
+
+    async def compare(self, query, strategy_names):
+        """First page of unique products for several strategies at once, and how much they overlap."""
+        strategies = [self.strategy(name) for name in strategy_names]
+        index_name = self.index_pointer.current()
+        start_time = time.perf_counter()
+
+        async def fetch(strategy):
+            key = ("unique", index_name, strategy.name, normalize_query(query))
+            result, shared = await self.coalesce(key, self.fetch_unique, index_name, strategy, query,
+                                                 time.perf_counter())
+            timings = StageTimings() if shared else StageTimings(result["timings"])
+            timings.add("total", start_time)
+            self.record(timings, strategy.name, query=query, index=index_name, coalesced=shared, compare=True)
+            return {"hits": result["hits"], "took_ms": timings["total"] * 1000}
+
+        results = await asyncio.gather(*(fetch(strategy) for strategy in strategies))
+        by_strategy = {strategy.name: result for strategy, result in zip(strategies, results)}
+        overlap = result_overlap({
+            name: [item_id(hit) for hit in result["hits"]] for name, result in by_strategy.items()
+        })
+        return {"query": query, "index": index_name, "results": by_strategy, "overlap": overlap,
+                "took_ms": (time.perf_counter() - start_time) * 1000}
+
+    def record_client(self, strategy, query, stages):
+        """Stages timed by a client such as app.py (image downloads, rendering), in seconds."""
+        if strategy not in CLIENT_STRATEGIES:
+            raise UnknownStrategy(f"unknown strategy {strategy!r}, expected one of {sorted(CLIENT_STRATEGIES)}")
+        unknown = sorted(set(stages) - CLIENT_STAGES)
+        if unknown:
+            raise UnknownStage(f"unknown stages {unknown}, expected some of {sorted(CLIENT_STAGES)}")
+        timings = StageTimings(stages)
+        self.metrics.observe(timings, source="app", strategy=strategy)
+        if self.slow_log is not None and "total" in timings:
+            self.slow_log.record(timings["total"], timings, source="app", strategy=strategy, query=query)
+
+    async def refresh_suggestions(self, interval=1.0):
+        """Follows appends to the search logs until cancelled."""
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(interval)
+            await loop.run_in_executor(self.executor, self.autocomplete.refresh)
+
+    def suggest(self, text, limit=8):
+        return self.autocomplete.suggest(text, limit)
+
+    def stats(self):
+        snapshot = self.snapshot.snapshot  # As last loaded; reloading is left to searches
+        return {
+            "index": self.index_pointer.current(),
+            "snapshot_queries": len(snapshot) if snapshot is not None else 0,
+            "snapshot_error": self.snapshot.last_error,
+            "cache": self.cache.stats(),
+            "pagers": len(self.pagers),
+            "in_flight": len(self.inflight),
+            **self.counters,
+        }
+
+    def render_metrics(self):
+        """Stage histograms and service counters in the Prometheus text format."""
+        cache = self.cache.stats()
+        lines = [
+            "# TYPE fashion_search_requests_total counter",
+            f"fashion_search_requests_total {self.counters['requests']}",
+            "# TYPE fashion_search_coalesced_requests_total counter",
+            f"fashion_search_coalesced_requests_total {self.counters['coalesced']}",
+            "# TYPE fashion_search_cache_hits_total counter",
+            f"fashion_search_cache_hits_total {cache['hits']}",
+            "# TYPE fashion_search_cache_misses_total counter",
+            f"fashion_search_cache_misses_total {cache['misses']}",
+            "# TYPE fashion_search_snapshot_hits_total counter",
+            f"fashion_search_snapshot_hits_total {self.counters['snapshot_hits']}",
+            "# TYPE fashion_search_in_flight gauge",
+            f"fashion_search_in_flight {len(self.inflight)}",
+        ]
+        return self.metrics.render() + "\n".join(lines) + "\n"
+
+    def close(self):
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,103 @@
+import json
+import os
+from collections import defaultdict
+
+import numpy as np
+
+from fashion_search import REPO_ROOT
+from fashion_search.query_keys import query_key
+
+# Revenue per (query, product) kept outside the Marqo documents. Query keys and product ids are
+# interned to integers and the nonzero values stored as a query-by-product matrix in CSR layout,
+# one .npy file per array, so the store opens memory-mapped and a lookup reads only one query's row.
+
+WINDOWS = ("one_day", "three_day", "five_day")
+DEFAULT_SIGNAL_STORE = os.path.join(REPO_ROOT, "data_processing", "data", "revenue_signals")
+
+VOCABULARY_FILE = "vocabulary.json"
+ARRAY_FILES = ("indptr", "columns", "values")
+
+class RevenueSignalStore:
+    """Query-by-product revenue for the one, three and five day windows."""
+
+    def __init__(self, query_keys, product_ids, indptr, columns, values):
+        self.query_keys = query_keys
+        self.product_ids = product_ids
+        self.query_rows = {key: row for row, key in enumerate(query_keys)}
+        self.product_columns = {_id: column for column, _id in enumerate(product_ids)}
+        self.indptr = indptr  # Row i spans columns[indptr[i]:indptr[i + 1]]
+        self.columns = columns  # Product column per entry, sorted within each row
+        self.values = values  # (entries, len(WINDOWS)) float32 revenue
+
+    @classmethod
+    def from_history(cls, history):
+        """Builds the store from a historical table (fashion_search.ingest.load_historical_table)."""
+        queries = history["query"].tolist()
+        query_keys = {query: query_key(query) for query in dict.fromkeys(queries)}
+        history_by_id = defaultdict(list)
+        revenue = (history[f"{window}_revenue"].tolist() for window in WINDOWS)
+        for _id, query, *values in zip(history["_id"].tolist(), queries, *revenue):
+            history_by_id[_id].append((query_keys[query], *values))
+        return cls.build(history_by_id)
+
+    @classmethod
+    def build(cls, history_by_id):
+        """Builds the store from build_history_index output ({_id: [(query_key, one, three, five), ...]})."""
+        entries = {}
+        for _id, rows in history_by_id.items():
+            for query_key, *revenue in rows:
+                # As in the per-document dicts, spellings sharing a key have their revenue summed
+                current = entries.setdefault((query_key, _id), [0.0] * len(WINDOWS))
+                for window, value in enumerate(revenue):
+                    if value > 0:
+                        current[window] += value
+        entries = {key: revenue for key, revenue in entries.items() if any(revenue)}
+
+        query_keys = sorted({query_key for query_key, _ in entries})
+        product_ids = sorted({_id for _, _id in entries})
+        query_rows = {key: row for row, key in enumerate(query_keys)}
+        product_columns = {_id: column for column, _id in enumerate(product_ids)}
+
+        rows = np.fromiter((query_rows[key] for key, _ in entries), dtype=np.int64, count=len(entries))
+        columns = np.fromiter((product_columns[_id] for _, _id in entries), dtype=np.int32, count=len(entries))
+        values = np.array(list(entries.values()), dtype=np.float32).reshape(-1, len(WINDOWS))
+        order = np.lexsort((columns, rows))
+        indptr = np.zeros(len(query_keys) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=len(query_keys)), out=indptr[1:])
+        return cls(query_keys, product_ids, indptr, columns[order], values[order])
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        for name in ARRAY_FILES:
+            np.save(os.path.join(directory, f"{name}.npy"), getattr(self, name))
+        with open(os.path.join(directory, VOCABULARY_FILE), "w") as file:
+            json.dump({"windows": WINDOWS, "query_keys": self.query_keys, "product_ids": self.product_ids}, file)
+
+    @classmethod
+    def load(cls, directory=DEFAULT_SIGNAL_STORE, mmap=True):
+        with open(os.path.join(directory, VOCABULARY_FILE), "r") as file:
+            vocabulary = json.load(file)
+        arrays = [
+            np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r" if mmap else None)
+            for name in ARRAY_FILES
+        ]
+        return cls(vocabulary["query_keys"], vocabulary["product_ids"], *arrays)
+
+    def __len__(self):
+        return len(self.columns)
+
+    def lookup(self, query_key, product_ids):
+        """Revenue of each product for query_key as a (len(product_ids), len(WINDOWS)) array; zeros when absent."""
+        result = np.zeros((len(product_ids), len(WINDOWS)), dtype=np.float32)
+        row = self.query_rows.get(query_key)
+        if row is None:
+            return result
+        start, end = self.indptr[row], self.indptr[row + 1]
+        row_columns = self.columns[start:end]
+        wanted = np.fromiter((self.product_columns.get(_id, -1) for _id in product_ids), dtype=np.int64,
+                             count=len(product_ids))
+        positions = np.searchsorted(row_columns, wanted)
+        positions = np.minimum(positions, len(row_columns) - 1)
+        found = (wanted >= 0) & (row_columns[positions] == wanted) if len(row_columns) else np.zeros(len(wanted), bool)
+        result[found] = self.values[start + positions[found]]
+        return result
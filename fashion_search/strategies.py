@@ -0,0 +1,184 @@
+# Search strategies shared by app.py and marqo/test_search.py. Each strategy's request is built once
+# when it is registered; only score modifier fields containing "{query_key}" are filled in per query.
+# Add a strategy (other alpha or rrfK values, different weights) by registering a SearchStrategy.
+
+from fashion_search.query_keys import query_key
+
+DEFAULT_LIMIT = 50
+IN_STOCK_FILTER = "in_stock:(true)"
+RESULT_ATTRIBUTES = ["product_name", "image_url", "cost"]
+LEXICAL_ATTRIBUTES = ["product_name"]
+
+def compile_score_modifiers(modifiers):
+    # Static entries are built once and shared between requests; per-query entries stay as (template, weight)
+    compiled = []
+    for field_name, weight in modifiers:
+        if "{query_key}" in field_name:
+            compiled.append((field_name, weight))
+        else:
+            compiled.append({"field_name": field_name, "weight": weight})
+    return compiled
+
+def fill_score_modifiers(compiled, query_key):
+    # Without a key there is no field to name, so the per-query entries are left out
+    return [
+        entry if isinstance(entry, dict) else {"field_name": entry[0].format(query_key=query_key), "weight": entry[1]}
+        for entry in compiled
+        if isinstance(entry, dict) or query_key
+    ]
+
+class SearchStrategy:
+    """A named Marqo search configuration with a precomputed request template."""
+
+    def __init__(
+        self,
+        name,
+        label,
+        search_method="TENSOR",
+        alpha=None,
+        rrf_k=None,
+        tensor_score_modifiers=(),
+        lexical_score_modifiers=(),
+        limit=DEFAULT_LIMIT,
+        filter_string=IN_STOCK_FILTER,
+        attributes_to_retrieve=None,
+        show_highlights=None,
+        rerank=False,
+    ):
+        self.name = name
+        self.label = label
+        self.search_method = search_method
+        self.rerank = rerank  # Hits are reordered client-side by fashion_search.rerank before deduplication
+
+        # Keyword arguments for Index.search, built once. Requests share these objects, so they must not be modified
+        self.template = {"limit": limit, "filter_string": filter_string}
+        if search_method != "TENSOR":
+            self.template["search_method"] = search_method
+        if attributes_to_retrieve is not None:
+            self.template["attributes_to_retrieve"] = attributes_to_retrieve
+        if show_highlights is not None:
+            self.template["show_highlights"] = show_highlights
+
+        self.hybrid_parameters = None
+        self.tensor_modifiers = compile_score_modifiers(tensor_score_modifiers)
+        self.lexical_modifiers = compile_score_modifiers(lexical_score_modifiers)
+        if search_method == "HYBRID":
+            self.hybrid_parameters = {"alpha": alpha, "rrfK": rrf_k}
+            if self.tensor_modifiers:
+                self.hybrid_parameters["scoreModifiersTensor"] = {"add_to_score": self.tensor_modifiers}
+            if self.lexical_modifiers:
+                self.hybrid_parameters["scoreModifiersLexical"] = {"add_to_score": self.lexical_modifiers}
+            self.hybrid_parameters["searchableAttributesLexical"] = LEXICAL_ATTRIBUTES
+            self.template["hybrid_parameters"] = self.hybrid_parameters
+
+        self.per_query = any(
+            not isinstance(entry, dict) for entry in self.tensor_modifiers + self.lexical_modifiers
+        )
+
+    def build_request(self, query_key=None, **overrides):
+        """Returns the keyword arguments for Index.search, with the per-query fields filled in."""
+        request = dict(self.template)
+        if self.per_query:
+            hybrid_parameters = dict(self.hybrid_parameters)
+            for parameter, compiled in (("scoreModifiersTensor", self.tensor_modifiers),
+                                        ("scoreModifiersLexical", self.lexical_modifiers)):
+                modifiers = fill_score_modifiers(compiled, query_key)
+                if modifiers:
+                    hybrid_parameters[parameter] = {"add_to_score": modifiers}
+                else:
+                    hybrid_parameters.pop(parameter, None)
+            request["hybrid_parameters"] = hybrid_parameters
+        request.update(overrides)
+        return request
+
+    def search(self, index, query, cache=None, **overrides):
+        """Runs this strategy against index, through cache when one is given."""
+        request = self.build_request(query_key(query), **overrides)
+        if cache is not None:
+            return cache.search(index, query, **request)
+        return index.search(query, **request)
+
+# Registered strategies by name, in display order
+STRATEGIES = {}
+
+def register_strategy(strategy):
+    STRATEGIES[strategy.name] = strategy
+    return strategy
+
+def get_strategy(name_or_label):
+    """Looks a strategy up by its name or its display label."""
+    if name_or_label in STRATEGIES:
+        return STRATEGIES[name_or_label]
+    for strategy in STRATEGIES.values():
+        if strategy.label == name_or_label:
+            return strategy
+    raise KeyError(f"Unknown search strategy: {name_or_label}")
+
+EXACT_MATCH_BOOSTER = ("exact_match_boosters.{query_key}", 1000)
+
+register_strategy(SearchStrategy(
+    "tensor",
+    "Basic Tensor Search",
+))
+
+register_strategy(SearchStrategy(
+    "hybrid",
+    "Hybrid Search",
+    search_method="HYBRID",
+    alpha=0.5,
+    rrf_k=60,
+    attributes_to_retrieve=RESULT_ATTRIBUTES,
+    show_highlights=False,
+))
+
+register_strategy(SearchStrategy(
+    "hybrid_exact",
+    "Hybrid Search with Exact Match Boosters",
+    search_method="HYBRID",
+    alpha=0.5,
+    rrf_k=60,
+    tensor_score_modifiers=[EXACT_MATCH_BOOSTER],
+    lexical_score_modifiers=[EXACT_MATCH_BOOSTER],
+    attributes_to_retrieve=RESULT_ATTRIBUTES,
+    show_highlights=False,
+))
+
+register_strategy(SearchStrategy(
+    "hybrid_exact_revenue",
+    "Hybrid Search with Exact Match Boosters and Modifiers",
+    search_method="HYBRID",
+    alpha=0.5,
+    rrf_k=60,
+    tensor_score_modifiers=[
+        EXACT_MATCH_BOOSTER,
+        ("one_day_revenue", 0.000002),
+        ("three_day_revenue", 6.6e-7),
+        ("five_day_revenue", 4e-7),
+        ("one_day_revenue_modifiers.{query_key}", 0.000005),
+        ("three_day_revenue_modifiers.{query_key}", 0.00000166666),
+        ("five_day_revenue_modifiers.{query_key}", 0.000001),
+    ],
+    lexical_score_modifiers=[
+        EXACT_MATCH_BOOSTER,
+        ("one_day_revenue", 0.002),
+        ("three_day_revenue", 0.0006),
+        ("five_day_revenue", 0.0004),
+        ("one_day_revenue_modifiers.{query_key}", 1),
+        ("three_day_revenue_modifiers.{query_key}", 0.3333333333333333),
+        ("five_day_revenue_modifiers.{query_key}", 0.2),
+    ],
+    attributes_to_retrieve=RESULT_ATTRIBUTES,
+    show_highlights=False,
+))
+
+# Same boosts as above, applied client-side to the hybrid candidates with the weights in rerank_weights.json
+register_strategy(SearchStrategy(
+    "hybrid_rerank",
+    "Hybrid Search with Client-side Reranking",
+    search_method="HYBRID",
+    alpha=0.5,
+    rrf_k=60,
+    attributes_to_retrieve=RESULT_ATTRIBUTES,
+    show_highlights=False,
+    rerank=True,
+))
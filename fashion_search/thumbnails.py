@@ -0,0 +1,185 @@
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+
+from PIL import Image
+
+from fashion_search import CACHE_DIR
+from fashion_search.timing import StageTimings
+
+DEFAULT_CACHE_DIR = os.path.join(CACHE_DIR, "thumbnails")
+
+THUMBNAIL_SIZE = (200, 200)  # Bounding box matching the 200px image area of a result tile
+THUMBNAIL_FORMAT = "WEBP"
+THUMBNAIL_QUALITY = 80
+
+MIME_TYPES = {"WEBP": "image/webp", "JPEG": "image/jpeg", "PNG": "image/png"}
+FILE_EXTENSIONS = {"WEBP": ".webp", "JPEG": ".jpg", "PNG": ".png"}
+
+# What make_thumbnail raises for a corrupt, truncated or oversized image, as caught by image_mirror.prepare_image
+IMAGE_DECODE_ERRORS = (OSError, SyntaxError, ValueError, Image.DecompressionBombError)
+
+# Function to downscale an image and re-encode it compactly
+def make_thumbnail(image_bytes, size=THUMBNAIL_SIZE, image_format=THUMBNAIL_FORMAT, quality=THUMBNAIL_QUALITY):
+    """Downscales raw image bytes to fit within size and returns the encoded thumbnail bytes."""
+    image = Image.open(io.BytesIO(image_bytes))
+    image.thumbnail(size, Image.LANCZOS)
+    if image_format == "JPEG" and image.mode != "RGB":
+        image = image.convert("RGB")
+    elif image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format, quality=quality)
+    return buffer.getvalue()
+
+class ThumbnailCache:
+    """Two-tier thumbnail cache keyed by image URL: an in-process LRU in front of an on-disk store.
+
+    Both tiers are bounded by total bytes and evict least recently used entries first.
+    """
+
+    def __init__(
+        self,
+        cache_dir=DEFAULT_CACHE_DIR,
+        memory_bytes=32 * 1024 * 1024,
+        disk_bytes=512 * 1024 * 1024,
+        size=THUMBNAIL_SIZE,
+        image_format=THUMBNAIL_FORMAT,
+        quality=THUMBNAIL_QUALITY,
+    ):
+        self.cache_dir = cache_dir
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.size = size
+        self.image_format = image_format
+        self.quality = quality
+        self.mime_type = MIME_TYPES[image_format]
+        self.extension = FILE_EXTENSIONS[image_format]
+
+        self.lock = threading.Lock()
+        self.memory = OrderedDict()  # image_url -> thumbnail bytes
+        self.memory_used = 0
+        self.disk = OrderedDict()  # file name -> size in bytes, least recently used first
+        self.disk_used = 0
+        self.hits = {"memory": 0, "disk": 0, "miss": 0}
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self.load_disk_index()
+
+    def load_disk_index(self):
+        # Rebuild the disk LRU from file modification times, which get() refreshes on every read
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(self.extension):
+                stat = os.stat(os.path.join(self.cache_dir, name))
+                entries.append((stat.st_mtime, name, stat.st_size))
+        for _, name, size in sorted(entries):
+            self.disk[name] = size
+            self.disk_used += size
+
+    def file_name(self, image_url):
+        return hashlib.sha1(image_url.encode("utf-8")).hexdigest() + self.extension
+
+    def remember(self, image_url, thumbnail):
+        # Caller holds the lock
+        if image_url in self.memory:
+            self.memory_used -= len(self.memory.pop(image_url))
+        self.memory[image_url] = thumbnail
+        self.memory_used += len(thumbnail)
+        while self.memory_used > self.memory_bytes and self.memory:
+            _, evicted = self.memory.popitem(last=False)
+            self.memory_used -= len(evicted)
+
+    def index_disk_file(self, name, size):
+        # Caller holds the lock; returns the file names evicted to stay within disk_bytes
+        self.disk_used -= self.disk.pop(name, 0)
+        self.disk[name] = size
+        self.disk_used += size
+        evicted = []
+        while self.disk_used > self.disk_bytes and len(self.disk) > 1:
+            old_name, old_size = self.disk.popitem(last=False)
+            self.disk_used -= old_size
+            evicted.append(old_name)
+        return evicted
+
+    def remove_files(self, names):
+        for name in names:
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except FileNotFoundError:
+                pass
+
+    def get(self, image_url):
+        """Returns the cached thumbnail bytes for image_url, or None."""
+        with self.lock:
+            thumbnail = self.memory.get(image_url)
+            if thumbnail is not None:
+                self.memory.move_to_end(image_url)
+                self.hits["memory"] += 1
+                return thumbnail
+
+            name = self.file_name(image_url)
+            indexed = name in self.disk
+            if indexed:
+                self.disk.move_to_end(name)
+
+        # Files missing from the index are still read: another process (warm_thumbnails.py or a second
+        # app process) may have written them after this cache was created
+        path = os.path.join(self.cache_dir, name)
+        try:
+            with open(path, "rb") as file:
+                thumbnail = file.read()
+            os.utime(path)
+        except OSError:
+            # Not cached, or evicted or removed by another process since it was indexed
+            with self.lock:
+                self.disk_used -= self.disk.pop(name, 0)
+                self.hits["miss"] += 1
+            return None
+
+        evicted = []
+        with self.lock:
+            if not indexed:
+                evicted = self.index_disk_file(name, len(thumbnail))
+            self.remember(image_url, thumbnail)
+            self.hits["disk"] += 1
+        self.remove_files(evicted)
+        return thumbnail
+
+    def contains(self, image_url):
+        with self.lock:
+            if image_url in self.memory or self.file_name(image_url) in self.disk:
+                return True
+        return os.path.exists(os.path.join(self.cache_dir, self.file_name(image_url)))
+
+    def put(self, image_url, thumbnail):
+        """Stores thumbnail bytes in both tiers, evicting old entries to stay within the size bounds."""
+        name = self.file_name(image_url)
+        path = os.path.join(self.cache_dir, name)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as file:
+            file.write(thumbnail)
+        os.replace(tmp_path, path)
+
+        with self.lock:
+            self.remember(image_url, thumbnail)
+            evicted = self.index_disk_file(name, len(thumbnail))
+        self.remove_files(evicted)
+
+    def get_or_fetch(self, image_url, fetch, timings=None):
+        """Returns the thumbnail for image_url, calling fetch(image_url) for the raw image bytes on a miss.
+
+        With a StageTimings, the time spent in the cache, downloading and re-encoding is added to it.
+        """
+        timings = StageTimings() if timings is None else timings
+        with timings.stage("thumbnail_cache"):
+            thumbnail = self.get(image_url)
+        if thumbnail is None:
+            with timings.stage("image_download"):
+                image_bytes = fetch(image_url)
+            with timings.stage("thumbnail_encode"):
+                thumbnail = make_thumbnail(image_bytes, self.size, self.image_format, self.quality)
+            self.put(image_url, thumbnail)
+        return thumbnail
@@ -0,0 +1,38 @@
+import contextlib
+import threading
+import time
+
+# Time spent in each stage of serving a search or running a script, in seconds
+class StageTimings(dict):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lock = threading.Lock()  # Image downloads add their stages from worker threads
+
+    def add(self, stage, start_time):
+        elapsed = time.perf_counter() - start_time
+        with self.lock:
+            self[stage] = self.get(stage, 0.0) + elapsed
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """Times the body of a with block as stage `name`."""
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, start_time)
+
+    def total(self):
+        return sum(self.values())
+
+    def summary(self):
+        return ", ".join(f"{stage} {seconds * 1000:.1f} ms" for stage, seconds in self.items())
+
+    def report(self, title="Timings"):
+        """Multi-line breakdown for scripts, longest stage first."""
+        total = self.total()
+        lines = [f"{title}: {total:.2f} seconds"]
+        for stage, seconds in sorted(self.items(), key=lambda item: item[1], reverse=True):
+            share = seconds / total * 100 if total else 0.0
+            lines.append(f"  {stage:<24} {seconds:>9.2f} s  {share:5.1f}%")
+        return "\n".join(lines)
@@ -1,51 +1,80 @@
-import json
+import argparse
+import os
+import sys
 import time
 from marqo import Client
 import config
+from bulk_indexer import Checkpoint, index_documents
+from documents import iter_documents
+from embeddings import make_upload, open_store
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from fashion_search.embedding_store import DEFAULT_EMBEDDING_STORE
+from fashion_search.index_pointer import active_index_name
+from fashion_search.search_cache import invalidate_search_caches
+
+parser = argparse.ArgumentParser(description="Upload generated documents to the Marqo index.")
+parser.add_argument("input", nargs="?", default="./data_processing/data/complete_data.json",
+                    help="Generated documents; .ndjson files are read lazily one line at a time")
+parser.add_argument("--batch-size", type=int, default=64, help="Number of documents to process and upload in each batch")
+parser.add_argument("--workers", type=int, default=4, help="Number of batches uploaded concurrently")
+parser.add_argument("--retries", type=int, default=3, help="Retries per batch before it is reported as failed")
+parser.add_argument("--backoff", type=float, default=1.0, help="Base delay in seconds for exponential backoff between retries")
+parser.add_argument("--checkpoint", default=None,
+                    help="File recording acknowledged batches; rerunning with the same file resumes where it stopped")
+parser.add_argument("--embedding-store", nargs="?", const=DEFAULT_EMBEDDING_STORE, default=None,
+                    help="Reuse vectors saved by earlier runs and save new ones (default location when no directory is given)")
+parser.add_argument("--url", default="http://localhost:8882")
+parser.add_argument("--quiet", action="store_true", help="Only print the summary, not every batch")
+args = parser.parse_args()
 
 # Initialize Marqo client for local Docker instance
 # Make sure you have Marqo running on http://localhost:8882
-mq = Client(url="http://localhost:8882")
+mq = Client(url=args.url)
 
-# Get the index name
-index_name = config.INDEX_NAME
+# Get the index name; after a blue/green build this is the version searches are served from
+index_name = active_index_name(config.INDEX_NAME)
+index = mq.index(index_name)
 
-# Load documents from JSON file
-json_file_path = "./data_processing/data/complete_data.json"
-with open(json_file_path, 'r') as file:
-    documents = json.load(file)
+# Add a batch of documents to Marqo index, sending stored vectors instead of re-embedding when a store is given
+store = open_store(args.embedding_store) if args.embedding_store else None
+upload = make_upload(index, store)
 
-# Print the first document (for verification)
-print(documents[0])
-
-# Define batch size
-batch_size = 64  # Define the batch size for uploading documents
+# Load documents from the generated file
+documents = iter_documents(args.input)
+checkpoint = Checkpoint(args.checkpoint, args.input, args.batch_size) if args.checkpoint else None
 
 # Start timing
 start_time = time.time()
 
-# Add documents to Marqo index
-res = mq.index(index_name).add_documents(
-    documents,  # List of documents to be indexed
-    client_batch_size=batch_size,  # Number of documents to process and upload in each batch
-    mappings={  # Custom field mapping for multimodal combination
-        "image_title_multimodal": {  # Field name to be created
-            "type": "multimodal_combination",  # Specifies that the field is a combination of text and image
-            "weights": {  # Weights assigned to each component in the combination
-                "product_name": 0.1,  # Low weight given to product name (text)
-                "image_url": 0.9,  # High weight given to image URL (visual content)
-            },
-        }
-    },
-    tensor_fields=["image_title_multimodal"],  # Specifies that this field should be processed as tensors
-    use_existing_tensors=True,  # Reuse existing tensors if they already exist for these documents
+summary = index_documents(
+    upload,
+    documents,
+    batch_size=args.batch_size,
+    workers=args.workers,
+    retries=args.retries,
+    backoff=args.backoff,
+    checkpoint=checkpoint,
+    verbose=not args.quiet,
 )
 
 # End timing
 end_time = time.time()
 
-# Print the response from Marqo
-# print(res)
+# Cached search results may no longer match the index
+if summary["indexed"]:
+    invalidate_search_caches()
 
-# Print elapsed time
+# Print elapsed time and throughput
+print(f"Indexed {summary['indexed']} documents ({summary['skipped']} already in checkpoint) "
+      f"at {summary['docs_per_second']:.1f} docs/s")
+if "latency_p50" in summary:
+    print(f"Batch latency: p50 {summary['latency_p50']:.2f}s, p95 {summary['latency_p95']:.2f}s, "
+          f"max {summary['latency_max']:.2f}s")
+if store is not None:
+    print(f"Embedding store holds {len(store)} vectors")
 print(f"Time taken to add documents: {end_time - start_time:.2f} seconds")
+
+if summary["failed_batches"]:
+    print(f"Failed batches: {summary['failed_batches']}. Rerun with the same --checkpoint to retry them.")
+    raise SystemExit(1)
@@ -0,0 +1,139 @@
+import argparse
+import csv
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from marqo import Client
+import config
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from fashion_search.index_pointer import active_index_name
+from fashion_search.strategies import STRATEGIES
+
+# Replay the distinct logged queries against each search strategy and report latency percentiles and
+# throughput. Searches go straight to Marqo, bypassing the result cache. Point --url at
+# fake_marqo_server.py --replay to measure client-side overhead offline.
+
+# Distinct queries from the historical data, in first-seen order
+def load_queries(csv_file):
+    with open(csv_file, mode='r') as file:
+        return list(dict.fromkeys(row["query"] for row in csv.DictReader(file)))
+
+def percentile(values, fraction):
+    # Linear interpolation between closest ranks
+    values = sorted(values)
+    if not values:
+        return None
+    position = (len(values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+def run_strategy(strategy, index, queries, concurrency):
+    def timed(query):
+        start_time = time.perf_counter()
+        try:
+            strategy.search(index, query)
+        except Exception as e:
+            return None, str(e).splitlines()[0]
+        return time.perf_counter() - start_time, None
+
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(timed, queries))
+    wall_time = time.perf_counter() - start_time
+
+    latencies = [latency * 1000 for latency, error in results if error is None]
+    errors = [error for _, error in results if error is not None]
+    summary = {
+        "count": len(queries),
+        "errors": len(errors),
+        "wall_time_s": wall_time,
+        "qps": len(latencies) / wall_time if wall_time else 0.0,
+    }
+    if latencies:
+        summary.update({
+            "mean_ms": sum(latencies) / len(latencies),
+            "p50_ms": percentile(latencies, 0.50),
+            "p95_ms": percentile(latencies, 0.95),
+            "p99_ms": percentile(latencies, 0.99),
+            "max_ms": max(latencies),
+        })
+    if errors:
+        summary["first_error"] = errors[0]
+    return summary
+
+def print_comparison(results, baseline):
+    print("\nChange against baseline:")
+    for name, summary in results["strategies"].items():
+        previous = baseline.get("strategies", {}).get(name)
+        if not previous or "p50_ms" not in summary or "p50_ms" not in previous:
+            continue
+        changes = []
+        for metric in ("p50_ms", "p95_ms", "p99_ms", "qps"):
+            change = (summary[metric] - previous[metric]) / previous[metric] * 100 if previous[metric] else 0.0
+            changes.append(f"{metric} {change:+.1f}%")
+        print(f"{name:22} " + ", ".join(changes))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark search latency per strategy with the logged queries.")
+    parser.add_argument("--historical-data", default="./data_processing/data/historical_data.csv")
+    parser.add_argument("--strategies", nargs="+", default=list(STRATEGIES), choices=list(STRATEGIES))
+    parser.add_argument("--queries", type=int, default=500, help="Number of distinct queries to replay (0 for all)")
+    parser.add_argument("--shuffle", action="store_true", help="Sample queries at random instead of the first N")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=20, help="Queries sent per strategy before measuring")
+    parser.add_argument("--url", default="http://localhost:8882")
+    parser.add_argument("--output", default=None, help="Write the results as JSON to this file")
+    parser.add_argument("--baseline", default=None, help="Earlier JSON results to compare against")
+    args = parser.parse_args()
+
+    queries = load_queries(args.historical_data)
+    if args.shuffle:
+        random.Random(args.seed).shuffle(queries)
+    if args.queries:
+        queries = queries[:args.queries]
+
+    # Initialize Marqo client for local Docker instance
+    # Make sure you have Marqo running on http://localhost:8882
+    mq = Client(url=args.url)
+    index_name = active_index_name(config.INDEX_NAME)
+    index = mq.index(index_name)
+
+    results = {
+        "run": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "url": args.url,
+            "index": index_name,
+            "queries": len(queries),
+            "concurrency": args.concurrency,
+        },
+        "strategies": {},
+    }
+
+    print(f"{'strategy':22} {'qps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for name in args.strategies:
+        strategy = STRATEGIES[name]
+        if args.warmup:
+            run_strategy(strategy, index, queries[:args.warmup], args.concurrency)
+        summary = run_strategy(strategy, index, queries, args.concurrency)
+        results["strategies"][name] = summary
+        if "p50_ms" in summary:
+            print(f"{name:22} {summary['qps']:8.1f} {summary['p50_ms']:8.1f} {summary['p95_ms']:8.1f} "
+                  f"{summary['p99_ms']:8.1f} {summary['errors']:7d}")
+        else:
+            print(f"{name:22} all {summary['errors']} searches failed: {summary.get('first_error')}")
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=4)
+        print(f"Saved results to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r") as file:
+            print_comparison(results, json.load(file))
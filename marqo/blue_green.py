@@ -0,0 +1,175 @@
+import argparse
+import os
+import re
+import sys
+import time
+from marqo import Client
+import config
+from benchmark_search import load_queries, percentile
+from bulk_indexer import index_documents
+from create_index import INDEX_SETTINGS
+from documents import iter_documents
+from embeddings import make_upload, open_store
+from sync_documents import document_hashes, save_manifest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from fashion_search.embedding_store import DEFAULT_EMBEDDING_STORE
+from fashion_search.index_pointer import active_index_name, read_pointer, write_pointer
+from fashion_search.search_cache import invalidate_search_caches
+from fashion_search.strategies import STRATEGIES
+
+# Blue/green index builds. `build` creates a new versioned index (fashion-search-v1, -v2, ...) next to
+# the live one, fills it, warms it up with logged queries and checks its document count. Only then
+# does it move the pointer file that app.py and test_search.py read, so searches never see a
+# half-populated index. Old versions are kept for rollback with `switch` until `gc` removes them.
+
+VERSION_PATTERN = re.compile(rf"^{re.escape(config.INDEX_NAME)}-v(\d+)$")
+
+# Versioned indexes that exist in Marqo, as {version: index name}
+def list_versions(mq):
+    versions = {}
+    for result in mq.get_indexes()["results"]:
+        match = VERSION_PATTERN.match(result["indexName"])
+        if match:
+            versions[int(match.group(1))] = result["indexName"]
+    return versions
+
+def version_name(version):
+    return f"{config.INDEX_NAME}-v{version}"
+
+# Run each strategy over a sample of logged queries so caches and segments are loaded before traffic arrives
+def warm_up(index, queries):
+    latencies = []
+    for query in queries:
+        for strategy in STRATEGIES.values():
+            start_time = time.perf_counter()
+            strategy.search(index, query)
+            latencies.append(time.perf_counter() - start_time)
+    return latencies
+
+def switch(index_name, **details):
+    previous = active_index_name(config.INDEX_NAME)
+    write_pointer(index_name, previous_index=previous, **details)
+    invalidate_search_caches()
+    print(f"Searches now go to {index_name} (was {previous})")
+
+# Delete old versions, keeping the active index and the newest `keep` others for rollback
+def garbage_collect(mq, keep):
+    active = active_index_name(config.INDEX_NAME)
+    inactive = sorted((version for version, name in list_versions(mq).items() if name != active), reverse=True)
+    for version in inactive[keep:]:
+        mq.delete_index(version_name(version))
+        print(f"Deleted {version_name(version)}")
+
+def build(mq, args):
+    versions = list_versions(mq)
+    version = args.version or max(versions, default=0) + 1
+    index_name = version_name(version)
+    if version in versions:
+        raise SystemExit(f"{index_name} already exists; pass another --version or remove it with gc")
+
+    print(f"Creating {index_name}")
+    mq.create_index(index_name, settings_dict=INDEX_SETTINGS)
+    index = mq.index(index_name)
+
+    # A rebuild of unchanged documents only sends stored vectors, so no image is fetched or embedded again
+    store = open_store(args.embedding_store) if args.embedding_store else None
+    upload = make_upload(index, store)
+
+    # Hash the documents on the way through for the sync manifest of the new index
+    hashes = {}
+    def documents():
+        for document in iter_documents(args.input):
+            hashes[document["_id"]] = document_hashes(document)
+            yield document
+
+    summary = index_documents(upload, documents(), batch_size=args.batch_size, workers=args.workers,
+                              retries=args.retries, verbose=not args.quiet)
+    print(f"Indexed {summary['indexed']} documents at {summary['docs_per_second']:.1f} docs/s")
+    if store is not None:
+        print(f"Embedding store holds {len(store)} vectors")
+    if summary["failed_batches"]:
+        raise SystemExit(f"Failed batches {summary['failed_batches']}; {index_name} was not switched in")
+
+    # Documents can take a moment to show up in the stats after the last batch is acknowledged
+    deadline = time.time() + args.stats_timeout
+    while True:
+        count = index.get_stats()["numberOfDocuments"]
+        if count == len(hashes) or time.time() > deadline:
+            break
+        time.sleep(2)
+    if count != len(hashes):
+        raise SystemExit(f"{index_name} holds {count} documents, expected {len(hashes)}; not switched in")
+    print(f"Verified {count} documents in {index_name}")
+
+    if args.warmup:
+        latencies = warm_up(index, load_queries(args.historical_data)[:args.warmup])
+        print(f"Warmed up with {len(latencies)} searches (p50 {percentile(latencies, 0.5) * 1000:.0f} ms, "
+              f"max {max(latencies) * 1000:.0f} ms)")
+
+    if args.no_switch:
+        print(f"{index_name} is ready; run `blue_green.py switch {version}` to serve it")
+        return
+
+    switch(index_name, documents=count)
+    save_manifest(hashes, args.manifest)
+    garbage_collect(mq, args.keep)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build versioned indexes and switch searches between them.")
+    parser.add_argument("--url", default="http://localhost:8882")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = commands.add_parser("build", help="Create, fill, verify and switch to a new index version")
+    build_parser.add_argument("input", nargs="?", default="./data_processing/data/complete_data.json")
+    build_parser.add_argument("--version", type=int, default=None, help="Version number (defaults to the next one)")
+    build_parser.add_argument("--batch-size", type=int, default=64)
+    build_parser.add_argument("--workers", type=int, default=4)
+    build_parser.add_argument("--retries", type=int, default=3)
+    build_parser.add_argument("--warmup", type=int, default=50, help="Logged queries searched before switching")
+    build_parser.add_argument("--historical-data", default="./data_processing/data/historical_data.csv")
+    build_parser.add_argument("--stats-timeout", type=float, default=60,
+                              help="Seconds to wait for the document count to match")
+    build_parser.add_argument("--manifest", default="./data_processing/data/index_manifest.json")
+    build_parser.add_argument("--keep", type=int, default=1, help="Previous versions kept for rollback")
+    build_parser.add_argument("--no-switch", action="store_true", help="Build and verify, but keep serving the current index")
+    build_parser.add_argument("--embedding-store", nargs="?", const=DEFAULT_EMBEDDING_STORE, default=None,
+                              help="Reuse vectors saved by earlier builds and save new ones")
+    build_parser.add_argument("--quiet", action="store_true")
+
+    switch_parser = commands.add_parser("switch", help="Point searches at an existing version, e.g. to roll back")
+    switch_parser.add_argument("version", type=int)
+    switch_parser.add_argument("--manifest", default="./data_processing/data/index_manifest.json")
+
+    commands.add_parser("status", help="List versions and show the active index")
+
+    gc_parser = commands.add_parser("gc", help="Delete old inactive versions")
+    gc_parser.add_argument("--keep", type=int, default=1)
+
+    args = parser.parse_args()
+
+    # Initialize Marqo client for local Docker instance
+    # Make sure you have Marqo running on http://localhost:8882
+    mq = Client(url=args.url)
+
+    if args.command == "build":
+        build(mq, args)
+    elif args.command == "switch":
+        versions = list_versions(mq)
+        if args.version not in versions:
+            raise SystemExit(f"{version_name(args.version)} does not exist")
+        count = mq.index(versions[args.version]).get_stats()["numberOfDocuments"]
+        switch(versions[args.version], documents=count)
+        # The manifest describes the index switched away from; without it the next sync re-adds everything
+        if os.path.exists(args.manifest):
+            os.remove(args.manifest)
+            print(f"Removed {args.manifest}; the next sync_documents.py run re-adds every document")
+    elif args.command == "status":
+        pointer = read_pointer()
+        active = active_index_name(config.INDEX_NAME)
+        print(f"Active index: {active}" + (f" (switched at {pointer['switched_at']})" if pointer else ""))
+        for version, name in sorted(list_versions(mq).items()):
+            count = mq.index(name).get_stats()["numberOfDocuments"]
+            print(f"{'*' if name == active else ' '} {name:30} {count:>8} documents")
+    elif args.command == "gc":
+        garbage_collect(mq, args.keep)
@@ -0,0 +1,75 @@
+import argparse
+import csv
+import os
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from marqo import Client
+import config
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from fashion_search.index_pointer import active_index_name
+from fashion_search.pagination import PAGE_SIZE, OverfetchEstimator, UniqueResultPager
+from fashion_search.query_keys import normalize_query
+from fashion_search.result_snapshot import DEFAULT_SNAPSHOT_FILE, DEFAULT_SNAPSHOT_STRATEGY, ResultSnapshot
+from fashion_search.search_cache import index_generation
+from fashion_search.strategies import STRATEGIES
+
+# Precompute the first page of unique products for the most searched logged queries, for
+# search_api.py to serve without a Marqo request. Run it after generate_modifiers.py and indexing;
+# the snapshot is ignored once the index changes again, until it is rebuilt.
+
+# Distinct normalized queries from the historical data, most clicked first (revenue breaks ties)
+def load_head_queries(csv_file, limit):
+    clicks, revenue, spellings = defaultdict(int), defaultdict(float), {}
+    with open(csv_file, mode='r') as file:
+        for row in csv.DictReader(file):
+            key = normalize_query(row["query"])
+            spellings.setdefault(key, row["query"])
+            clicks[key] += int(row["total_click_count"])
+            revenue[key] += float(row["five_day_revenue"])
+    keys = sorted(spellings, key=lambda key: (-clicks[key], -revenue[key], key))
+    return [spellings[key] for key in (keys[:limit] if limit else keys)]
+
+if __name__ == "__main__":
+    # Client-side reranking follows rerank_weights.json as it is edited, so it cannot be precomputed
+    snapshot_strategies = [name for name, strategy in STRATEGIES.items() if not strategy.rerank]
+
+    parser = argparse.ArgumentParser(description="Precompute the first results page of the head queries.")
+    parser.add_argument("--historical-data", default="./data_processing/data/historical_data.csv")
+    parser.add_argument("--queries", type=int, default=5000, help="Number of most clicked queries to snapshot (0 for all)")
+    parser.add_argument("--strategy", default=DEFAULT_SNAPSHOT_STRATEGY, choices=snapshot_strategies)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--output", default=DEFAULT_SNAPSHOT_FILE)
+    parser.add_argument("--url", default="http://localhost:8882")
+    args = parser.parse_args()
+
+    queries = load_head_queries(args.historical_data, args.queries)
+
+    # Initialize Marqo client for local Docker instance
+    # Make sure you have Marqo running on http://localhost:8882
+    mq = Client(url=args.url)
+    index_name = active_index_name(config.INDEX_NAME)
+    index = mq.index(index_name)
+    strategy = STRATEGIES[args.strategy]
+    estimator = OverfetchEstimator()  # Shared, so later queries start from the ratio learned so far
+
+    # Read before searching: if the index changes during the build, the snapshot is already stale
+    generation = index_generation()
+
+    def first_page(query):
+        pager = UniqueResultPager(strategy, index, query, estimator=estimator, page_size=PAGE_SIZE)
+        return query, (pager.page(0), pager.has_next_page(0))
+
+    print(f"Searching {len(queries)} head queries with {strategy.name} on {index_name}...")
+    start_time = time.time()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        pages = dict(executor.map(first_page, queries))
+    elapsed = time.time() - start_time
+    print(f"Searched {len(pages)} queries in {elapsed:.1f}s ({len(pages) / elapsed:.1f} queries/s)")
+
+    snapshot = ResultSnapshot.build(strategy.name, index_name, generation, PAGE_SIZE, pages)
+    snapshot.save(args.output)
+    print(f"Saved {len(snapshot)} queries with {len(snapshot.products)} distinct products to {args.output} "
+          f"({os.path.getsize(args.output) / 1e6:.1f} MB)")
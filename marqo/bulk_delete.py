@@ -0,0 +1,131 @@
+import argparse
+import csv
+import os
+import sys
+import time
+from marqo import Client
+from marqo.errors import MarqoWebError
+import config
+from bulk_indexer import index_documents
+from create_index import INDEX_SETTINGS
+from documents import iter_documents
+from sync_documents import failed_ids, load_manifest, save_manifest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from fashion_search.index_pointer import active_index_name
+from fashion_search.search_cache import invalidate_search_caches
+
+# Delete many documents by id with concurrent batched requests, or reset a whole index by dropping
+# and recreating it, which is much faster than deleting every document when nothing should be kept.
+
+# Read document ids from a text file (one per line), a CSV with an _id column, or generated documents
+def iter_ids(path):
+    if path.endswith((".json", ".ndjson")):
+        for document in iter_documents(path):
+            yield document["_id"]
+    elif path.endswith(".csv"):
+        with open(path, mode='r') as file:
+            for row in csv.DictReader(file):
+                yield row["_id"]
+    else:
+        with open(path, mode='r') as file:
+            for line in file:
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    yield line
+
+# Delete one batch of {"_id": ...} entries; ids Marqo no longer has count as deleted
+def make_delete(index):
+    def delete(batch):
+        res = index.delete_documents([entry["_id"] for entry in batch])
+        failed = [item for item in res.get("items", []) if item.get("status", 200) >= 400 and item.get("status") != 404]
+        return {"errors": bool(failed), "items": failed}
+    return delete
+
+# Drop the index and create it again with the given settings
+def reset_index(mq, index_name, settings, timeout=600):
+    start_time = time.time()
+    try:
+        mq.delete_index(index_name)
+    except MarqoWebError as e:
+        if e.status_code != 404:
+            raise
+    # Deletion can still be finishing in the background; retry until the name is free again
+    while True:
+        try:
+            mq.create_index(index_name, settings_dict=settings)
+            return time.time() - start_time
+        except MarqoWebError as e:
+            if e.status_code != 409 or time.time() - start_time > timeout:
+                raise
+            time.sleep(2)
+
+# Nothing is indexed any more: the next sync must add every document, and cached results are stale
+def forget_indexed_documents(manifest_path):
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)
+    invalidate_search_caches()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Delete documents in bulk, or drop and recreate the index.")
+    parser.add_argument("ids", nargs="*", help="Document ids to delete")
+    parser.add_argument("--ids-file", action="append", default=[],
+                        help="File of ids: one per line, a CSV with an _id column (e.g. product_data.csv), "
+                             "or .json/.ndjson documents; may be given more than once")
+    parser.add_argument("--reset", action="store_true",
+                        help="Drop the index and recreate it with the settings from create_index.py")
+    parser.add_argument("--index", default=active_index_name(config.INDEX_NAME))
+    parser.add_argument("--batch-size", type=int, default=500, help="Ids per delete request")
+    parser.add_argument("--workers", type=int, default=8, help="Delete requests sent concurrently")
+    parser.add_argument("--retries", type=int, default=3)
+    parser.add_argument("--manifest", default="./data_processing/data/index_manifest.json",
+                        help="sync_documents.py manifest to keep consistent with the index")
+    parser.add_argument("--url", default="http://localhost:8882")
+    parser.add_argument("--quiet", action="store_true", help="Only print the summary, not every batch")
+    args = parser.parse_args()
+
+    if not args.reset and not args.ids and not args.ids_file:
+        parser.error("give ids, --ids-file or --reset")
+
+    # Initialize Marqo client for local Docker instance
+    # Make sure you have Marqo running on http://localhost:8882
+    mq = Client(url=args.url)
+
+    if args.reset:
+        elapsed = reset_index(mq, args.index, INDEX_SETTINGS)
+        print(f"Recreated index {args.index} in {elapsed:.2f} seconds")
+        forget_indexed_documents(args.manifest)
+        raise SystemExit(0)
+
+    # Duplicate ids would only cost extra requests
+    ids = list(dict.fromkeys(args.ids + [_id for path in args.ids_file for _id in iter_ids(path)]))
+    entries = [{"_id": _id} for _id in ids]
+    print(f"Deleting {len(ids)} documents from {args.index}")
+
+    summary = index_documents(
+        make_delete(mq.index(args.index)),
+        entries,
+        batch_size=args.batch_size,
+        workers=args.workers,
+        retries=args.retries,
+        verbose=not args.quiet,
+    )
+
+    if summary["indexed"]:
+        invalidate_search_caches()
+
+    # Deleted documents have to be re-added by the next sync
+    manifest = load_manifest(args.manifest)
+    if manifest:
+        failed = failed_ids(entries, summary["failed_batches"], args.batch_size)
+        removed = [_id for _id in ids if _id in manifest and _id not in failed]
+        for _id in removed:
+            del manifest[_id]
+        if removed:
+            save_manifest(manifest, args.manifest)
+
+    print(f"Deleted {summary['indexed']} documents in {summary['elapsed']:.2f} seconds "
+          f"({summary['docs_per_second']:.1f} docs/s)")
+    if summary["failed_batches"]:
+        print(f"Failed batches: {summary['failed_batches']}")
+        raise SystemExit(1)
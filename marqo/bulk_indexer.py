@@ -0,0 +1,144 @@
+import json
+import os
+import random
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from marqo.errors import MarqoError, MarqoWebError
+from requests import RequestException
+
+from documents import iter_batches
+
+# Errors worth retrying a batch for: Marqo API errors and transport failures
+RETRYABLE_ERRORS = (MarqoError, MarqoWebError, RequestException)
+
+class BatchFailedError(Exception):
+    pass
+
+# Append-only record of acknowledged batches, so a restarted run can skip them. The header identifies
+# the input by path, size and mtime, so a regenerated file is never matched to old batch numbers
+class Checkpoint:
+    def __init__(self, path, input_path, batch_size):
+        self.path = path
+        stat = os.stat(input_path)
+        self.header = {
+            "input": os.path.abspath(input_path),
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "batch_size": batch_size,
+        }
+        self.acknowledged = set()
+
+        if os.path.exists(path):
+            with open(path, "r") as file:
+                lines = [json.loads(line) for line in file if line.strip()]
+            if lines and lines[0] != self.header:
+                raise ValueError(
+                    f"Checkpoint {path} was written for {lines[0]}, not {self.header}; delete it to start over"
+                )
+            self.acknowledged = {line["batch"] for line in lines[1:]}
+        else:
+            with open(path, "w") as file:
+                file.write(json.dumps(self.header) + "\n")
+
+    def is_acknowledged(self, batch_number):
+        return batch_number in self.acknowledged
+
+    def record(self, batch_number, num_documents):
+        self.acknowledged.add(batch_number)
+        with open(self.path, "a") as file:
+            file.write(json.dumps({"batch": batch_number, "documents": num_documents}) + "\n")
+            file.flush()
+            os.fsync(file.fileno())
+
+# Send one batch, retrying with exponential backoff. Documents Marqo accepted are not resent
+def upload_batch(upload, batch, retries=3, backoff=1.0):
+    pending = batch
+    start_time = time.perf_counter()
+    for attempt in range(1, retries + 2):
+        try:
+            res = upload(pending)
+            failed_ids = {item["_id"] for item in res.get("items", []) if item.get("status", 200) >= 400}
+            if failed_ids:
+                pending = [document for document in pending if document["_id"] in failed_ids]
+                error = f"{len(failed_ids)} documents rejected"
+            elif res.get("errors"):
+                # Marqo flagged the batch without saying which documents failed, so all of it is sent again
+                error = "errors reported without any rejected document"
+            else:
+                return {"documents": len(batch), "attempts": attempt, "latency": time.perf_counter() - start_time}
+        except RETRYABLE_ERRORS as e:
+            error = str(e).splitlines()[0]
+
+        if attempt <= retries:
+            # Full jitter keeps concurrent workers from retrying in lockstep
+            time.sleep(random.uniform(0, backoff * 2 ** (attempt - 1)))
+
+    raise BatchFailedError(f"{error} after {retries + 1} attempts")
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+# Upload documents in batches from a pool of workers, recording each acknowledged batch in the checkpoint
+def index_documents(upload, documents, batch_size=64, workers=4, retries=3, backoff=1.0, checkpoint=None, verbose=True):
+    latencies = []
+    failed_batches = []
+    indexed = 0
+    skipped = 0
+    start_time = time.perf_counter()
+
+    def collect(done, in_flight):
+        nonlocal indexed
+        for future in done:
+            batch_number, num_documents = in_flight.pop(future)
+            try:
+                result = future.result()
+            except BatchFailedError as e:
+                failed_batches.append(batch_number)
+                print(f"Batch {batch_number} failed: {e}")
+                continue
+            except Exception as e:
+                # Not a Marqo or transport error, so it was not retried; the other batches carry on
+                failed_batches.append(batch_number)
+                print(f"Batch {batch_number} failed: {type(e).__name__}: {e}")
+                continue
+            if checkpoint is not None:
+                checkpoint.record(batch_number, num_documents)
+            indexed += num_documents
+            latencies.append(result["latency"])
+            if verbose:
+                print(
+                    f"Batch {batch_number}: {num_documents} docs in {result['latency']:.2f}s "
+                    f"({num_documents / result['latency']:.1f} docs/s, {result['attempts']} attempt(s))"
+                )
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        in_flight = {}
+        for batch_number, batch in enumerate(iter_batches(documents, batch_size)):
+            if checkpoint is not None and checkpoint.is_acknowledged(batch_number):
+                skipped += len(batch)
+                continue
+            # Bound the number of queued batches so documents keep streaming from the input
+            if len(in_flight) >= workers * 2:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                collect(done, in_flight)
+            future = executor.submit(upload_batch, upload, batch, retries, backoff)
+            in_flight[future] = (batch_number, len(batch))
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            collect(done, in_flight)
+
+    elapsed = time.perf_counter() - start_time
+    summary = {
+        "indexed": indexed,
+        "skipped": skipped,
+        "failed_batches": sorted(failed_batches),
+        "elapsed": elapsed,
+        "docs_per_second": indexed / elapsed if elapsed else 0.0,
+    }
+    if latencies:
+        summary["latency_p50"] = percentile(latencies, 0.5)
+        summary["latency_p95"] = percentile(latencies, 0.95)
+        summary["latency_max"] = max(latencies)
+    return summary
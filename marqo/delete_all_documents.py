@@ -1,4 +1,5 @@
 from marqo import Client
+from bulk_delete import forget_indexed_documents
 
 # Initialize Marqo client for local Docker instance
 # Make sure you have Marqo running on http://localhost:8882
@@ -7,7 +8,8 @@ mq = Client(url="http://localhost:8882")
 # For safety reasons, replace this with your index name here
 index_name = "your-index-name"
 
-# This will delete all documents in your index
+# This will delete all documents in your index. To drop and recreate the index instead, which is much
+# faster for a large index, run `python3 marqo/bulk_delete.py --reset --index <name>`
 def empty_index(input_index_name):
     index = mq.index(input_index_name)
     res =  index.search(q = '', limit=400)
@@ -17,5 +19,6 @@ def empty_index(input_index_name):
             id_set.append(hit['_id'])
         index.delete_documents(id_set)
         res = index.search(q = '', limit=400)
+    forget_indexed_documents("./data_processing/data/index_manifest.json")
 
 empty_index(index_name)
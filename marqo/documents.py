@@ -0,0 +1,41 @@
+import json
+
+# Read documents lazily from a newline-delimited JSON file, or from a JSON array for .json files
+def iter_documents(file_path):
+    with open(file_path, 'r') as file:
+        if file_path.endswith(".json"):
+            # A JSON array has to be parsed in one go
+            yield from json.load(file)
+            return
+        for line in file:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+# Group an iterable of documents into lists of at most batch_size documents
+def iter_batches(documents, batch_size):
+    batch = []
+    for document in documents:
+        batch.append(document)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+# Custom field mapping for multimodal combination
+MAPPINGS = {
+    "image_title_multimodal": {  # Field name to be created
+        "type": "multimodal_combination",  # Specifies that the field is a combination of text and image
+        "weights": {  # Weights assigned to each component in the combination
+            "product_name": 0.1,  # Low weight given to product name (text)
+            "image_url": 0.9,  # High weight given to image URL (visual content)
+        },
+    }
+}
+
+# Fields processed as tensors
+TENSOR_FIELDS = ["image_title_multimodal"]
+
+# Document fields that feed the tensor fields; changing any of them requires re-embedding
+TENSOR_SOURCE_FIELDS = sorted({field for mapping in MAPPINGS.values() for field in mapping["weights"]})
@@ -0,0 +1,101 @@
+import argparse
+import os
+import sys
+import time
+from marqo import Client
+import config
+from create_index import INDEX_SETTINGS
+from documents import MAPPINGS, TENSOR_FIELDS, iter_batches, iter_documents
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from fashion_search.embedding_store import DEFAULT_EMBEDDING_STORE, EmbeddingStore, embedding_key
+from fashion_search.index_pointer import active_index_name
+
+# Reuse multimodal vectors across index builds. Documents whose image URL and title already have a
+# stored vector are sent with it as a custom vector; only the rest are embedded by Marqo, and their
+# new vectors are read back from the index into the store for the next build.
+
+# Vectors are only reusable for the same model and field weights
+EMBEDDING_FINGERPRINT = {"model": INDEX_SETTINGS["model"], "mappings": MAPPINGS}
+
+# Send the stored vector in place of the multimodal combination
+CUSTOM_VECTOR_MAPPINGS = {field: {"type": "custom_vector"} for field in TENSOR_FIELDS}
+
+def open_store(directory=DEFAULT_EMBEDDING_STORE):
+    return EmbeddingStore(directory, fingerprint=EMBEDDING_FINGERPRINT)
+
+def with_stored_vector(document, vector):
+    document = dict(document)
+    for field in TENSOR_FIELDS:
+        document[field] = {"content": document["product_name"], "vector": vector.tolist()}
+    return document
+
+# Copy the vectors Marqo computed for documents into the store
+def harvest(index, documents, store):
+    res = index.get_documents([document["_id"] for document in documents], expose_facets=True)
+    keys = {document["_id"]: embedding_key(document) for document in documents}
+    vectors = {}
+    for result in res["results"]:
+        facets = result.get("_tensor_facets") or []
+        if result.get("_found") and facets and "_embedding" in facets[0]:
+            vectors[keys[result["_id"]]] = facets[0]["_embedding"]
+    return store.add(vectors)
+
+# Merge the responses of the two add_documents calls one batch can be split into
+def merge_responses(responses):
+    items = [item for res in responses for item in res.get("items", [])]
+    return {"errors": any(res.get("errors") for res in responses), "items": items}
+
+def make_upload(index, store=None):
+    """Returns an upload function for bulk_indexer.index_documents, reusing stored vectors when a store is given."""
+    def upload(batch):
+        if store is None:
+            return index.add_documents(batch, mappings=MAPPINGS, tensor_fields=TENSOR_FIELDS, use_existing_tensors=True)
+
+        stored, fresh = [], []
+        for document in batch:
+            vector = store.get(embedding_key(document))
+            if vector is None:
+                fresh.append(document)
+            else:
+                stored.append(with_stored_vector(document, vector))
+
+        responses = []
+        if stored:
+            responses.append(index.add_documents(stored, mappings=CUSTOM_VECTOR_MAPPINGS, tensor_fields=TENSOR_FIELDS))
+        if fresh:
+            res = index.add_documents(fresh, mappings=MAPPINGS, tensor_fields=TENSOR_FIELDS, use_existing_tensors=True)
+            responses.append(res)
+            rejected = {item["_id"] for item in res.get("items", []) if item.get("status", 200) >= 400}
+            accepted = [document for document in fresh if document["_id"] not in rejected]
+            if accepted:
+                harvest(index, accepted, store)
+        return merge_responses(responses)
+    return upload
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Save the vectors of indexed documents for reuse in later builds.")
+    parser.add_argument("input", nargs="?", default="./data_processing/data/complete_data.json")
+    parser.add_argument("--store", default=DEFAULT_EMBEDDING_STORE)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--status", action="store_true", help="Only report how many documents have a stored vector")
+    parser.add_argument("--url", default="http://localhost:8882")
+    args = parser.parse_args()
+
+    store = open_store(args.store)
+    documents = list(iter_documents(args.input))
+    missing = [document for document in documents if embedding_key(document) not in store]
+    print(f"{len(documents) - len(missing)} of {len(documents)} documents have a stored vector")
+    if args.status or not missing:
+        raise SystemExit(0)
+
+    # Initialize Marqo client for local Docker instance
+    # Make sure you have Marqo running on http://localhost:8882
+    mq = Client(url=args.url)
+    index = mq.index(active_index_name(config.INDEX_NAME))
+
+    start_time = time.time()
+    added = 0
+    for batch in iter_batches(missing, args.batch_size):
+        added += harvest(index, batch, store)
+    print(f"Saved {added} vectors from {index.index_name} to {args.store} in {time.time() - start_time:.2f} seconds")
@@ -0,0 +1,159 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from marqo import Client
+import config
+from documents import iter_documents
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from fashion_search.evaluation import (HOLDOUT_FRACTION, CandidateSet, RelevanceLabels, evaluate_rankings,
+                                       is_held_out, split_history)
+from fashion_search.index_pointer import active_index_name
+from fashion_search.ingest import load_historical_table, load_product_table
+from fashion_search.pagination import filter_unique_items
+from fashion_search.rerank import FeatureTable, Reranker
+from fashion_search.signal_store import RevenueSignalStore
+from fashion_search.strategies import STRATEGIES
+
+# Score each search strategy offline against the logged interactions (NDCG, MRR and revenue at k),
+# and grid search score modifier weights over a fixed candidate set. Ranked lists are saved under
+# --rankings-dir, so rescoring with other labels or cutoffs does not query Marqo again. Metrics are
+# reported on held-out queries, with the rerank and grid revenue features built from the others.
+
+DEFAULT_GRID = {
+    "exact_match": [0, 0.01, 1000],
+    "one_day_revenue_modifiers": [0, 1e-6, 1e-5],
+    "five_day_revenue_modifiers": [0, 1e-6, 1e-5, 1e-4],
+}
+
+# Ranked (_id, score) lists per query, read from the rankings file when present
+def fetch_rankings(strategy, index, queries, limit, concurrency, rankings_file, refresh=False):
+    if not refresh and os.path.exists(rankings_file):
+        with open(rankings_file, "r") as file:
+            rankings = dict(json.loads(line) for line in file)
+        if all(query in rankings for query in queries):
+            return rankings
+
+    def search(query):
+        res = strategy.search(index, query, limit=limit)
+        return query, [(hit["_id"], hit.get("_score", 0.0)) for hit in res["hits"]]
+
+    start_time = time.time()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        rankings = dict(executor.map(search, queries))
+    print(f"Fetched {len(rankings)} rankings for {strategy.name} in {time.time() - start_time:.1f}s")
+
+    os.makedirs(os.path.dirname(rankings_file) or ".", exist_ok=True)
+    with open(rankings_file, "w") as file:
+        for query, hits in rankings.items():
+            file.write(json.dumps([query, hits]) + "\n")
+    return rankings
+
+def unique_ids(hits, k, query=None, reranker=None):
+    hits = [{"_id": _id, "_score": score} for _id, score in hits]
+    if reranker is not None:
+        hits = reranker.rerank(query, hits)
+    return [hit["_id"] for hit in filter_unique_items(hits, max_items=k)]
+
+def parse_grid(specs):
+    # "name=0,1e-6,1e-5" per feature
+    grid = {}
+    for spec in specs:
+        name, _, values = spec.partition("=")
+        if name not in CandidateSet.FEATURES:
+            raise SystemExit(f"Unknown feature {name!r}; choose from {', '.join(CandidateSet.FEATURES)}")
+        grid[name] = [float(value) for value in values.split(",")]
+    return grid
+
+def print_metrics(name, metrics):
+    print(f"{name:40} {metrics['ndcg']:8.4f} {metrics['mrr']:8.4f} {metrics['revenue']:12.2f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate search strategies against logged purchases, carts and clicks.")
+    parser.add_argument("--historical-data", default="./data_processing/data/historical_data.csv")
+    parser.add_argument("--strategies", nargs="+", default=list(STRATEGIES), choices=list(STRATEGIES))
+    parser.add_argument("--queries", type=int, default=0, help="Number of labelled queries to evaluate (0 for all)")
+    parser.add_argument("-k", type=int, default=20, help="Cutoff in unique products")
+    parser.add_argument("--limit", type=int, default=100, help="Raw hits retrieved per query")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rankings-dir", default="./data_processing/data/rankings")
+    parser.add_argument("--refresh", action="store_true", help="Query Marqo even when saved rankings exist")
+    parser.add_argument("--grid", nargs="*", default=None, metavar="FEATURE=W1,W2",
+                        help="Grid search modifier weights over the candidates of --candidate-strategy "
+                             f"(features: {', '.join(CandidateSet.FEATURES)}); with no values a default grid is used")
+    parser.add_argument("--candidate-strategy", default="hybrid", choices=list(STRATEGIES))
+    parser.add_argument("--documents", default="./data_processing/data/complete_data.json",
+                        help="Generated documents holding the modifier fields, for --grid")
+    parser.add_argument("--signal-store", default=None,
+                        help="Revenue signal store from generate_modifiers.py --signal-store, for documents built with --top-k "
+                             "(only used with --holdout 0)")
+    parser.add_argument("--holdout", type=float, default=HOLDOUT_FRACTION,
+                        help="Fraction of logged queries to score on; revenue features are built from the rest "
+                             "(0 scores every query in-sample)")
+    parser.add_argument("--objective", default="ndcg", choices=["ndcg", "mrr", "revenue"])
+    parser.add_argument("--top", type=int, default=10, help="Grid results to print")
+    parser.add_argument("--url", default="http://localhost:8882")
+    args = parser.parse_args()
+
+    if args.holdout:
+        # Labels from the held-out queries only; every revenue feature below comes from the training rows
+        labels = RelevanceLabels(args.historical_data, query_filter=lambda query: is_held_out(query, args.holdout))
+        training_history, _ = split_history(load_historical_table(args.historical_data), args.holdout)
+        print(f"Holding out {args.holdout:.0%} of queries; revenue features use the other {len(training_history)} rows")
+        if any(STRATEGIES[name].per_query for name in args.strategies):
+            print("Strategies with indexed revenue modifiers are only out of sample when the index was built "
+                  "from generate_modifiers.py --exclude-holdout")
+    else:
+        labels = RelevanceLabels(args.historical_data)
+        training_history = None
+    queries = labels.queries[:args.queries] if args.queries else labels.queries
+    print(f"Loaded labels for {len(labels.queries)} queries; evaluating {len(queries)} at k={args.k}")
+
+    # Initialize Marqo client for local Docker instance
+    # Make sure you have Marqo running on http://localhost:8882
+    mq = Client(url=args.url)
+    index = mq.index(active_index_name(config.INDEX_NAME))
+
+    def rankings_for(name):
+        rankings_file = os.path.join(args.rankings_dir, f"{name}.jsonl")
+        return fetch_rankings(STRATEGIES[name], index, queries, args.limit, args.concurrency, rankings_file, args.refresh)
+
+    # Strategies with client-side reranking are reranked with the current rerank_weights.json
+    reranker = None
+    if any(STRATEGIES[name].rerank for name in args.strategies):
+        if training_history is None:
+            reranker = Reranker(FeatureTable.from_csv())
+        else:
+            reranker = Reranker(FeatureTable.from_tables(training_history, load_product_table()))
+
+    print(f"{'strategy':40} {'ndcg':>8} {'mrr':>8} {'revenue':>12}")
+    for name in args.strategies:
+        rankings = rankings_for(name)
+        strategy_reranker = reranker if STRATEGIES[name].rerank else None
+        ranked_ids = {query: unique_ids(rankings[query], args.k, query, strategy_reranker) for query in queries}
+        print_metrics(name, evaluate_rankings(labels, ranked_ids, args.k))
+
+    if args.grid is not None:
+        grid = parse_grid(args.grid) if args.grid else DEFAULT_GRID
+        candidate_rankings = rankings_for(args.candidate_strategy)
+        candidates = {query: candidate_rankings[query] for query in queries}
+        wanted = {_id for hits in candidates.values() for _id, _ in hits}
+        documents_by_id = {document["_id"]: document for document in iter_documents(args.documents) if document["_id"] in wanted}
+
+        start_time = time.time()
+        if training_history is not None:
+            # The documents' modifier fields and a saved store were built from every row, held-out queries included
+            signal_store = RevenueSignalStore.from_history(training_history)
+        else:
+            signal_store = RevenueSignalStore.load(args.signal_store) if args.signal_store else None
+        candidate_set = CandidateSet(labels, candidates, documents_by_id, k=args.k, signal_store=signal_store)
+        results = candidate_set.grid_search(grid, objective=args.objective)
+        print(f"\nScored {len(results)} weight settings over {len(candidate_set.queries)} queries "
+              f"in {time.time() - start_time:.1f}s (best by {args.objective}):")
+        print(f"{'weights':40} {'ndcg':>8} {'mrr':>8} {'revenue':>12}")
+        for result in results[:args.top]:
+            weights = ", ".join(f"{name}={weight:g}" for name, weight in result["weights"].items())
+            print_metrics(weights, result)
@@ -0,0 +1,323 @@
+import argparse
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import requests
+
+# A small in-memory stand-in for the Marqo HTTP API, for exercising the indexing and search
+# scripts without Docker or a GPU. It implements only the endpoints these scripts call and
+# scores search hits by word overlap with product_name. Tensor fields get a pseudo-random vector
+# seeded by their content in place of a real embedding, and custom vectors are stored as given.
+#
+# It can also sit in front of a real Marqo as a recording proxy (--upstream and --record), and
+# later answer the recorded searches offline (--replay), e.g. to benchmark client-side overhead.
+
+MARQO_VERSION = "2.23.1"
+EMBEDDING_DIMENSION = 512  # ViT-B/32
+
+# Deterministic unit vector standing in for the embedding of some content
+def fake_embedding(content):
+    seed = int(hashlib.sha1(json.dumps(content, sort_keys=True).encode("utf-8")).hexdigest()[:16], 16)
+    generator = random.Random(seed)
+    vector = [generator.gauss(0, 1) for _ in range(EMBEDDING_DIMENSION)]
+    norm = sum(value * value for value in vector) ** 0.5
+    return [value / norm for value in vector]
+
+class FakeMarqo:
+    def __init__(self, latency=0.0, fail_rate=0.0, seed=None):
+        self.latency = latency      # Seconds to sleep before answering each write or search
+        self.fail_rate = fail_rate  # Fraction of write requests answered with a 500
+        self.random = random.Random(seed)
+        self.indexes = {}
+        self.lock = threading.Lock()
+        self.embedded = 0  # Tensor fields "embedded" so far, i.e. not supplied as custom vectors
+
+    def maybe_fail(self):
+        with self.lock:
+            return self.random.random() < self.fail_rate
+
+    def create_index(self, index_name, settings):
+        with self.lock:
+            if index_name in self.indexes:
+                return 409, {"message": f"Index {index_name} already exists", "code": "index_already_exists"}
+            self.indexes[index_name] = {"settings": settings, "documents": {}, "embeddings": {}}
+        return 200, {"acknowledged": True, "index": index_name}
+
+    def delete_index(self, index_name):
+        with self.lock:
+            self.indexes.pop(index_name, None)
+        return 200, {"acknowledged": True}
+
+    def get_index(self, index_name):
+        return self.indexes.get(index_name)
+
+    def add_documents(self, index, documents, mappings=None, tensor_fields=None):
+        mappings = mappings or {}
+        items = []
+        with self.lock:
+            for document in documents:
+                document = dict(document)
+                embeddings = {}
+                for field in tensor_fields or []:
+                    mapping = mappings.get(field, {})
+                    if mapping.get("type") == "custom_vector" and isinstance(document.get(field), dict):
+                        embeddings[field] = document[field]["vector"]
+                        document[field] = document[field].get("content", "")
+                    elif mapping.get("type") == "multimodal_combination":
+                        embeddings[field] = fake_embedding({key: document.get(key) for key in mapping["weights"]})
+                        self.embedded += 1
+                    elif field in document:
+                        embeddings[field] = fake_embedding(document[field])
+                        self.embedded += 1
+                index["documents"][document["_id"]] = document
+                index["embeddings"][document["_id"]] = embeddings
+                items.append({"_id": document["_id"], "status": 200})
+        return 200, {"errors": False, "items": items, "processingTimeMs": 0}
+
+    def update_documents(self, index, documents):
+        items = []
+        with self.lock:
+            for document in documents:
+                existing = index["documents"].get(document["_id"])
+                if existing is None:
+                    items.append({"_id": document["_id"], "status": 404, "error": "document not found"})
+                    continue
+                existing.update(document)
+                items.append({"_id": document["_id"], "status": 200})
+        errors = any(item["status"] != 200 for item in items)
+        return 200, {"errors": errors, "items": items, "processingTimeMs": 0}
+
+    def delete_documents(self, index, ids):
+        items = []
+        with self.lock:
+            for _id in ids:
+                index["embeddings"].pop(_id, None)
+                if index["documents"].pop(_id, None) is None:
+                    items.append({"_id": _id, "status": 404, "result": "not_found"})
+                else:
+                    items.append({"_id": _id, "status": 200, "result": "deleted"})
+        deleted = sum(item["status"] == 200 for item in items)
+        return 200, {
+            "status": "succeeded",
+            "type": "documentDeletion",
+            "items": items,
+            "details": {"receivedDocumentIds": len(ids), "deletedDocuments": deleted},
+        }
+
+    def get_documents(self, index, ids, expose_facets=False):
+        results = []
+        for _id in ids:
+            document = index["documents"].get(_id)
+            if document is None:
+                results.append({"_id": _id, "_found": False})
+            else:
+                result = {**document, "_found": True}
+                if expose_facets:
+                    result["_tensor_facets"] = [
+                        {field: str(document.get(field, "")), "_embedding": vector}
+                        for field, vector in index["embeddings"].get(_id, {}).items()
+                    ]
+                results.append(result)
+        return 200, {"results": results}
+
+    def search(self, index, body):
+        query_words = set(re.findall(r"\w+", str(body.get("q") or "").lower()))
+        filter_string = body.get("filter") or ""
+        hits = []
+        for document in list(index["documents"].values()):
+            if "in_stock:(true)" in filter_string and not document.get("in_stock", True):
+                continue
+            name_words = set(re.findall(r"\w+", str(document.get("product_name", "")).lower()))
+            score = len(query_words & name_words) / (len(query_words) or 1)
+            hits.append((score, document))
+        hits.sort(key=lambda hit: (-hit[0], hit[1]["_id"]))
+
+        offset = body.get("offset", 0)
+        limit = body.get("limit", 10)
+        attributes = body.get("attributesToRetrieve")
+        page = []
+        for score, document in hits[offset:offset + limit]:
+            if attributes is None:
+                hit = dict(document)
+            else:
+                hit = {key: document[key] for key in attributes if key in document}
+            hit["_id"] = document["_id"]
+            hit["_score"] = score
+            page.append(hit)
+        return 200, {"hits": page, "query": body.get("q"), "limit": limit, "offset": offset, "processingTimeMs": 0}
+
+def request_key(method, path, body):
+    payload = json.dumps(body, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(f"{method} {path} {payload}".encode("utf-8")).hexdigest()
+
+class RecordedResponses:
+    """Search responses recorded from a real Marqo, keyed by request method, path and body."""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.responses = {}
+        self.lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path, "r") as file:
+                for line in file:
+                    if line.strip():
+                        record = json.loads(line)
+                        self.responses[record["key"]] = (record["status"], record["response"])
+
+    def get(self, key):
+        return self.responses.get(key)
+
+    def record(self, key, status, response):
+        with self.lock:
+            self.responses[key] = (status, response)
+            with open(self.path, "a") as file:
+                file.write(json.dumps({"key": key, "status": status, "response": response}) + "\n")
+
+class FakeMarqoHandler(BaseHTTPRequestHandler):
+    marqo = None  # Set to a FakeMarqo instance by serve()
+    recordings = None  # RecordedResponses used for --record and --replay
+    upstream = None  # Real Marqo URL when proxying
+
+    def log_message(self, format, *args):
+        pass
+
+    def read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return None
+        return json.loads(self.rfile.read(length))
+
+    def reply(self, status, body):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def route(self, method):
+        url = urlparse(self.path)
+        path = url.path.strip("/")
+        params = parse_qs(url.query)
+        body = self.read_body()
+        parts = path.split("/") if path else []
+
+        if self.upstream:
+            return self.proxy(method, f"{path}?{url.query}" if url.query else path, body)
+        if method == "POST" and parts[2:] == ["search"] and self.recordings is not None:
+            recorded = self.recordings.get(request_key(method, path, body))
+            if recorded is not None:
+                if self.marqo.latency:
+                    time.sleep(self.marqo.latency)
+                return self.reply(*recorded)
+
+        if method == "GET" and not parts:
+            return self.reply(200, {"message": "Welcome to Marqo", "version": MARQO_VERSION})
+        if method == "GET" and parts == ["indexes"]:
+            return self.reply(200, {"results": [{"indexName": name} for name in self.marqo.indexes]})
+        if not parts or parts[0] != "indexes" or len(parts) < 2:
+            return self.reply(404, {"message": f"unknown path {path}"})
+
+        index_name = parts[1]
+        rest = parts[2:]
+        if method == "POST" and not rest:
+            return self.reply(*self.marqo.create_index(index_name, body or {}))
+        if method == "DELETE" and not rest:
+            return self.reply(*self.marqo.delete_index(index_name))
+
+        index = self.marqo.get_index(index_name)
+        if index is None:
+            return self.reply(404, {"message": f"index {index_name} not found", "code": "index_not_found"})
+
+        if method == "GET" and rest == ["stats"]:
+            return self.reply(200, {"numberOfDocuments": len(index["documents"]), "numberOfVectors": len(index["documents"])})
+        if method == "GET" and rest == ["settings"]:
+            return self.reply(200, index["settings"])
+        if method == "GET" and rest == ["documents"]:
+            expose_facets = params.get("expose_facets", ["false"])[0].lower() == "true"
+            return self.reply(*self.marqo.get_documents(index, body or [], expose_facets))
+        if method == "GET" and len(rest) == 2 and rest[0] == "documents":
+            document = index["documents"].get(rest[1])
+            if document is None:
+                return self.reply(404, {"message": "document not found"})
+            return self.reply(200, document)
+
+        if self.marqo.latency:
+            time.sleep(self.marqo.latency)
+
+        if method == "POST" and rest == ["search"]:
+            return self.reply(*self.marqo.search(index, body or {}))
+        if method in ("POST", "PATCH") and rest[:1] == ["documents"] and self.marqo.maybe_fail():
+            return self.reply(500, {"message": "injected failure", "code": "internal_error"})
+        if method == "POST" and rest == ["documents"]:
+            return self.reply(*self.marqo.add_documents(index, body["documents"], body.get("mappings"), body.get("tensorFields")))
+        if method == "PATCH" and rest == ["documents"]:
+            return self.reply(*self.marqo.update_documents(index, body["documents"]))
+        if method == "POST" and rest == ["documents", "delete-batch"]:
+            return self.reply(*self.marqo.delete_documents(index, body or []))
+        return self.reply(404, {"message": f"unknown path {path}"})
+
+    def proxy(self, method, path, body):
+        response = requests.request(method, f"{self.upstream}/{path}", json=body, timeout=60)
+        try:
+            payload = response.json()
+        except ValueError:
+            payload = {"message": response.text}
+        if method == "POST" and path.endswith("/search") and self.recordings is not None:
+            self.recordings.record(request_key(method, path, body), response.status_code, payload)
+        return self.reply(response.status_code, payload)
+
+    def do_GET(self):
+        self.route("GET")
+
+    def do_POST(self):
+        self.route("POST")
+
+    def do_PATCH(self):
+        self.route("PATCH")
+
+    def do_DELETE(self):
+        self.route("DELETE")
+
+class FakeMarqoServer(ThreadingHTTPServer):
+    request_queue_size = 128  # The default of 5 resets connections under concurrent load
+
+# Start the fake server; returns the server so callers can shut it down
+def serve(port=8882, latency=0.0, fail_rate=0.0, seed=None, background=False, upstream=None, record=None, replay=None):
+    recordings = None
+    if record or replay:
+        recordings = RecordedResponses(record or replay)
+    handler = type("Handler", (FakeMarqoHandler,), {
+        "marqo": FakeMarqo(latency, fail_rate, seed),
+        "recordings": recordings,
+        "upstream": upstream.rstrip("/") if upstream else None,
+    })
+    server = FakeMarqoServer(("127.0.0.1", port), handler)
+    if background:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    else:
+        print(f"Fake Marqo listening on http://127.0.0.1:{server.server_port}")
+        server.serve_forever()
+    return server
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run an in-memory stand-in for the Marqo HTTP API.")
+    parser.add_argument("--port", type=int, default=8882)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds of delay added to writes and searches")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Fraction of document writes that return a 500")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--upstream", default=None, help="Proxy every request to this Marqo URL instead")
+    parser.add_argument("--record", default=None, help="With --upstream, append search responses to this file")
+    parser.add_argument("--replay", default=None, help="Answer searches recorded in this file from the recording")
+    args = parser.parse_args()
+
+    if args.record and not args.upstream:
+        parser.error("--record needs --upstream")
+    serve(args.port, args.latency, args.fail_rate, args.seed, upstream=args.upstream, record=args.record, replay=args.replay)
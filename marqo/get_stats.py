@@ -1,12 +1,17 @@
+import os
+import sys
 from marqo import Client
 import config
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from fashion_search.index_pointer import active_index_name
+
 # Initialize Marqo client for local Docker instance
 # Make sure you have Marqo running on http://localhost:8882
 mq = Client(url="http://localhost:8882")
 
 # Define Marqo index name
-index_name = config.INDEX_NAME
+index_name = active_index_name(config.INDEX_NAME)
 
 # Get index stats
 res = mq.index(index_name).get_stats()
@@ -0,0 +1,144 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from marqo import Client
+import config
+from bulk_indexer import RETRYABLE_ERRORS, index_documents
+from documents import TENSOR_SOURCE_FIELDS, iter_batches, iter_documents
+from embeddings import make_upload, open_store
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from fashion_search.embedding_store import DEFAULT_EMBEDDING_STORE
+from fashion_search.index_pointer import active_index_name
+from fashion_search.search_cache import invalidate_search_caches
+
+# Push only what changed since the last run. A manifest stores two hashes per document: one over the
+# fields that feed the tensor fields and one over everything else. New documents and documents whose
+# tensor inputs changed are (re-)added, documents where only other fields changed (in_stock, cost,
+# revenue modifiers, ...) get a partial update without re-embedding, and documents missing from the
+# input are deleted.
+
+def content_hash(fields):
+    payload = json.dumps(fields, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+def document_hashes(document):
+    tensor_fields = {key: document.get(key) for key in TENSOR_SOURCE_FIELDS}
+    other_fields = {key: value for key, value in document.items() if key not in TENSOR_SOURCE_FIELDS}
+    return {"tensor": content_hash(tensor_fields), "fields": content_hash(other_fields)}
+
+def load_manifest(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as file:
+        return json.load(file)
+
+def save_manifest(manifest, path):
+    # Write to a temporary file first so an interrupted run never leaves a truncated manifest
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as file:
+        json.dump(manifest, file, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+# Compare the documents against the manifest. Only changed documents are kept in memory
+def plan_changes(documents, manifest):
+    to_add = []
+    to_update = []
+    hashes = {}
+    unchanged = 0
+    for document in documents:
+        _id = document["_id"]
+        new_hashes = document_hashes(document)
+        hashes[_id] = new_hashes
+        old_hashes = manifest.get(_id)
+        if old_hashes is None or old_hashes["tensor"] != new_hashes["tensor"]:
+            to_add.append(document)
+        elif old_hashes["fields"] != new_hashes["fields"]:
+            # Partial update: send every non-tensor field, leave the embedded fields untouched
+            to_update.append({key: value for key, value in document.items() if key not in TENSOR_SOURCE_FIELDS})
+        else:
+            unchanged += 1
+    to_delete = [_id for _id in manifest if _id not in hashes]
+    return to_add, to_update, to_delete, hashes, unchanged
+
+# Ids of documents in failed batches, so their manifest entries are not advanced
+def failed_ids(documents, failed_batches, batch_size):
+    failed_batches = set(failed_batches)
+    ids = set()
+    for batch_number, batch in enumerate(iter_batches(documents, batch_size)):
+        if batch_number in failed_batches:
+            ids.update(document["_id"] for document in batch)
+    return ids
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Incrementally sync generated documents to the Marqo index.")
+    parser.add_argument("input", nargs="?", default="./data_processing/data/complete_data.json")
+    parser.add_argument("--manifest", default="./data_processing/data/index_manifest.json",
+                        help="Per-document content hashes from the last successful sync")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--retries", type=int, default=3)
+    parser.add_argument("--embedding-store", nargs="?", const=DEFAULT_EMBEDDING_STORE, default=None,
+                        help="Reuse stored vectors for added documents and save new ones")
+    parser.add_argument("--url", default="http://localhost:8882")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would change")
+    args = parser.parse_args()
+
+    start_time = time.time()
+    manifest = load_manifest(args.manifest)
+    to_add, to_update, to_delete, hashes, unchanged = plan_changes(iter_documents(args.input), manifest)
+    print(f"{len(to_add)} to add, {len(to_update)} to update, {len(to_delete)} to delete, {unchanged} unchanged "
+          f"(planned in {time.time() - start_time:.2f} seconds)")
+    if args.dry_run:
+        raise SystemExit(0)
+
+    # Initialize Marqo client for local Docker instance
+    # Make sure you have Marqo running on http://localhost:8882
+    mq = Client(url=args.url)
+    index = mq.index(active_index_name(config.INDEX_NAME))
+
+    add = make_upload(index, open_store(args.embedding_store) if args.embedding_store else None)
+
+    failed = set()
+    for label, upload, documents in (("Added", add, to_add), ("Updated", index.update_documents, to_update)):
+        if not documents:
+            continue
+        summary = index_documents(upload, documents, batch_size=args.batch_size, workers=args.workers,
+                                  retries=args.retries, verbose=False)
+        failed |= failed_ids(documents, summary["failed_batches"], args.batch_size)
+        print(f"{label} {summary['indexed']} documents at {summary['docs_per_second']:.1f} docs/s")
+
+    deleted = 0
+    for batch in iter_batches(to_delete, args.batch_size):
+        try:
+            index.delete_documents(batch)
+            deleted += len(batch)
+        except RETRYABLE_ERRORS as e:
+            print(f"Failed to delete {len(batch)} documents: {str(e).splitlines()[0]}")
+            failed.update(batch)
+    if to_delete:
+        print(f"Deleted {deleted} documents")
+
+    # Failed documents keep their previous manifest entry (or none), so the next run retries them
+    new_manifest = {}
+    for _id, document_hash in hashes.items():
+        if _id not in failed:
+            new_manifest[_id] = document_hash
+        elif _id in manifest:
+            new_manifest[_id] = manifest[_id]
+    for _id in to_delete:
+        if _id in failed:
+            new_manifest[_id] = manifest[_id]
+    save_manifest(new_manifest, args.manifest)
+
+    # Cached search results may no longer match the index
+    if to_add or to_update or to_delete:
+        invalidate_search_caches()
+
+    print(f"Sync finished in {time.time() - start_time:.2f} seconds")
+    if failed:
+        print(f"{len(failed)} documents failed and will be retried on the next run")
+        raise SystemExit(1)
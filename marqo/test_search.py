@@ -1,125 +1,42 @@
+import os
+import sys
 from marqo import Client
 import config
-import re
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from fashion_search.index_pointer import active_index_name
+from fashion_search.rerank import FeatureTable, Reranker
+from fashion_search.search_cache import SearchCache
+from fashion_search.strategies import STRATEGIES
 
 # Initialize Marqo client for local Docker instance
 # Make sure you have Marqo running on http://localhost:8882
 mq = Client(url="http://localhost:8882")
 
-# Define Marqo index name
-index_name = config.INDEX_NAME
+# Define Marqo index name; blue_green.py builds switch this to the newest verified version
+index_name = active_index_name(config.INDEX_NAME)
 
-# Helper function to create valid keys
-def make_modifier_key(value: str) -> str:
-    return re.sub(r"[^a-zA-Z0-9_]", "_", value).lower()
+# Identical searches within the TTL are answered from the cache
+search_cache = SearchCache()
 
 def basic_search(query):
-    basic_search = mq.index(config.INDEX_NAME).search(
-                    query,
-                    limit=50,
-                    filter_string="in_stock:(true)"
-                )
-
-    return basic_search
+    return STRATEGIES["tensor"].search(mq.index(index_name), query, cache=search_cache)
 
 def hybrid_search(query):
-    hybrid_search = mq.index(config.INDEX_NAME).search(
-        query,
-        search_method="HYBRID",
-        limit=50,
-        attributes_to_retrieve=[
-            "product_name",
-            "image_url",
-            "cost",
-        ],
-        hybrid_parameters={
-            "alpha": 0.5,
-            "rrfK": 60,
-            "searchableAttributesLexical": ["product_name"],
-        },
-        show_highlights=False,
-        filter_string="in_stock:(true)",
-    )
-
-    return hybrid_search
-
+    return STRATEGIES["hybrid"].search(mq.index(index_name), query, cache=search_cache)
 
 def hybrid_search_with_exact_boosters(query):
-
-    query_key = make_modifier_key(query)
-
-    hybrid_search_with_exact_boosters = mq.index(config.INDEX_NAME).search(
-        query,
-        search_method="HYBRID",
-        limit=50,
-        attributes_to_retrieve=[
-            "product_name",
-            "image_url",
-            "cost",
-        ],
-        hybrid_parameters={
-            "alpha": 0.5,
-            "rrfK": 60,
-            "scoreModifiersTensor": {
-                "add_to_score": [
-                    {"field_name": f"exact_match_boosters.{query_key}", "weight": 1000}
-                ]
-            },
-            "scoreModifiersLexical": {
-                "add_to_score": [
-                    {"field_name": f"exact_match_boosters.{query_key}", "weight": 1000}
-                ]
-            },
-            "searchableAttributesLexical": ["product_name"],
-        },
-        show_highlights=False,
-        filter_string="in_stock:(true)",
-    )
-
-    return hybrid_search_with_exact_boosters
-
+    return STRATEGIES["hybrid_exact"].search(mq.index(index_name), query, cache=search_cache)
 
 def hybrid_with_exact_boosters_and_modifiers(query):
+    return STRATEGIES["hybrid_exact_revenue"].search(mq.index(index_name), query, cache=search_cache)
 
-    query_key = make_modifier_key(query)
-
-    hybrid_with_exact_boosters_and_modifiers = mq.index(config.INDEX_NAME).search(
-        query,
-        search_method="HYBRID",
-        limit=50,
-        attributes_to_retrieve=["product_name", "image_url", "cost"],
-        filter_string="in_stock:(true)",
-        show_highlights=False,
-        hybrid_parameters={
-            "alpha": 0.5,
-            "rrfK": 60,
-            "scoreModifiersTensor": {
-                "add_to_score": [
-                    {"field_name": f"exact_match_boosters.{query_key}", "weight": 1000},
-                    {"field_name": "one_day_revenue", "weight": 0.000002},
-                    {"field_name": "three_day_revenue", "weight": 6.6e-7},
-                    {"field_name": "five_day_revenue", "weight": 4e-7},
-                    {"field_name": f"one_day_revenue_modifiers.{query_key}", "weight": 0.000005},
-                    {"field_name": f"three_day_revenue_modifiers.{query_key}", "weight": 0.00000166666},
-                    {"field_name": f"five_day_revenue_modifiers.{query_key}", "weight": 0.000001}
-                ]
-            },
-            "scoreModifiersLexical": {
-                "add_to_score": [
-                    {"field_name": f"exact_match_boosters.{query_key}", "weight": 1000},
-                    {"field_name": "one_day_revenue", "weight": 0.002},
-                    {"field_name": "three_day_revenue", "weight": 0.0006},
-                    {"field_name": "five_day_revenue", "weight": 0.0004},
-                    {"field_name": f"one_day_revenue_modifiers.{query_key}", "weight": 1},
-                    {"field_name": f"three_day_revenue_modifiers.{query_key}", "weight": 0.3333333333333333},
-                    {"field_name": f"five_day_revenue_modifiers.{query_key}", "weight": 0.2}
-                ]
-            },
-            "searchableAttributesLexical": ["product_name"]
-        }
-    )
+# The same boosts applied client-side; weights are read from rerank_weights.json
+reranker = Reranker(FeatureTable.from_csv())
 
-    return hybrid_with_exact_boosters_and_modifiers
+def hybrid_search_reranked(query):
+    res = STRATEGIES["hybrid_rerank"].search(mq.index(index_name), query, cache=search_cache, limit=reranker.depth)
+    return {**res, "hits": reranker.rerank(query, res["hits"])}
 
 query = "green candy dress"
 print(f"The Search Query is: {query}")
@@ -127,6 +44,4 @@ print(basic_search(query)['hits'][0])
 print(hybrid_search(query)['hits'][0])
 print(hybrid_search_with_exact_boosters(query)['hits'][0])
 print(hybrid_with_exact_boosters_and_modifiers(query)['hits'][0])
-
-
-
+print(hybrid_search_reranked(query)['hits'][0])
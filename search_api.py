@@ -0,0 +1,141 @@
+import argparse
+import asyncio
+import contextlib
+
+import uvicorn
+from marqo.errors import MarqoError, MarqoWebError
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, PlainTextResponse
+from starlette.routing import Route
+
+from fashion_search.metrics import SlowRequestLog
+from fashion_search.pagination import PAGE_SIZE
+from fashion_search.result_snapshot import DEFAULT_SNAPSHOT_FILE
+from fashion_search.search_service import DEFAULT_INDEX_NAME, DEFAULT_MARQO_URL, SearchService, UnknownStage, UnknownStrategy
+from fashion_search.strategies import STRATEGIES
+
+# Headless search API. Serves the same strategies and unique-product pages as the Streamlit app, as
+# JSON, so it can be load tested and run as several processes behind a load balancer. app.py is a
+# client of this API. Run it with:
+#
+#   python3 search_api.py --port 8080
+
+MAX_PAGE_SIZE = 100
+
+class BadRequest(Exception):
+    pass
+
+def int_param(request, name, default, minimum, maximum):
+    value = request.query_params.get(name)
+    if value is None:
+        return default
+    try:
+        value = int(value)
+    except ValueError:
+        raise BadRequest(f"{name} must be an integer")
+    if not minimum <= value <= maximum:
+        raise BadRequest(f"{name} must be between {minimum} and {maximum}")
+    return value
+
+def query_param(request):
+    query = request.query_params.get("q", "").strip()
+    if not query:
+        raise BadRequest("q is required")
+    return query
+
+async def strategies(request):
+    return JSONResponse([
+        {"name": strategy.name, "label": strategy.label, "rerank": strategy.rerank}
+        for strategy in STRATEGIES.values()
+    ])
+
+async def search(request):
+    """GET /search?q=green+dress&strategy=hybrid&page=0&page_size=20"""
+    service = request.app.state.service
+    result = await service.search(
+        query_param(request),
+        request.query_params.get("strategy", next(iter(STRATEGIES))),
+        page=int_param(request, "page", 0, 0, 1000),
+        page_size=int_param(request, "page_size", PAGE_SIZE, 1, MAX_PAGE_SIZE),
+    )
+    return JSONResponse(result)
+
+async def compare(request):
+    """GET /compare?q=green+dress&strategy=tensor&strategy=hybrid (all strategies when none are given)"""
+    service = request.app.state.service
+    names = request.query_params.getlist("strategy") or list(STRATEGIES)
+    return JSONResponse(await service.compare(query_param(request), names))
+
+async def suggest(request):
+    """GET /suggest?q=green+dr&limit=8"""
+    service = request.app.state.service
+    return JSONResponse(service.suggest(request.query_params.get("q", ""), int_param(request, "limit", 8, 1, 50)))
+
+async def timings(request):
+    """POST /timings {"strategy": ..., "query": ..., "stages": {stage: seconds}} from clients such as app.py"""
+    try:
+        body = await request.json()
+        stages = {str(stage): float(seconds) for stage, seconds in body["stages"].items()}
+        strategy, query = str(body["strategy"]), str(body.get("query", ""))
+    except (ValueError, KeyError, TypeError, AttributeError):
+        raise BadRequest('expected {"strategy", "query", "stages": {stage: seconds}}')
+    request.app.state.service.record_client(strategy, query, stages)
+    return JSONResponse({"recorded": len(stages)})
+
+async def metrics(request):
+    """GET /metrics in the Prometheus text format"""
+    return PlainTextResponse(request.app.state.service.render_metrics(), media_type="text/plain; version=0.0.4")
+
+async def health(request):
+    return JSONResponse(request.app.state.service.stats())
+
+async def bad_request(request, exc):
+    return JSONResponse({"error": str(exc)}, status_code=400)
+
+async def marqo_error(request, exc):
+    return JSONResponse({"error": f"Marqo request failed: {exc}"}, status_code=502)
+
+def create_app(marqo_url=DEFAULT_MARQO_URL, default_index=DEFAULT_INDEX_NAME, workers=32, slow_log=None,
+               snapshot_file=DEFAULT_SNAPSHOT_FILE):
+    @contextlib.asynccontextmanager
+    async def lifespan(app):
+        app.state.service = SearchService(marqo_url, default_index, workers=workers, slow_log=slow_log,
+                                          snapshot_file=snapshot_file)
+        refresher = asyncio.create_task(app.state.service.refresh_suggestions())
+        yield
+        refresher.cancel()
+        app.state.service.close()
+
+    return Starlette(
+        routes=[
+            Route("/strategies", strategies),
+            Route("/search", search),
+            Route("/compare", compare),
+            Route("/suggest", suggest),
+            Route("/timings", timings, methods=["POST"]),
+            Route("/metrics", metrics),
+            Route("/health", health),
+        ],
+        exception_handlers={BadRequest: bad_request, UnknownStrategy: bad_request, UnknownStage: bad_request,
+                            MarqoError: marqo_error, MarqoWebError: marqo_error},
+        lifespan=lifespan,
+    )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve search results as a JSON API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--marqo-url", default=DEFAULT_MARQO_URL)
+    parser.add_argument("--index", default=DEFAULT_INDEX_NAME,
+                        help="Index searched until a blue/green build switches the pointer file")
+    parser.add_argument("--workers", type=int, default=32, help="Concurrent Marqo requests per process")
+    parser.add_argument("--slow-log", default=None,
+                        help="Append requests slower than --slow-ms, with their stage breakdown, to this JSON lines file")
+    parser.add_argument("--slow-ms", type=float, default=1000)
+    parser.add_argument("--snapshot", default=DEFAULT_SNAPSHOT_FILE,
+                        help="Head query results from marqo/build_snapshot.py, served while the index is unchanged")
+    args = parser.parse_args()
+
+    slow_log = SlowRequestLog(args.slow_log, args.slow_ms / 1000) if args.slow_log else None
+    uvicorn.run(create_app(args.marqo_url, args.index, args.workers, slow_log, args.snapshot), host=args.host,
+                port=args.port, log_level="warning")
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The scripts in marqo/ import config and their siblings directly, as they do when run from there
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [REPO_ROOT, os.path.join(REPO_ROOT, "marqo")]
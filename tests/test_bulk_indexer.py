@@ -0,0 +1,171 @@
+import json
+
+import pytest
+from marqo import Client
+
+import bulk_indexer
+import fake_marqo_server
+from bulk_indexer import BatchFailedError, Checkpoint, index_documents, upload_batch
+
+INDEX_NAME = "bulk-indexer-test"
+
+def make_documents(count):
+    return [{"_id": str(number), "product_name": f"product {number}"} for number in range(count)]
+
+def write_input(path, documents):
+    with open(path, "w") as file:
+        for document in documents:
+            file.write(json.dumps(document) + "\n")
+    return str(path)
+
+@pytest.fixture
+def start_fake_marqo():
+    # Starts a fake Marqo on a free port with the given serve() options and an empty test index
+    servers = []
+
+    def start(**options):
+        server = fake_marqo_server.serve(port=0, background=True, **options)
+        servers.append(server)
+        Client(url=f"http://127.0.0.1:{server.server_port}").create_index(INDEX_NAME)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+@pytest.fixture
+def fake_marqo(start_fake_marqo):
+    return start_fake_marqo()
+
+def stored_ids(server):
+    return set(server.RequestHandlerClass.marqo.indexes[INDEX_NAME]["documents"])
+
+def make_upload(server):
+    index = Client(url=f"http://127.0.0.1:{server.server_port}").index(INDEX_NAME)
+    return lambda batch: index.add_documents(batch, tensor_fields=["product_name"])
+
+def test_failed_requests_are_retried_until_the_server_accepts(start_fake_marqo, monkeypatch):
+    fake_marqo = start_fake_marqo(fail_rate=0.5, seed=1)
+    delays = []
+    monkeypatch.setattr(bulk_indexer.time, "sleep", delays.append)
+    documents = make_documents(200)
+
+    summary = index_documents(make_upload(fake_marqo), documents, batch_size=10, workers=2, retries=10,
+                              backoff=0.5, verbose=False)
+
+    assert summary["indexed"] == 200
+    assert summary["failed_batches"] == []
+    assert stored_ids(fake_marqo) == {document["_id"] for document in documents}
+    assert delays  # About half the requests failed and were retried
+
+def test_backoff_doubles_per_attempt_with_full_jitter(monkeypatch):
+    delays = []
+    monkeypatch.setattr(bulk_indexer.time, "sleep", delays.append)
+    monkeypatch.setattr(bulk_indexer.random, "uniform", lambda low, high: high)
+
+    def upload(batch):
+        raise bulk_indexer.RequestException("connection reset")
+
+    with pytest.raises(BatchFailedError, match="after 4 attempts"):
+        upload_batch(upload, make_documents(3), retries=3, backoff=0.25)
+    assert delays == [0.25, 0.5, 1.0]
+
+def test_batches_failing_every_attempt_are_reported_not_checkpointed(start_fake_marqo, tmp_path, monkeypatch):
+    fake_marqo = start_fake_marqo(fail_rate=1.0)
+    monkeypatch.setattr(bulk_indexer.time, "sleep", lambda seconds: None)
+    input_path = write_input(tmp_path / "documents.ndjson", make_documents(30))
+    checkpoint = Checkpoint(str(tmp_path / "checkpoint"), input_path, 10)
+
+    summary = index_documents(make_upload(fake_marqo), make_documents(30), batch_size=10, retries=1,
+                              checkpoint=checkpoint, verbose=False)
+
+    assert summary["indexed"] == 0
+    assert summary["failed_batches"] == [0, 1, 2]
+    assert checkpoint.acknowledged == set()
+
+def test_only_rejected_documents_are_resent(fake_marqo, monkeypatch):
+    monkeypatch.setattr(bulk_indexer.time, "sleep", lambda seconds: None)
+    upload, sent, rejected = make_upload(fake_marqo), [], {"3", "7"}
+
+    # Marqo accepts most of the batch and rejects two documents the first time they are sent
+    def partially_rejecting_upload(batch):
+        sent.append([document["_id"] for document in batch])
+        accepted = [document for document in batch if document["_id"] not in rejected]
+        res = upload(accepted)
+        items = res["items"] + [{"_id": document["_id"], "status": 429} for document in batch
+                                if document["_id"] in rejected]
+        rejected.clear()
+        return {"errors": len(items) > len(accepted), "items": items}
+
+    result = upload_batch(partially_rejecting_upload, make_documents(10), retries=2)
+
+    assert result["documents"] == 10
+    assert result["attempts"] == 2
+    assert sent[1] == ["3", "7"]
+    assert stored_ids(fake_marqo) == {str(number) for number in range(10)}
+
+def test_errors_without_rejected_documents_resend_the_batch(monkeypatch):
+    monkeypatch.setattr(bulk_indexer.time, "sleep", lambda seconds: None)
+    sent = []
+
+    def upload(batch):
+        sent.append(len(batch))
+        return {"errors": True, "items": [{"_id": document["_id"], "status": 200} for document in batch]}
+
+    with pytest.raises(BatchFailedError, match="errors reported without any rejected document after 3 attempts"):
+        upload_batch(upload, make_documents(5), retries=2)
+    assert sent == [5, 5, 5]
+
+def test_unexpected_errors_fail_only_their_batch(fake_marqo):
+    upload = make_upload(fake_marqo)
+
+    def upload_with_bad_document(batch):
+        if any(document["_id"] == "15" for document in batch):
+            raise TypeError("Object of type set is not JSON serializable")
+        return upload(batch)
+
+    summary = index_documents(upload_with_bad_document, make_documents(30), batch_size=10, verbose=False)
+
+    assert summary["indexed"] == 20
+    assert summary["failed_batches"] == [1]
+    assert len(stored_ids(fake_marqo)) == 20
+
+def test_rerun_with_checkpoint_resumes_after_acknowledged_batches(fake_marqo, tmp_path):
+    documents = make_documents(50)
+    input_path = write_input(tmp_path / "documents.ndjson", documents)
+    checkpoint_path = str(tmp_path / "checkpoint")
+    upload, uploaded = make_upload(fake_marqo), []
+
+    def upload_failing_batch_2(batch):
+        if batch[0]["_id"] == "20":
+            raise ConnectionAbortedError("killed")
+        return upload(batch)
+
+    first = index_documents(upload_failing_batch_2, documents, batch_size=10,
+                            checkpoint=Checkpoint(checkpoint_path, input_path, 10), verbose=False)
+    assert first["failed_batches"] == [2]
+
+    def recording_upload(batch):
+        uploaded.append(batch[0]["_id"])
+        return upload(batch)
+
+    second = index_documents(recording_upload, documents, batch_size=10,
+                             checkpoint=Checkpoint(checkpoint_path, input_path, 10), verbose=False)
+
+    assert second["skipped"] == 40
+    assert second["indexed"] == 10
+    assert uploaded == ["20"]
+    assert stored_ids(fake_marqo) == {document["_id"] for document in documents}
+
+def test_checkpoint_is_refused_for_a_regenerated_input(tmp_path):
+    input_path = write_input(tmp_path / "documents.ndjson", make_documents(20))
+    checkpoint_path = str(tmp_path / "checkpoint")
+    Checkpoint(checkpoint_path, input_path, 10).record(0, 10)
+
+    write_input(input_path, make_documents(25))
+    with pytest.raises(ValueError, match="delete it to start over"):
+        Checkpoint(checkpoint_path, input_path, 10)
+
+    with pytest.raises(ValueError):
+        Checkpoint(checkpoint_path, write_input(tmp_path / "other.ndjson", make_documents(20)), 10)
@@ -0,0 +1,105 @@
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from fashion_search.evaluation import (CandidateSet, RelevanceLabels, dcg, evaluate_rankings, is_held_out,
+                                       score_rankings, split_history)
+from fashion_search.query_keys import query_key
+from fashion_search.signal_store import RevenueSignalStore
+
+def make_history(queries):
+    return pd.DataFrame({
+        "query": queries,
+        "_id": [f"{number}_0" for number in range(len(queries))],
+        "one_day_revenue": 1.0,
+        "three_day_revenue": 2.0,
+        "five_day_revenue": 3.0,
+    })
+
+def test_split_is_by_query_and_stable():
+    queries = [f"query {number}" for number in range(1000)] * 2
+    training, held_out = split_history(make_history(queries))
+
+    assert set(training["query"]).isdisjoint(held_out["query"])
+    assert len(training) + len(held_out) == len(queries)
+    assert 0.15 < len(held_out) / len(queries) < 0.25
+    assert all(is_held_out(query) for query in held_out["query"])
+
+def test_spellings_sharing_a_key_fall_on_the_same_side():
+    spellings = ["Red Dress", "red dresses", "red-dress", "dress red", "RED  DRESS!"]
+    for number in range(100):
+        variants = [f"{spelling} {number}" for spelling in spellings]
+        assert len({query_key(variant) for variant in variants}) == 1
+        assert len({is_held_out(variant) for variant in variants}) == 1
+
+def test_training_store_has_no_revenue_for_held_out_queries():
+    queries = [f"query {number}" for number in range(200)]
+    history = make_history(queries)
+    training, held_out = split_history(history)
+    store = RevenueSignalStore.from_history(training)
+
+    for query, _id in zip(held_out["query"], held_out["_id"]):
+        assert not store.lookup(query_key(query), [_id]).any()
+    query, _id = training.iloc[0][["query", "_id"]]
+    assert store.lookup(query_key(query), [_id]).tolist() == [[1.0, 2.0, 3.0]]
+
+def test_no_holdout_keeps_every_row():
+    training, held_out = split_history(make_history(["a", "b", "c"]), fraction=0)
+    assert len(training) == 3 and held_out.empty
+
+def write_labels(path, rows):
+    # rows: (query, _id, purchases, add_to_carts, clicks, five day revenue)
+    columns = ["query", "_id", "total_purchases", "add_to_cart_count", "total_click_count", "five_day_revenue"]
+    pd.DataFrame(rows, columns=columns).to_csv(path, index=False)
+    return RelevanceLabels(str(path))
+
+def test_dcg_uses_exponential_gain_and_log_discount():
+    assert dcg(np.array([[3, 0, 1]])) == pytest.approx([7 + 1 / 2])
+    assert dcg(np.array([[0, 2, 0]])) == pytest.approx([3 / math.log2(3)])
+
+def test_score_rankings_averages_over_queries():
+    grades = np.array([[3, 0, 1], [0, 2, 0], [0, 0, 0]])
+    ideal = np.array([[3, 1, 0], [2, 0, 0], [0, 0, 0]])
+    revenue = np.array([[30.0, 0.0, 6.0], [0.0, 12.0, 0.0], [0.0, 0.0, 0.0]])
+
+    metrics = score_rankings(grades, revenue, ideal)
+
+    ndcg = [7.5 / (7 + 1 / math.log2(3)), (3 / math.log2(3)) / 3, 0.0]  # No relevant product scores 0
+    assert metrics["ndcg"] == pytest.approx(sum(ndcg) / 3)
+    assert metrics["mrr"] == pytest.approx((1 + 1 / 2 + 0) / 3)
+    assert metrics["revenue"] == pytest.approx((36.0 + 12.0 + 0.0) / 3)
+
+def test_evaluate_rankings_scores_labelled_queries_at_the_cutoff(tmp_path):
+    labels = write_labels(tmp_path / "history.csv", [
+        ("dress", "1_0", 1, 0, 0, 50.0),  # Purchased: grade 3
+        ("dress", "2_0", 0, 1, 0, 0.0),  # Added to cart: grade 2
+        ("shoes", "3_0", 0, 0, 4, 0.0),  # Clicked: grade 1
+    ])
+    rankings = {"dress": ["2_0", "1_0", "9_0"], "shoes": ["8_0", "3_0"], "unlabelled": ["1_0"]}
+
+    metrics = evaluate_rankings(labels, rankings, k=1)
+
+    assert metrics["queries"] == 2
+    assert metrics["ndcg"] == pytest.approx((3 / 7 + 0) / 2)
+    assert metrics["mrr"] == pytest.approx((1 + 0) / 2)
+    assert metrics["revenue"] == 0.0  # The purchased product is below the cutoff
+
+def test_grid_search_resorts_candidates_by_weighted_features(tmp_path):
+    labels = write_labels(tmp_path / "history.csv", [("red dress", "2_0", 1, 0, 0, 80.0)])
+    candidates = {"red dress": [("1_0", 0.9), ("1_1", 0.85), ("2_0", 0.5), ("3_0", 0.4)]}
+    key = query_key("red dress")
+    documents = {"2_0": {"five_day_revenue_modifiers": {key: 100.0}}, "3_0": {"exact_match_boosters": {key: 1000}}}
+    candidate_set = CandidateSet(labels, candidates, documents, k=2)
+
+    results = candidate_set.grid_search({"exact_match": [0, 1], "five_day_revenue_modifiers": [0, 0.01]})
+
+    # Only the revenue modifier lifts the purchased product (1 + 0.5) above both others (0.9 and 1 + 0.4)
+    assert results[0]["weights"] == {"exact_match": 0, "five_day_revenue_modifiers": 0.01}
+    assert results[0]["ndcg"] == pytest.approx(1.0)
+    assert results[0]["revenue"] == pytest.approx(80.0)
+    # Without modifiers the image variant 1_1 is deduplicated away and the product ranks second of two
+    unmodified = [result for result in results if not any(result["weights"].values())][0]
+    assert unmodified["mrr"] == pytest.approx(1 / 2)
+    assert unmodified["ndcg"] == pytest.approx(1 / math.log2(3))
@@ -0,0 +1,37 @@
+from fashion_search import ingest
+from fashion_search.ingest import PRODUCT_SCHEMA, iter_chunk_records, iter_records, iter_table_chunks, load_table
+
+PRODUCTS_CSV = """image_url,_id,product_name,category,cost,in_stock
+https://example.com/1.jpg,1_0,green dress,dresses,19.99,True
+https://example.com/2.jpg,2_0,NA,,5.0,false
+https://example.com/3.jpg,3_0,"red, blue shirt",shirts,12.5,True
+https://example.com/4.jpg,4_0,black shoes,shoes,40.0,False
+https://example.com/5.jpg,5_0,hat,hats,7.25,true
+"""
+
+def write_products(tmp_path):
+    path = tmp_path / "product_data.csv"
+    path.write_text(PRODUCTS_CSV)
+    return str(path)
+
+def test_chunks_match_the_loaded_table(tmp_path):
+    csv_file = write_products(tmp_path)
+    expected = list(iter_records(load_table(csv_file, PRODUCT_SCHEMA, cache_dir=None)))
+
+    chunks = list(iter_table_chunks(csv_file, PRODUCT_SCHEMA, cache_dir=None, chunk_rows=2))
+
+    assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+    assert list(iter_chunk_records(chunks)) == expected
+    assert expected[1]["product_name"] == "NA" and expected[1]["category"] == ""
+    assert [record["in_stock"] for record in expected] == [True, False, True, False, True]
+
+def test_chunks_are_read_from_the_parquet_cache_once_it_exists(tmp_path, monkeypatch):
+    csv_file = write_products(tmp_path)
+    cache_dir = str(tmp_path / "tables")
+    expected = list(iter_records(load_table(csv_file, PRODUCT_SCHEMA, cache_dir=cache_dir)))
+
+    monkeypatch.setattr(ingest.pd, "read_csv", None)  # The CSV must not be parsed again
+    chunks = list(iter_table_chunks(csv_file, PRODUCT_SCHEMA, cache_dir=cache_dir, chunk_rows=2))
+
+    assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+    assert list(iter_chunk_records(chunks)) == expected
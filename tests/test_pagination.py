@@ -0,0 +1,90 @@
+import random
+
+from fashion_search.pagination import MAX_REQUEST_LIMIT, UniqueResultPager, item_id
+
+class StandInStrategy:
+    """Ranks like Marqo hybrid search: reciprocal rank fusion of the top offset + limit of two retrievers."""
+
+    rerank = False
+
+    def __init__(self, search_method, lexical, tensor, rrf_k=60):
+        self.search_method = search_method
+        self.lexical = lexical
+        self.tensor = tensor
+        self.rrf_k = rrf_k
+        self.requests = []
+
+    def search(self, index, query, cache=None, offset=0, limit=50):
+        self.requests.append((offset, limit))
+        depth = offset + limit
+        scores = {}
+        for ranking in (self.lexical[:depth], self.tensor[:depth]):
+            for rank, _id in enumerate(ranking):
+                scores[_id] = scores.get(_id, 0.0) + 1.0 / (self.rrf_k + rank + 1)
+        fused = sorted(scores, key=lambda _id: (-scores[_id], _id))
+        return {"hits": [{"_id": _id} for _id in fused[offset:offset + limit]]}
+
+def make_strategy(search_method, products=150, images=3, seed=7):
+    ids = [f"{product}_{image}" for product in range(products) for image in range(images)]
+    rng = random.Random(seed)
+    lexical, tensor = rng.sample(ids, len(ids)), rng.sample(ids, len(ids))
+    return StandInStrategy(search_method, lexical, tensor)
+
+def read_pages(pager, pages):
+    shown = []
+    for page_number in range(pages):
+        shown += [item_id(hit) for hit in pager.page(page_number)]
+    return shown
+
+def test_hybrid_pages_never_skip_or_repeat_products():
+    strategy = make_strategy("HYBRID")
+    pager = UniqueResultPager(strategy, index=None, query="dress", page_size=10)
+
+    shown = read_pages(pager, 5)
+
+    assert len(shown) == len(set(shown)) == 50
+    # The pages read together are the top of the ranking for the deepest window fetched
+    offset, limit = strategy.requests[-1]
+    ranking = strategy.search(None, "dress", offset=offset, limit=limit)["hits"]
+    top_products = list(dict.fromkeys(item_id(hit) for hit in ranking))
+    assert set(shown) <= set(top_products)
+    # and nothing near the top of it was skipped
+    assert set(top_products[:len(shown) // 2]) <= set(shown)
+
+def test_hybrid_requests_start_from_the_top_until_the_limit_cap():
+    strategy = make_strategy("HYBRID")
+    pager = UniqueResultPager(strategy, index=None, query="dress", page_size=20)
+
+    read_pages(pager, 8)
+
+    offsets = [offset for offset, _ in strategy.requests]
+    limits = [limit for _, limit in strategy.requests]
+    assert offsets[0] == 0 and limits == sorted(limits)
+    assert all(offset == 0 for offset, limit in strategy.requests if limit < MAX_REQUEST_LIMIT)
+    assert all(limit <= MAX_REQUEST_LIMIT for limit in limits)
+
+def test_tensor_pages_continue_from_the_last_offset():
+    strategy = make_strategy("TENSOR")
+    pager = UniqueResultPager(strategy, index=None, query="dress", page_size=10)
+
+    read_pages(pager, 3)
+
+    offsets = [offset for offset, _ in strategy.requests]
+    assert offsets == sorted(set(offsets))
+    assert all(offset == previous_offset + previous_limit for (previous_offset, previous_limit), (offset, _)
+               in zip(strategy.requests, strategy.requests[1:]))
+
+def test_seeded_pager_continues_after_the_first_page_it_did_not_serve():
+    first_page = UniqueResultPager(make_strategy("HYBRID"), index=None, query="dress", page_size=10).page(0)
+    strategy = make_strategy("HYBRID")
+    pager = UniqueResultPager(strategy, index=None, query="dress", page_size=10)
+
+    pager.seed(first_page)
+    shown = [item_id(hit) for hit in first_page] + read_pages(pager, 5)[10:]
+
+    assert pager.page(0) == first_page
+    assert len(shown) == len(set(shown)) == 50
+    offset, limit = strategy.requests[-1]
+    ranking = strategy.search(None, "dress", offset=offset, limit=limit)["hits"]
+    top_products = list(dict.fromkeys(item_id(hit) for hit in ranking))
+    assert set(top_products[:len(shown) // 2]) <= set(shown)
@@ -0,0 +1,22 @@
+from fashion_search.query_keys import query_key
+from fashion_search.strategies import STRATEGIES
+
+def test_spelling_variants_share_a_key():
+    assert query_key("Green  Dress") == query_key("dresses green") == "dress_green"
+
+def test_punctuation_only_query_keeps_a_key():
+    assert query_key("!!!") == "___"
+
+def test_non_latin_query_keeps_a_key():
+    assert query_key("连衣裙") == "___"
+
+def test_empty_key_drops_per_query_modifiers():
+    request = STRATEGIES["hybrid_exact_revenue"].build_request("")
+    for parameter in ("scoreModifiersTensor", "scoreModifiersLexical"):
+        for modifier in request["hybrid_parameters"].get(parameter, {}).get("add_to_score", []):
+            assert not modifier["field_name"].endswith(".")
+
+def test_fallback_key_fills_booster_field():
+    request = STRATEGIES["hybrid_exact"].build_request(query_key("!!!"))
+    fields = [modifier["field_name"] for modifier in request["hybrid_parameters"]["scoreModifiersTensor"]["add_to_score"]]
+    assert fields == ["exact_match_boosters.___"]
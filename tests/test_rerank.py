@@ -0,0 +1,19 @@
+import numpy as np
+
+from fashion_search.ingest import load_historical_table
+from fashion_search.query_keys import query_key
+from fashion_search.rerank import FeatureTable
+from fashion_search.signal_store import RevenueSignalStore
+
+def test_query_revenue_is_memory_mapped_from_a_saved_store(tmp_path):
+    history = load_historical_table()
+    RevenueSignalStore.from_history(history).save(str(tmp_path))
+
+    mapped = FeatureTable.from_csv(signal_store=str(tmp_path))
+    summed = FeatureTable.from_csv(signal_store=str(tmp_path / "missing"))
+
+    assert isinstance(mapped.signal_store.values, np.memmap)
+    assert not isinstance(summed.signal_store.values, np.memmap)
+    for query, rows in list(history.groupby("query")["_id"])[:50]:
+        product_ids = rows.tolist() + ["unknown_0"]
+        assert np.array_equal(mapped.lookup(query_key(query), product_ids), summed.lookup(query_key(query), product_ids))
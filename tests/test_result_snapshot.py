@@ -0,0 +1,54 @@
+import os
+
+from fashion_search.result_snapshot import ResultSnapshot, SnapshotFile
+
+def build_snapshot():
+    pages = {"Green Dress": ([{"_id": "1_0"}, {"_id": "2_0"}], True), "red shoes": ([{"_id": "2_0"}], False)}
+    return ResultSnapshot.build("hybrid", "fashion-search", 1, 20, pages)
+
+def replace(path, text, mtime_ns):
+    with open(path, "w") as file:
+        file.write(text)
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+def test_lookup_shares_products_between_queries(tmp_path):
+    path = str(tmp_path / "snapshot.json")
+    build_snapshot().save(path)
+    snapshot = ResultSnapshot.load(path)
+
+    assert snapshot.lookup("green  dress") == ([{"_id": "1_0"}, {"_id": "2_0"}], True)
+    assert snapshot.lookup("blue hat") is None
+    assert len(snapshot.products) == 2
+    assert snapshot.serves("hybrid", "fashion-search", 1, 20)
+    assert not snapshot.serves("hybrid", "fashion-search", 2, 20)
+
+def test_malformed_file_is_ignored_until_replaced(tmp_path, capsys):
+    path = str(tmp_path / "snapshot.json")
+    replace(path, '{"strategy": "hybrid", "queries"', 1_000_000_000)
+    snapshot_file = SnapshotFile(path)
+
+    assert snapshot_file.current() is None
+    assert snapshot_file.last_error.startswith("JSONDecodeError")
+    assert not snapshot_file.changed()
+    assert snapshot_file.current() is None
+    assert capsys.readouterr().err.count("Ignoring result snapshot") == 1
+
+    replace(path, '{"strategy": "hybrid"}', 2_000_000_000)
+    assert snapshot_file.changed()
+    assert snapshot_file.current() is None
+    assert snapshot_file.last_error.startswith("KeyError")
+
+    build_snapshot().save(path)
+    assert len(snapshot_file.current()) == 2
+    assert snapshot_file.last_error is None
+
+def test_removed_file_means_no_snapshot(tmp_path):
+    path = str(tmp_path / "snapshot.json")
+    build_snapshot().save(path)
+    snapshot_file = SnapshotFile(path)
+    assert snapshot_file.current() is not None
+
+    os.remove(path)
+    assert snapshot_file.changed()
+    assert snapshot_file.current() is None
+    assert snapshot_file.last_error is None
@@ -0,0 +1,100 @@
+import pytest
+
+from fashion_search.search_cache import SearchCache, invalidate_search_caches
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class StandInIndex:
+    """Records the searches that reach Marqo and answers each with a new response."""
+
+    def __init__(self, index_name="test-index"):
+        self.index_name = index_name
+        self.searches = []
+
+    def search(self, query, **params):
+        self.searches.append((query, params))
+        return {"query": query, "hits": [], "request": len(self.searches)}
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+@pytest.fixture
+def index():
+    return StandInIndex()
+
+def test_marqo_receives_the_raw_query_and_spellings_share_the_entry(index, clock):
+    cache = SearchCache(generation_file=None, clock=clock)
+
+    first = cache.search(index, "  Red Dress", limit=10)
+    second = cache.search(index, "red   dress", limit=10)
+
+    assert index.searches == [("  Red Dress", {"limit": 10})]
+    assert second is first
+
+def test_parameters_are_part_of_the_key(index, clock):
+    cache = SearchCache(generation_file=None, clock=clock)
+
+    cache.search(index, "dress", limit=10)
+    cache.search(index, "dress", limit=20)
+    cache.search(StandInIndex("other-index"), "dress", limit=10)
+
+    assert len(index.searches) == 2
+    assert cache.stats()["misses"] == 3
+
+def test_entries_expire_after_the_ttl(index, clock):
+    cache = SearchCache(ttl=60, generation_file=None, clock=clock)
+    cache.search(index, "dress")
+
+    clock.now = 59.9
+    cache.search(index, "dress")
+    assert len(index.searches) == 1
+
+    clock.now = 60.0
+    cache.search(index, "dress")
+    assert len(index.searches) == 2
+    assert cache.stats()["expired"] == 1
+
+def test_least_recently_used_entry_is_evicted(index, clock):
+    cache = SearchCache(max_entries=2, generation_file=None, clock=clock)
+    cache.search(index, "dress")
+    cache.search(index, "shirt")
+    cache.search(index, "dress")  # Now "shirt" is the least recently used
+    cache.search(index, "shoes")
+
+    assert cache.stats()["evicted"] == 1
+    cache.search(index, "dress")
+    assert len(index.searches) == 3
+    cache.search(index, "shirt")
+    assert len(index.searches) == 4
+
+def test_generation_file_change_drops_every_entry(index, clock, tmp_path):
+    generation_file = str(tmp_path / "cache" / "index_generation")
+    cache = SearchCache(generation_file=generation_file, clock=clock)
+    cache.search(index, "dress")
+    cache.search(index, "dress")
+    assert len(index.searches) == 1
+
+    invalidate_search_caches(generation_file)
+    cache.search(index, "dress")
+
+    assert len(index.searches) == 2
+    assert cache.stats()["invalidations"] == 1
+    assert cache.stats()["entries"] == 1
+
+def test_counters(index, clock):
+    cache = SearchCache(generation_file=None, clock=clock)
+    cache.search(index, "dress")
+    cache.search(index, "Dress")
+    cache.search(index, "shirt")
+    cache.invalidate()
+    cache.search(index, "dress")
+
+    assert cache.stats() == {
+        "hits": 1, "misses": 3, "expired": 0, "evicted": 0, "invalidations": 1, "entries": 1,
+    }
@@ -0,0 +1,56 @@
+import io
+
+import pytest
+from PIL import Image
+
+from fashion_search.thumbnails import IMAGE_DECODE_ERRORS, ThumbnailCache
+
+def make_image(color, size=(400, 300)):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+def fail_fetch(image_url):
+    raise AssertionError(f"{image_url} should have been served from the cache")
+
+def test_thumbnail_is_fetched_once_then_served_from_memory(tmp_path):
+    cache = ThumbnailCache(cache_dir=str(tmp_path))
+    first = cache.get_or_fetch("https://example.com/a.jpg", lambda url: make_image("red"))
+    second = cache.get_or_fetch("https://example.com/a.jpg", fail_fetch)
+
+    assert first == second
+    assert Image.open(io.BytesIO(first)).size == (200, 150)
+    assert cache.hits == {"memory": 1, "disk": 0, "miss": 1}
+
+def test_files_written_by_another_process_are_used(tmp_path):
+    cache = ThumbnailCache(cache_dir=str(tmp_path))
+    other_process = ThumbnailCache(cache_dir=str(tmp_path))
+    other_process.get_or_fetch("https://example.com/a.jpg", lambda url: make_image("red"))
+
+    assert cache.contains("https://example.com/a.jpg")
+    thumbnail = cache.get_or_fetch("https://example.com/a.jpg", fail_fetch)
+
+    assert thumbnail == other_process.get("https://example.com/a.jpg")
+    assert cache.hits["disk"] == 1
+    assert cache.disk_used == len(thumbnail)
+
+def test_disk_tier_evicts_least_recently_used_files(tmp_path):
+    cache = ThumbnailCache(cache_dir=str(tmp_path), memory_bytes=0)
+    sizes = {}
+    for name, color in (("a", "red"), ("b", "green"), ("c", "blue")):
+        sizes[name] = len(cache.get_or_fetch(f"https://example.com/{name}.jpg", lambda url, color=color: make_image(color)))
+    cache.disk_bytes = sizes["b"] + sizes["c"]
+    cache.get_or_fetch("https://example.com/b.jpg", fail_fetch)  # Now "a" and then "c" are least recently used
+    cache.get_or_fetch("https://example.com/d.jpg", lambda url: make_image("black"))
+
+    assert not cache.contains("https://example.com/a.jpg")
+    assert cache.contains("https://example.com/b.jpg")
+    assert cache.disk_used <= cache.disk_bytes
+
+def test_decompression_bombs_are_an_image_decode_error(tmp_path, monkeypatch):
+    monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", 1000)
+    cache = ThumbnailCache(cache_dir=str(tmp_path))
+
+    with pytest.raises(IMAGE_DECODE_ERRORS):
+        cache.get_or_fetch("https://example.com/huge.png", lambda url: make_image("red", size=(100, 100)))
+    assert not cache.contains("https://example.com/huge.png")